@@ -1,11 +1,18 @@
 from layers.layer import Layer
+from layer_registry import register_layer
+from asset_store import asset_store
 import os
 class ActivationFunction(Layer):
+    __slots__ = ()
     def __init__(self):
         super().__init__()
 
 
+@register_layer
 class ReLUFunction(ActivationFunction):
+    __slots__ = ()
+    path = os.path.join('.', 'assets', 'relu.svg')
+
     def __init__(self):
         super().__init__()
         
@@ -17,17 +24,19 @@ class ReLUFunction(ActivationFunction):
         
     @staticmethod
     def load_svg():
-        svg_path = os.path.join('.', 'assets', 'relu.svg')
-        with open(svg_path, 'r') as svg_file:
-            return svg_file.read()
+        return asset_store.get(ReLUFunction.path).content
     
     @staticmethod
     def get_svg_representation():
         return {
-            "svg_content": ReLUFunction.load_svg()
+            "svg_url": asset_store.get(ReLUFunction.path).url
         }
 
+@register_layer
 class SoftMaxFunction(ActivationFunction):
+    __slots__ = ()
+    path = os.path.join('.', 'assets', 'softmax.svg')
+
     def __init__(self):
         super().__init__()
         
@@ -39,20 +48,22 @@ class SoftMaxFunction(ActivationFunction):
         
     @staticmethod
     def load_svg():
-        svg_path = os.path.join('.', 'assets', 'softmax.svg')
-        with open(svg_path, 'r') as svg_file:
-            return svg_file.read()
+        return asset_store.get(SoftMaxFunction.path).content
     
     @staticmethod
     def get_svg_representation():
         return {
-            "svg_content": SoftMaxFunction.load_svg()
+            "svg_url": asset_store.get(SoftMaxFunction.path).url
         }
 
 class SigmoidFunction(ActivationFunction):
-    pass
+    __slots__ = ()
 
+@register_layer
 class TanhFunction(ActivationFunction):
+    __slots__ = ()
+    path = os.path.join('.', 'assets', 'tanh.svg')
+
     def __init__(self):
         super().__init__()
         
@@ -64,38 +75,42 @@ class TanhFunction(ActivationFunction):
         
     @staticmethod
     def load_svg():
-        svg_path = os.path.join('.', 'assets', 'tanh.svg')
-        with open(svg_path, 'r') as svg_file:
-            return svg_file.read()
+        return asset_store.get(TanhFunction.path).content
     
     @staticmethod
     def get_svg_representation():
         return {
-            "svg_content": TanhFunction.load_svg()
+            "svg_url": asset_store.get(TanhFunction.path).url
         }
 
 class IdentityFunction(ActivationFunction):
-    pass
+    __slots__ = ()
 
+@register_layer
 class LeakyReLUFunction(ActivationFunction):
-    def __init__(self, alpha):
+    __slots__ = ('alpha',)
+    path = os.path.join('.', 'assets', 'leaky_relu.svg')
+
+    DEFAULT_ALPHA = 0.01
+
+    def __init__(self, alpha: float = DEFAULT_ALPHA):
         super().__init__()
         self.alpha = alpha
         
         
     @classmethod
     def from_params(cls, params):
-        #placeholder values
-        return cls(0.01)
+        return cls(params.get('alpha', cls.DEFAULT_ALPHA))
+
+    def get_config(self):
+        return {'alpha': self.alpha}
         
     @staticmethod
     def load_svg():
-        svg_path = os.path.join('.', 'assets', 'leaky_relu.svg')
-        with open(svg_path, 'r') as svg_file:
-            return svg_file.read()
+        return asset_store.get(LeakyReLUFunction.path).content
     
     @staticmethod
     def get_svg_representation():
         return {
-            "svg_content": LeakyReLUFunction.load_svg()
+            "svg_url": asset_store.get(LeakyReLUFunction.path).url
         }
\ No newline at end of file
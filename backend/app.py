@@ -1,31 +1,25 @@
-from typing import Dict, Type
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from enum import Enum
-from layers.activation_function_layers.convolutional_layer import ConvolutionalLayer, ConvolutionType
-from layers.activation_function_layers.pooling_layer import PoolingLayer
-from activation_functions.activation_function import ReLUFunction, LeakyReLUFunction, TanhFunction, SoftMaxFunction
-
-# Update imports for the new input layer structure
-from layers.misc_layers.input_layer import (
-    BaseInputLayer, 
-    ImageInputLayer, 
-    TextInputLayer, 
-    TabularInputLayer, 
-    AudioInputLayer, 
-    VideoInputLayer
-)
-from layers.misc_layers.flattening_layer import FlatteningLayer
-from layers.misc_layers.dense_layer import DenseLayer
-from layers.misc_layers.embedding_layer import EmbeddingLayer
-from layers.misc_layers.attention_layer import AttentionLayer
-from layers.misc_layers.normalization_layer import NormalizationLayer
-from layers.misc_layers.dropout_layer import DropoutLayer
-
-from layers.layer import Layer
-import inspect
+import atexit
+import os
 from neural_network import NeuralNetwork
-from connection import Connection
+from network_registry import NetworkRegistry
+from network_cache import NetworkCache
+from templates import TemplateStore
+from storage import SQLiteNetworkStore
+from graph_batch import BatchError, apply_batch
+from shape_inference import shape_record
+from cost_model import cost_report
+from topological_order import CycleError
+from executor import ExecutionError
+from inference import PredictionService
+from weight_store import WeightStore
+from jobs import JobScheduler, JobQueueFull, validate_network, run_network, train_network
+from events import EventBus, event_source
+from metrics import Metrics
+from layer_catalog import LayerCatalog
+from layer_registry import layer_types
+from asset_store import asset_store
 # from flask_jwt_extended import (
 #     JWTManager, create_access_token,
 #     jwt_required, get_jwt_identity
@@ -57,8 +51,6 @@ def login():
 
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
-networks = []
-current_id = 0
 
 @app.route("/")
 def hello_world():
@@ -68,160 +60,218 @@ def hello_world():
 def test():
     return jsonify({"status": "success", "message": "API is working!"})
     
-def get_class_info(cls):    
-    if issubclass(cls, Layer):
-        # Collect parameters from the entire inheritance chain
-        all_params = []
-        for c in cls.__mro__:
-            if c == object:  # Stop at the object class
-                break
-                
-            if hasattr(c, '__init__'):
-                sig = inspect.signature(c.__init__)
-                for name, param in sig.parameters.items():
-                    if name != 'self' and name not in [p['name'] for p in all_params]:
-                        param_type = param.annotation
-                        param_info = {
-                            "name": name,
-                            "type": "string" 
-                        }
-                        
-                        # Get default value from class attribute if available
-                        default_attr_name = f"DEFAULT_{name.upper()}"
-                        if hasattr(c, default_attr_name):
-                            default_value = getattr(c, default_attr_name)
-                            # Handle enum values
-                            if isinstance(default_value, Enum):
-                                param_info["default"] = default_value.name
-                            else:
-                                param_info["default"] = default_value
-                        # If parameter has a default value in the signature
-                        elif param.default != inspect.Parameter.empty:
-                            # Handle enum values
-                            if isinstance(param.default, Enum):
-                                param_info["default"] = param.default.name
-                            else:
-                                param_info["default"] = param.default
-                                
-                        if param_type != inspect.Parameter.empty:
-                            if inspect.isclass(param_type) and issubclass(param_type, Enum):
-                                param_info["type"] = "enum"
-                                param_info["enum_type"] = param_type.__name__
-                                # Add enum values
-                                param_info["enum_values"] = [e.name for e in param_type]
-                            elif param_type == int:
-                                param_info["type"] = "number"
-                            elif param_type == float:
-                                param_info["type"] = "number"
-                            elif param_type == bool:
-                                param_info["type"] = "boolean"
-                            elif param_type == list or str(param_type).startswith("typing.List"):
-                                param_info["type"] = "array"
-                            elif param_type == dict or str(param_type).startswith("typing.Dict"):
-                                param_info["type"] = "object"
-                        
-                        all_params.append(param_info)
-        
-        # Special handling for input type layers
-        if hasattr(cls, '__name__') and cls.__name__.endswith('InputLayer') and cls != BaseInputLayer:
-            # Check if input_type is already in params
-            if not any(p['name'] == 'input_type' for p in all_params):
-                # Determine the default input type based on the class name
-                default_type = "IMAGE"  # Default fallback
-                
-                if cls.__name__ == "ImageInputLayer":
-                    default_type = "IMAGE"
-                elif cls.__name__ == "TextInputLayer":
-                    default_type = "TEXT"
-                elif cls.__name__ == "TabularInputLayer":
-                    default_type = "TABULAR"
-                elif cls.__name__ == "AudioInputLayer":
-                    default_type = "AUDIO"
-                elif cls.__name__ == "VideoInputLayer":
-                    default_type = "VIDEO"
-                
-                all_params.append({
-                    "name": "input_type",
-                    "type": "enum",
-                    "enum_type": "InputType",
-                    "enum_values": [e.name for e in InputType],
-                    "default": default_type
-                })
-                
-        svg_data = None
-        if hasattr(cls, 'get_svg_representation') and callable(getattr(cls, 'get_svg_representation')):
-            svg_data = cls.get_svg_representation()
-
-        return {
-            "type": "layer",
-            "name": cls.__name__,
-            "params": all_params,
-            "svg_representation": svg_data
-        }
-    
-    return {"type": "unknown", "name": cls.__name__}
+# The catalog only depends on the layer classes, so it is serialized once and reused
+layer_catalog = LayerCatalog(layer_types.catalog)
 
 @app.route('/api/layer-types', methods=['GET'])
 def get_layer_types():
-    # Include all the input layer types
-    layer_types = [
-        get_class_info(ConvolutionalLayer),
-        get_class_info(PoolingLayer),
-        get_class_info(ReLUFunction),
-        get_class_info(LeakyReLUFunction),
-        get_class_info(TanhFunction),
-        get_class_info(SoftMaxFunction),
-        get_class_info(BaseInputLayer),  # Keep the base class for backward compatibility
-        get_class_info(ImageInputLayer),  # Add specialized input layers
-        get_class_info(TextInputLayer),
-        get_class_info(TabularInputLayer),
-        get_class_info(AudioInputLayer),
-        get_class_info(VideoInputLayer),
-        get_class_info(DenseLayer),
-        get_class_info(FlatteningLayer),
-        get_class_info(EmbeddingLayer),
-        get_class_info(AttentionLayer),
-        get_class_info(NormalizationLayer),
-        get_class_info(DropoutLayer)
-
-    ]
+    body, gzip_body, etag = layer_catalog.snapshot()
+    gzip_etag = f"{etag}-gzip"
+    use_gzip = request.accept_encodings['gzip'] > 0
+
+    if request.if_none_match.contains(etag) or request.if_none_match.contains(gzip_etag):
+        response = Response(status=304)
+    elif use_gzip:
+        response = Response(gzip_body, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(body, mimetype='application/json')
+
+    response.set_etag(gzip_etag if use_gzip else etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-    return jsonify({
-        "layer_types": layer_types
-    })
+
+@app.route('/api/assets/<digest>.svg', methods=['GET'])
+def get_asset(digest):
+    asset = asset_store.find(digest)
+    if not asset:
+        return jsonify({"error": f"Asset not found: {digest}"}), 404
+
+    if request.accept_encodings['gzip'] > 0:
+        response = Response(asset.gzip_data, mimetype='image/svg+xml')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(asset.data, mimetype='image/svg+xml')
+
+    # The URL embeds the content hash, so the bytes behind it never change
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 
 @app.route('/api/networks', methods=['POST'])
 def create_network():
-    global current_id
-    network_id = str(current_id)
-    current_id += 1
-    network = NeuralNetwork(network_id)
-    networks.append(network)
+    data = request.get_json(silent=True) or {}
+    template_name = data.get('template')
+    if template_name is None:
+        network = networks.create()
+    else:
+        template = templates.get(template_name)
+        if template is None:
+            return jsonify({"error": f"Template not found: {template_name}"}), 404
+        network = networks.clone(template)
     
+    return jsonify({"id": network.id})
+
+@app.route('/api/networks', methods=['GET'])
+def list_networks():
+    summaries = networks.summaries()
+    return jsonify({
+        "count": len(summaries),
+        "networks": [
+            {"id": network_id, "layers": layers, "connections": connections}
+            for network_id, layers, connections in summaries
+        ]
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(networks.cache_stats())
+
+@app.route('/api/networks/<network_id>', methods=['DELETE'])
+def delete_network(network_id):
+    if not networks.delete(network_id):
+        return jsonify({"error": f"Network not found: {network_id}"}), 404
+    predictions.forget(network_id)
+    events.publish(network_id, "delete_network", {"op": "delete_network", "id": network_id})
+    events.drop(network_id)
+
     return jsonify({"id": network_id})
 
-# Update the layer types dictionary to include all input layer variants
-LAYER_TYPES : Dict[str, Type[Layer]] = {
-    'ConvolutionalLayer': ConvolutionalLayer,
-    'PoolingLayer': PoolingLayer,
-    'ReLUFunction': ReLUFunction,
-    'LeakyReLUFunction': LeakyReLUFunction,
-    'TanhFunction': TanhFunction,
-    'SoftMaxFunction': SoftMaxFunction,
-    'BaseInputLayer': BaseInputLayer,
-    'ImageInputLayer': ImageInputLayer,
-    'TextInputLayer': TextInputLayer,
-    'TabularInputLayer': TabularInputLayer,
-    'AudioInputLayer': AudioInputLayer,
-    'VideoInputLayer': VideoInputLayer,
-    'DenseLayer': DenseLayer,
-    'FlatteningLayer': FlatteningLayer,
-    'EmbeddingLayer': EmbeddingLayer,
-    'AttentionLayer': AttentionLayer,
-    'NormalizationLayer': NormalizationLayer,
-    'DropoutLayer': DropoutLayer
-}
+@app.route('/api/networks/<network_id>/clone', methods=['POST'])
+def clone_network(network_id):
+    network = networks.get(network_id)
+
+    # Handle case where network is not found
+    if not network:
+        return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+    return jsonify({"id": networks.clone(network).id, "source": network_id})
+
+@app.route('/api/templates', methods=['GET'])
+def list_templates():
+    return jsonify({
+        "templates": [
+            {"name": name, "layers": layers, "connections": connections}
+            for name, layers, connections in templates.summaries()
+        ]
+    })
+
+@app.route('/api/templates', methods=['POST'])
+def save_template():
+    data = request.json or {}
+    name = data.get('name')
+    network_id = data.get('network_id')
+    if not isinstance(name, str) or not name:
+        return jsonify({"error": "name must be a non-empty string"}), 400
+    network = networks.get(network_id)
+
+    # Handle case where network is not found
+    if not network:
+        return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+    template = templates.save(name, network)
+    return jsonify({"name": name, "layers": len(template.layers), "connections": len(template.connections)})
+
+@app.route('/api/templates/<name>', methods=['GET'])
+def get_template(name):
+    template = templates.get(name)
+    if template is None:
+        return jsonify({"error": f"Template not found: {name}"}), 404
+
+    _, layers, connections = template.records()
+    return jsonify({"name": name, "layers": layers, "connections": connections})
+
+@app.route('/api/templates/<name>', methods=['DELETE'])
+def delete_template(name):
+    if not templates.delete(name):
+        return jsonify({"error": f"Template not found: {name}"}), 404
+
+    return jsonify({"name": name})
+
+def _env_number(name, default, kind=int):
+    value = os.environ.get(name)
+    return kind(value) if value else default
+
+# Designs are kept in memory only unless NETWORK_DB names a SQLite file to persist them in.
+# Changes other worker processes make to a cached network show up within NETWORK_CHECK_INTERVAL seconds
+NETWORK_DB = os.environ.get('NETWORK_DB', '')
+store = SQLiteNetworkStore(
+    NETWORK_DB, layer_types,
+    check_interval=_env_number('NETWORK_CHECK_INTERVAL', 1.0, float)
+) if NETWORK_DB else None
+if store is not None:
+    atexit.register(store.close)
+
+# Abandoned editor sessions are evicted from memory and reloaded from the store on next
+# access. Without a store an evicted network is lost, so nothing is evicted unless the
+# NETWORK_CACHE_* limits are set.
+cache = NetworkCache(
+    max_entries=_env_number('NETWORK_CACHE_MAX_ENTRIES', 1000 if store is not None else None),
+    max_bytes=_env_number('NETWORK_CACHE_MAX_BYTES', 256 * 1024 * 1024 if store is not None else None),
+    idle_ttl=_env_number('NETWORK_CACHE_IDLE_TTL', 3600.0 if store is not None else None, float)
+)
+networks = NetworkRegistry(store, cache)
+templates = TemplateStore()
+
+# Trained weights are kept next to the network store, in WEIGHTS_DIR, so they survive
+# networks being evicted and reloaded; without a store they live as long as the network
+WEIGHTS_DIR = os.environ.get('WEIGHTS_DIR', f'{NETWORK_DB}.weights' if NETWORK_DB else '')
+
+# Concurrent predict requests for a network are coalesced into batches of up to
+# PREDICT_MAX_BATCH_SIZE samples, waiting at most PREDICT_MAX_WAIT seconds for more
+predictions = PredictionService(
+    max_batch_size=_env_number('PREDICT_MAX_BATCH_SIZE', 64),
+    max_wait=_env_number('PREDICT_MAX_WAIT', 0.005, float),
+    weight_store=WeightStore(WEIGHTS_DIR) if WEIGHTS_DIR else None
+)
+
+# Validation, inference and training of whole networks run as background jobs in a
+# process pool of JOB_WORKERS processes, with at most JOB_QUEUE_SIZE jobs waiting
+jobs = JobScheduler(
+    max_workers=_env_number('JOB_WORKERS', 2),
+    max_queued=_env_number('JOB_QUEUE_SIZE', 100)
+)
+atexit.register(jobs.shutdown)
+
+# Graph changes and job progress are pushed to /events subscribers from a ring buffer
+# of the last EVENT_BUFFER_SIZE events per network
+events = EventBus(capacity=_env_number('EVENT_BUFFER_SIZE', 256))
+EVENT_KEEPALIVE = _env_number('EVENT_KEEPALIVE', 15.0, float)
+networks.subscribe(events.record_change)
+jobs.subscribe(events.record_job)
+
+# Per-route request counts, latencies and response sizes, served in Prometheus format at /metrics
+metrics = Metrics()
+metrics.instrument(app)
+metrics.gauge('networks_live', 'Networks held in memory.', lambda: networks.totals()[0])
+metrics.gauge('network_layers', 'Layers across the networks held in memory.', lambda: networks.totals()[1])
+metrics.gauge('network_connections', 'Connections across the networks held in memory.',
+              lambda: networks.totals()[2])
+metrics.gauge('networks_stored', 'Networks in the registry, including ones not loaded.', lambda: len(networks))
+if store is not None:
+    metrics.gauge('network_store_flush_failures', 'Failed writes of queued changes to the network store.',
+                  lambda: store.flush_failures)
+    metrics.gauge('network_store_pending', 'Changes queued for the network store.', lambda: store.stats()["pending"])
+
+TRAINING_OPTIONS = ('epochs', 'batch_size', 'optimizer', 'learning_rate', 'loss', 'workers', 'seed')
+
+def revision_conflict(network):
+    """Return a 412 response if the request's If-Match names another revision of network.
+    Call with network.lock held, so the revision cannot move before the write."""
+    if_match = request.if_match
+    if not if_match or if_match.star_tag or if_match.contains(str(network.revision)):
+        return None
+    return jsonify({"error": f"Network has changed, now at revision {network.revision}",
+                    "revision": network.revision}), 412
+
+def with_revision(body, revision):
+    body["revision"] = revision
+    response = jsonify(body)
+    response.set_etag(str(revision))
+    return response
 
 @app.route('/api/networks/<network_id>/layers', methods=['POST'])
 def add_layer(network_id):
@@ -229,7 +279,7 @@ def add_layer(network_id):
     layer_type = data.get('type')
     params = data.get('params', {})
 
-    layer_class = LAYER_TYPES.get(layer_type)
+    layer_class = layer_types.get(layer_type)
     
     # Handle case where layer_class is not found
     if not layer_class:
@@ -237,53 +287,273 @@ def add_layer(network_id):
         
     layer = layer_class.from_params(params)
 
-    network = find_network_by_id(network_id)
+    with networks.writing(network_id) as network:
+        # Handle case where network is not found
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+        conflict = revision_conflict(network)
+        if conflict:
+            return conflict
+        layer_id = network.add_layer(layer)
+        shapes = network.take_shape_changes()
+        revision = network.revision
+
+    return with_revision({"id": layer_id, "shapes": shapes}, revision)
+
+@app.route('/api/networks/<network_id>/layers/<int:layer_id>', methods=['DELETE'])
+def remove_layer(network_id, layer_id):
+    with networks.writing(network_id) as network:
+        # Handle case where network is not found
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+        conflict = revision_conflict(network)
+        if conflict:
+            return conflict
+        if not network.remove_layer(layer_id):
+            return jsonify({"error": f"Layer not found: {layer_id}"}), 404
+        shapes = network.take_shape_changes()
+        revision = network.revision
+
+    return with_revision({"id": layer_id, "shapes": shapes}, revision)
+
+@app.route('/api/networks/<network_id>/shapes', methods=['GET'])
+def get_shapes(network_id):
+    network = networks.get(network_id)
     
     # Handle case where network is not found
     if not network:
         return jsonify({"error": f"Network not found: {network_id}"}), 404
-        
-    layer_id = len(network.layers)
-    layer.id = layer_id
-    network.add_layer(layer)
 
-    return jsonify({"id": layer_id})
+    with network.lock:
+        shapes = {layer_id: shape_record(layer) for layer_id, layer in network.layers.items()}
+
+    return jsonify({"shapes": shapes})
+
+@app.route('/api/networks/<network_id>/order', methods=['GET'])
+def get_topological_order(network_id):
+    network = networks.get(network_id)
+    
+    # Handle case where network is not found
+    if not network:
+        return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+    return jsonify({"order": network.topological_order()})
+
+@app.route('/api/networks/<network_id>/cost', methods=['GET'])
+def get_cost(network_id):
+    network = networks.get(network_id)
+    
+    # Handle case where network is not found
+    if not network:
+        return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+    return jsonify(cost_report(network))
 
 @app.route('/api/networks/<network_id>/connections', methods=['POST'])
 def connect_layers(network_id):      
     data = request.json
     source_id = data.get('source')
     target_id = data.get('target')
-    network = find_network_by_id(network_id)
+
+    with networks.writing(network_id) as network:
+        # Handle case where network is not found
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+        # Checked under the lock so a concurrent remove_layer cannot slip in before add_connection
+        if network.find_layer(source_id) is None:
+            return jsonify({"error": f"Source layer not found: {source_id}"}), 404
+        if network.find_layer(target_id) is None:
+            return jsonify({"error": f"Target layer not found: {target_id}"}), 404
+        conflict = revision_conflict(network)
+        if conflict:
+            return conflict
+        try:
+            connection = network.add_connection(source_id, target_id)
+        except CycleError as e:
+            return jsonify({"error": str(e), "cycle": e.path}), 409
+        shapes = network.take_shape_changes()
+        revision = network.revision
     
+    return with_revision({"id": connection.id, "shapes": shapes}, revision)
+
+@app.route('/api/networks/<network_id>/batch', methods=['POST'])
+def apply_network_batch(network_id):
+    data = request.json or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list):
+        return jsonify({"error": "operations must be a list"}), 400
+
+    with networks.writing(network_id) as network:
+        # Handle case where network is not found
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+        conflict = revision_conflict(network)
+        if conflict:
+            return conflict
+        try:
+            layer_ids, connection_ids = apply_batch(network, operations, layer_types)
+        except BatchError as e:
+            network.take_shape_changes()
+            return jsonify({"error": e.message, "operation": e.index}), 400
+        shapes = network.take_shape_changes()
+        revision = network.revision
+
+    return with_revision({
+        "layers": {str(ref): layer_id for ref, layer_id in layer_ids.items()},
+        "connections": connection_ids,
+        "shapes": shapes
+    }, revision)
+
+@app.route('/api/networks/<network_id>/predict', methods=['POST'])
+def predict(network_id):
+    data = request.json or {}
+    network = networks.get(network_id)
+
     # Handle case where network is not found
     if not network:
         return jsonify({"error": f"Network not found: {network_id}"}), 404
-        
-    source_layer = network.find_layer(source_id)
-    target_layer = network.find_layer(target_id)
-    
-    # Handle case where layers are not found
-    if not source_layer:
-        return jsonify({"error": f"Source layer not found: {source_id}"}), 404
-    if not target_layer:
-        return jsonify({"error": f"Target layer not found: {target_id}"}), 404
-   
-    source_layer.connect_to(target_layer)
-    
-    connection_id = len(network.connections)
-    connection = Connection(source_layer, target_layer)
-    network.add_connection(connection)
-    
-    return jsonify({"id": connection_id})
+    if 'inputs' not in data:
+        return jsonify({"error": "inputs is required"}), 400
+
+    try:
+        outputs = predictions.predict(network, data['inputs'])
+    except ExecutionError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"outputs": {layer_id: values.tolist() for layer_id, values in outputs.items()}})
+
+@app.route('/api/networks/<network_id>/changes', methods=['GET'])
+def get_changes(network_id):
+    network = networks.get(network_id)
+
+    # Handle case where network is not found
+    if not network:
+        return jsonify({"error": f"Network not found: {network_id}"}), 404
+    since = request.args.get('since', '0')
+    if not since.isdigit():
+        return jsonify({"error": f"Invalid revision: {since}"}), 400
+
+    with network.lock:
+        changes = network.changes_since(int(since))
+        if changes is not None:
+            return with_revision({"changes": changes}, network.revision)
+        # Too far behind for the change log: send the whole graph instead
+        revision, layers, connections = network.records()
+    return with_revision({"reset": True, "layers": layers, "connections": connections}, revision)
+
+@app.route('/api/networks/<network_id>/events', methods=['GET'])
+def network_events(network_id):
+    if not networks.get(network_id):
+        return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+    # EventSource sends Last-Event-ID when it reconnects; other clients can pass it as a query arg
+    stream = events.stream(network_id)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else stream.last_id
+    except ValueError:
+        return jsonify({"error": f"Invalid Last-Event-ID: {last_event_id}"}), 400
+
+    return Response(event_source(stream, last_id, keepalive=EVENT_KEEPALIVE),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/predict/stats', methods=['GET'])
+def get_predict_stats():
+    return jsonify(predictions.stats())
+
+def submit_job(network, kind, fn, args, on_done=None):
+    data = request.get_json(silent=True) or {}
+    try:
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "priority must be an integer"}), 400
+    try:
+        job = jobs.submit(kind, fn, (network.id, network.snapshot()) + args,
+                          network_id=network.id, priority=priority, on_done=on_done)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({"job_id": job.id, "status": job.status}), 202
+
+@app.route('/api/networks/<network_id>/validate', methods=['POST'])
+def start_validation(network_id):
+    network = networks.get(network_id)
+    if not network:
+        return jsonify({"error": f"Network not found: {network_id}"}), 404
+    return submit_job(network, 'validate', validate_network, ())
+
+@app.route('/api/networks/<network_id>/run', methods=['POST'])
+def start_run(network_id):
+    data = request.json or {}
+    network = networks.get(network_id)
+    if not network:
+        return jsonify({"error": f"Network not found: {network_id}"}), 404
+    if 'inputs' not in data:
+        return jsonify({"error": "inputs is required"}), 400
+    return submit_job(network, 'run', run_network, (predictions.weights(network), data['inputs']))
+
+@app.route('/api/networks/<network_id>/train', methods=['POST'])
+def start_training(network_id):
+    data = request.json or {}
+    network = networks.get(network_id)
+    if not network:
+        return jsonify({"error": f"Network not found: {network_id}"}), 404
+    if 'inputs' not in data or 'targets' not in data:
+        return jsonify({"error": "inputs and targets are required"}), 400
+    options = {name: data[name] for name in TRAINING_OPTIONS if name in data}
+    # Data-parallel workers run inside the job's own process
+    try:
+        options['workers'] = max(1, min(int(options.get('workers', 1)), os.cpu_count() or 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "workers must be an integer"}), 400
+
+    def use_trained_weights(job, result):
+        predictions.load_weights(network, result.pop('weights'))
+        return result
+
+    return submit_job(network, 'train', train_network,
+                      (predictions.weights(network), data['inputs'], data['targets'], options),
+                      on_done=use_trained_weights)
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    network_id = request.args.get('network_id')
+    return jsonify({
+        "jobs": [job.to_dict() for job in jobs.list(network_id)],
+        "stats": jobs.stats()
+    })
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = jobs.cancel(job_id)
+    if not job:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/networks/<network_id>/connections/<int:connection_id>', methods=['DELETE'])
+def remove_connection(network_id, connection_id):
+    with networks.writing(network_id) as network:
+        # Handle case where network is not found
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+        conflict = revision_conflict(network)
+        if conflict:
+            return conflict
+        if not network.remove_connection(connection_id):
+            return jsonify({"error": f"Connection not found: {connection_id}"}), 404
+        shapes = network.take_shape_changes()
+        revision = network.revision
+
+    return with_revision({"id": connection_id, "shapes": shapes}, revision)
 
 
-def find_network_by_id(id) -> NeuralNetwork:
-    for n in networks:
-        if n.id == id:
-            return n
-    return None
-        
 if __name__ == '__main__':
     print("Starting Flask server on https://msc-project-8fbo.onrender.com")
     app.run(debug=True, port=5001)
\ No newline at end of file
@@ -0,0 +1,84 @@
+import gzip
+import hashlib
+import os
+import re
+import threading
+from collections import namedtuple
+
+
+ASSET_ROOT = os.path.join('.', 'assets')
+ASSET_URL_PREFIX = '/api/assets/'
+
+SvgAsset = namedtuple('SvgAsset', ['path', 'content', 'data', 'gzip_data', 'digest', 'url'])
+
+_XML_DECLARATION = re.compile(r'<\?xml[^>]*\?>')
+_COMMENT = re.compile(r'<!--.*?-->', re.S)
+_EDITOR_ELEMENTS = re.compile(
+    r'<(sodipodi:namedview|metadata)\b[^>]*?(/>|>.*?</\1\s*>)', re.S)
+_EDITOR_ATTRIBUTES = re.compile(r'\s(?:inkscape|sodipodi):[\w.-]+="[^"]*"')
+_WHITESPACE = re.compile(r'\s+')
+_BETWEEN_TAGS = re.compile(r'>\s+<')
+_BEFORE_TAG_END = re.compile(r'\s+(/?>)')
+
+
+def minify_svg(svg):
+    """Strip editor metadata, comments and redundant whitespace from an SVG document"""
+    svg = _XML_DECLARATION.sub('', svg)
+    svg = _COMMENT.sub('', svg)
+    svg = _EDITOR_ELEMENTS.sub('', svg)
+    svg = _EDITOR_ATTRIBUTES.sub('', svg)
+    svg = _WHITESPACE.sub(' ', svg)
+    svg = _BETWEEN_TAGS.sub('><', svg)
+    svg = _BEFORE_TAG_END.sub(r'\1', svg)
+    return svg.strip()
+
+
+class AssetStore:
+    """Minified, content-hashed SVG assets loaded once from disk"""
+
+    def __init__(self, root=ASSET_ROOT):
+        self.root = root
+        self._lock = threading.Lock()
+        self._by_path = None
+        self._by_digest = None
+
+    def _load(self):
+        by_path = {}
+        by_digest = {}
+        for directory, _, filenames in os.walk(self.root):
+            for filename in sorted(filenames):
+                if not filename.endswith('.svg'):
+                    continue
+                path = os.path.normpath(os.path.join(directory, filename))
+                with open(path, 'r') as svg_file:
+                    content = minify_svg(svg_file.read())
+                data = content.encode('utf-8')
+                digest = hashlib.sha256(data).hexdigest()[:20]
+                asset = SvgAsset(path, content, data, gzip.compress(data, compresslevel=9), digest,
+                                 f"{ASSET_URL_PREFIX}{digest}.svg")
+                by_path[path] = asset
+                by_digest[digest] = asset
+        self._by_digest = by_digest
+        self._by_path = by_path
+
+    def _ensure_loaded(self):
+        if self._by_path is None:
+            with self._lock:
+                if self._by_path is None:
+                    self._load()
+
+    def get(self, path):
+        """Return the asset stored at path, raising FileNotFoundError if it does not exist"""
+        self._ensure_loaded()
+        try:
+            return self._by_path[os.path.normpath(path)]
+        except KeyError:
+            raise FileNotFoundError(path) from None
+
+    def find(self, digest):
+        """Return the asset with the given content hash, or None"""
+        self._ensure_loaded()
+        return self._by_digest.get(digest)
+
+
+asset_store = AssetStore()
@@ -1,4 +1,7 @@
 class Connection:
-    def __init__(self, source, target):
-        self.source = source
-        self.target = target
\ No newline at end of file
+    __slots__ = ('id', 'source_id', 'target_id')
+
+    def __init__(self, id, source_id, target_id):
+        self.id = id
+        self.source_id = source_id
+        self.target_id = target_id
\ No newline at end of file
@@ -0,0 +1,166 @@
+import weakref
+from collections import namedtuple
+from functools import reduce
+import operator
+
+
+BYTES_PER_VALUE = 4  # float32
+
+# Layer class name -> rule(layer, input_shape, output_shape) -> (parameter count, multiply-accumulates)
+COST_RULES = {}
+
+LayerCost = namedtuple('LayerCost', ['params', 'macs', 'activation_bytes'])
+
+# network -> _CostCache
+_caches = weakref.WeakKeyDictionary()
+
+
+def cost_rule(*layer_types):
+    def register(rule):
+        for layer_type in layer_types:
+            COST_RULES[layer_type] = rule
+        return rule
+    return register
+
+
+def _size(shape):
+    return reduce(operator.mul, shape, 1)
+
+
+class _CostCache:
+    """Costs of a network's layers, dropped when a layer is added or removed or its shapes
+    are recomputed. Layer params never change once a layer is created."""
+
+    def __init__(self, network):
+        self.costs = {}
+        network.subscribe(self.record_change)
+        network.subscribe_shapes(self.invalidate)
+
+    def record_change(self, network, change):
+        if change["op"] == "add_layer":
+            self.costs.pop(change["layer"]["id"], None)
+        elif change["op"] == "remove_layer":
+            self.costs.pop(change["id"], None)
+
+    def invalidate(self, layer_ids):
+        for layer_id in layer_ids:
+            self.costs.pop(layer_id, None)
+
+
+def layer_cost(layer):
+    """Return the LayerCost of a layer, or None while its shapes are unknown"""
+    if layer.output_shape is None:
+        return None
+    rule = None
+    for cls in type(layer).__mro__:
+        rule = COST_RULES.get(cls.__name__)
+        if rule is not None:
+            break
+    params, macs = rule(layer, layer.input_shape, layer.output_shape) if rule else (0, 0)
+    return LayerCost(params, macs, _size(layer.output_shape) * BYTES_PER_VALUE)
+
+
+def network_costs(network):
+    """Return {layer id: LayerCost or None}, reusing cached costs of layers that have not
+    changed since the last call"""
+    costs = {}
+    with network.lock:
+        cache = _caches.get(network)
+        if cache is None:
+            cache = _caches[network] = _CostCache(network)
+        for layer_id, layer in network.layers.items():
+            if layer_id not in cache.costs:
+                cache.costs[layer_id] = layer_cost(layer)
+            costs[layer_id] = cache.costs[layer_id]
+    return costs
+
+
+def critical_path(network, costs):
+    """Return (layer ids, total MACs) of the most expensive path through the graph"""
+    with network.lock:
+        best = {}
+        previous = {}
+        for layer_id in network.topological_order():
+            cost = costs.get(layer_id)
+            own = cost.macs if cost is not None else 0
+            source_id = max(network.predecessors(layer_id), key=lambda s: best[s], default=None)
+            best[layer_id] = own + (best[source_id] if source_id is not None else 0)
+            previous[layer_id] = source_id
+
+    if not best:
+        return [], 0
+    layer_id = max(best, key=best.get)
+    total = best[layer_id]
+    path = []
+    while layer_id is not None:
+        path.append(layer_id)
+        layer_id = previous[layer_id]
+    return path[::-1], total
+
+
+def cost_report(network):
+    costs = network_costs(network)
+    known = [cost for cost in costs.values() if cost is not None]
+    path, path_macs = critical_path(network, costs)
+    total_params = sum(cost.params for cost in known)
+    return {
+        "layers": {
+            layer_id: cost._asdict() if cost is not None else None
+            for layer_id, cost in costs.items()
+        },
+        "total": {
+            "params": total_params,
+            "parameter_bytes": total_params * BYTES_PER_VALUE,
+            "macs": sum(cost.macs for cost in known),
+            "activation_bytes": sum(cost.activation_bytes for cost in known),
+            "unknown_layers": len(costs) - len(known)
+        },
+        "critical_path": {"layers": path, "macs": path_macs}
+    }
+
+
+def _spatial_rank(shape):
+    return 1 if len(shape) == 2 else 2
+
+
+@cost_rule('ConvolutionalLayer')
+def _convolution(layer, input_shape, output_shape):
+    kernel = layer.kernel_size ** _spatial_rank(input_shape)
+    weights = kernel * input_shape[-1] * layer.filters
+    # A transposed convolution scatters every input position, a standard one gathers every output
+    positions = _size(input_shape[:-1]) if layer.layer_type.name == 'TRANSPOSED' else _size(output_shape[:-1])
+    return weights + layer.filters, positions * weights
+
+
+@cost_rule('PoolingLayer')
+def _pooling(layer, input_shape, output_shape):
+    return 0, _size(output_shape) * layer.pool_size ** _spatial_rank(input_shape)
+
+
+@cost_rule('DenseLayer')
+def _dense(layer, input_shape, output_shape):
+    weights = input_shape[-1] * layer.units
+    return weights + layer.units, _size(input_shape[:-1]) * weights
+
+
+@cost_rule('EmbeddingLayer')
+def _embedding(layer, input_shape, output_shape):
+    return layer.vocab_size * layer.embedding_dim, 0
+
+
+@cost_rule('AttentionLayer')
+def _attention(layer, input_shape, output_shape):
+    length, features = _size(input_shape[:-1]), input_shape[-1]
+    # Query, key, value and output projections plus the two length x length products
+    projections = 4 * (features * features + features)
+    return projections, 4 * length * features * features + 2 * length * length * features
+
+
+@cost_rule('NormalizationLayer')
+def _normalization(layer, input_shape, output_shape):
+    return 2 * input_shape[-1], 2 * _size(output_shape)
+
+
+@cost_rule('ActivationFunction', 'DropoutLayer')
+def _elementwise(layer, input_shape, output_shape):
+    return 0, _size(output_shape)
@@ -0,0 +1,217 @@
+import functools
+import hashlib
+import json
+import os
+import wave
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from data.transforms import fit_length
+
+
+PCM_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+FRAME_LENGTH = 0.025
+FRAME_STEP = 0.010
+NUM_MELS = 40
+PRE_EMPHASIS = 0.97
+LOG_FLOOR = 1e-10
+
+# Bumped whenever the features change, so stale caches are not reused
+FEATURE_VERSION = 1
+
+
+def read_audio(path):
+    """Read a PCM WAV or NPY file as float32 (samples, channels) plus its sampling rate
+    (None for NPY, which is taken to already be at the layer's rate)"""
+    if os.path.splitext(path)[1].lower() == '.npy':
+        samples = np.load(path).astype(np.float32)
+        return (samples[:, None] if samples.ndim == 1 else samples), None
+    with wave.open(str(path), 'rb') as f:
+        width, channels, rate = f.getsampwidth(), f.getnchannels(), f.getframerate()
+        frames = f.readframes(f.getnframes())
+    if width not in PCM_DTYPES:
+        raise ValueError(f"Unsupported {width * 8}-bit WAV file {path}")
+    samples = np.frombuffer(frames, dtype=PCM_DTYPES[width]).reshape(-1, channels).astype(np.float32)
+    if width == 1:
+        # 8-bit WAV is unsigned
+        samples = (samples - 128.0) / 128.0
+    else:
+        samples /= float(2 ** (8 * width - 1))
+    return samples, rate
+
+
+def resample(samples, rate, target_rate):
+    """Linearly resample (samples, channels) audio from rate to target_rate"""
+    if rate is None or rate == target_rate or not len(samples):
+        return samples
+    count = int(round(len(samples) * target_rate / rate))
+    positions = np.arange(count, dtype=np.float64) * (rate / target_rate)
+    source = np.arange(len(samples))
+    return np.stack([np.interp(positions, source, channel) for channel in samples.T], axis=1).astype(np.float32)
+
+
+def load_waveform(path, sampling_rate, length, channels):
+    samples, rate = read_audio(path)
+    samples = resample(samples, rate, sampling_rate)
+    if samples.shape[1] != channels:
+        samples = (np.repeat(samples[:, :1], channels, axis=1) if samples.shape[1] == 1
+                   else samples.mean(axis=1, keepdims=True) if channels == 1
+                   else samples[:, :channels])
+    return fit_length(samples, length)
+
+
+# ---- features -----------------------------------------------------------------------------
+
+def _frame_sizes(sampling_rate):
+    frame_length = max(1, int(round(FRAME_LENGTH * sampling_rate)))
+    step = max(1, int(round(FRAME_STEP * sampling_rate)))
+    return frame_length, step, 1 << (frame_length - 1).bit_length()
+
+
+def _hz_to_mel(hz):
+    return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+
+def _mel_to_hz(mel):
+    return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+
+@functools.lru_cache(maxsize=32)
+def mel_filterbank(sampling_rate, n_fft, num_mels):
+    """(num_mels, n_fft // 2 + 1) triangular filters evenly spaced on the mel scale"""
+    edges = _mel_to_hz(np.linspace(0.0, _hz_to_mel(sampling_rate / 2.0), num_mels + 2))
+    frequencies = np.linspace(0.0, sampling_rate / 2.0, n_fft // 2 + 1)
+    left, center, right = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (frequencies - left) / (center - left)
+    falling = (right - frequencies) / (right - center)
+    filters = np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+    filters.flags.writeable = False
+    return filters
+
+
+@functools.lru_cache(maxsize=32)
+def dct_matrix(num_inputs, num_outputs):
+    """Orthonormal DCT-II as a (num_outputs, num_inputs) matrix"""
+    n = np.arange(num_inputs)
+    k = np.arange(num_outputs)[:, None]
+    matrix = np.sqrt(2.0 / num_inputs) * np.cos(np.pi * k * (2 * n + 1) / (2 * num_inputs))
+    matrix[0] /= np.sqrt(2.0)
+    matrix = matrix.astype(np.float32)
+    matrix.flags.writeable = False
+    return matrix
+
+
+def num_frames(num_samples, sampling_rate):
+    frame_length, step, _ = _frame_sizes(sampling_rate)
+    return 1 + max(0, num_samples - frame_length) // step
+
+
+def mfcc(waveforms, sampling_rate, num_mfcc=13):
+    """MFCCs of (..., samples, channels) waveforms as float32 (..., frames, channels * num_mfcc).
+
+    Every clip, channel and frame goes through the same handful of array operations, so a
+    whole batch costs one FFT call and two matrix products.
+    """
+    frame_length, step, n_fft = _frame_sizes(sampling_rate)
+    signals = np.moveaxis(np.asarray(waveforms, dtype=np.float32), -1, -2)
+    if signals.shape[-1] < frame_length:
+        signals = np.moveaxis(fit_length(np.moveaxis(signals, -1, 0), frame_length), 0, -1)
+    emphasized = signals.copy()
+    emphasized[..., 1:] -= PRE_EMPHASIS * signals[..., :-1]
+
+    # (..., channels, frames, frame_length) views into the emphasized signal
+    frames = sliding_window_view(emphasized, frame_length, axis=-1)[..., ::step, :]
+    spectrum = np.fft.rfft(frames * np.hamming(frame_length).astype(np.float32), n_fft)
+    power = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32) / n_fft
+
+    num_mels = max(NUM_MELS, num_mfcc)
+    energies = power @ mel_filterbank(sampling_rate, n_fft, num_mels).T
+    coefficients = np.log(np.maximum(energies, LOG_FLOOR)) @ dct_matrix(num_mels, num_mfcc).T
+    coefficients = np.moveaxis(coefficients, -3, -2)
+    return np.ascontiguousarray(coefficients.reshape(*coefficients.shape[:-2], -1), dtype=np.float32)
+
+
+def feature_shape(layer):
+    """Shape of one clip's MFCC features for an AudioInputLayer"""
+    samples = int(layer.sampling_rate * layer.duration)
+    return num_frames(samples, layer.sampling_rate), layer.channels * layer.num_mfcc
+
+
+class FeatureCache:
+    """MFCC features of audio files for one AudioInputLayer configuration.
+
+    With a directory, each file's features are written once as a .npy file named after
+    the file's path, size and mtime, under a subdirectory for the configuration, and read
+    back memory-mapped. Without one, features are computed on every call.
+    """
+
+    def __init__(self, layer, directory=None):
+        self.sampling_rate = layer.sampling_rate
+        self.num_samples = int(layer.sampling_rate * layer.duration)
+        self.num_mfcc = layer.num_mfcc
+        self.channels = layer.channels
+        self.shape = feature_shape(layer)
+        self.directory = None
+        if directory is not None:
+            config = {
+                "version": FEATURE_VERSION,
+                "sampling_rate": self.sampling_rate,
+                "samples": self.num_samples,
+                "num_mfcc": self.num_mfcc,
+                "channels": self.channels,
+                "frame_length": FRAME_LENGTH,
+                "frame_step": FRAME_STEP,
+                "num_mels": NUM_MELS
+            }
+            digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+            self.directory = os.path.join(directory, digest)
+            os.makedirs(self.directory, exist_ok=True)
+
+    def load(self, path):
+        """Features of one file, shaped self.shape"""
+        return self.load_batch([path])[0]
+
+    def load_batch(self, paths, out=None):
+        """Features of several files as (len(paths), *self.shape), computing the ones not
+        cached yet together"""
+        if out is None:
+            out = np.empty((len(paths), *self.shape), dtype=np.float32)
+        missing = []
+        for index, path in enumerate(paths):
+            cached = self._cached(path)
+            if cached is None:
+                missing.append(index)
+            else:
+                out[index] = cached
+        if missing:
+            waveforms = np.stack([load_waveform(paths[index], self.sampling_rate, self.num_samples, self.channels)
+                                  for index in missing])
+            features = mfcc(waveforms, self.sampling_rate, self.num_mfcc)
+            for index, clip in zip(missing, features):
+                out[index] = clip
+                self._store(paths[index], clip)
+        return out
+
+    def _entry(self, path):
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + '.npy')
+
+    def _cached(self, path):
+        if self.directory is None:
+            return None
+        try:
+            return np.load(self._entry(path), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, path, features):
+        if self.directory is None:
+            return
+        entry = self._entry(path)
+        temporary = f"{entry}.{os.getpid()}.{id(features)}.tmp"
+        with open(temporary, 'wb') as f:
+            np.save(f, features)
+        os.replace(temporary, entry)
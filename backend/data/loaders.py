@@ -0,0 +1,215 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from data.audio import FeatureCache, feature_shape, load_waveform
+from data.pipeline import DataLoader
+from data.tabular_cache import ingest_csv
+from data.transforms import convert_channels, resize_bilinear
+from data.video import VideoDecoder
+
+
+# Input layer class name -> factory(layer, samples, options) -> DataLoader keyword arguments.
+# Looked up along the layer's MRO like shape rules and kernels.
+LOADERS = {}
+
+def loader(*layer_types):
+    def register(factory):
+        for layer_type in layer_types:
+            LOADERS[layer_type] = factory
+        return factory
+    return register
+
+
+def find_loader(layer):
+    for cls in type(layer).__mro__:
+        factory = LOADERS.get(cls.__name__)
+        if factory is not None:
+            return factory
+    return None
+
+
+def create_loader(layer, samples, batch_size=32, shuffle_buffer=0, num_workers=None, prefetch=2,
+                  drop_last=False, seed=0, target_shape=(), target_dtype=np.int64, **options):
+    """Build a DataLoader that feeds batches shaped for an input layer.
+
+    samples are sources (file paths, or for tabular data CSV files) or (source, target)
+    pairs; pass target_shape=None for unlabelled data. Other options go to the layer's
+    loader factory.
+    """
+    factory = find_loader(layer)
+    if factory is None:
+        raise ValueError(f"No data loader for {type(layer).__name__}")
+    arguments = dict(batch_size=batch_size, shuffle_buffer=shuffle_buffer, prefetch=prefetch,
+                     drop_last=drop_last, seed=seed, target_shape=target_shape, target_dtype=target_dtype)
+    arguments.update(factory(layer, samples, dict(options, shuffle_buffer=shuffle_buffer, num_workers=num_workers)))
+    if num_workers is not None:
+        arguments['num_workers'] = num_workers
+    return DataLoader(**arguments)
+
+
+def list_samples(root, extensions):
+    """Return ([(path, class index)], class names) for a directory with one subdirectory per class"""
+    extensions = tuple(extension.lower() for extension in extensions)
+    classes = sorted(entry.name for entry in os.scandir(root) if entry.is_dir())
+    samples = []
+    for index, name in enumerate(classes):
+        for directory, _, files in os.walk(os.path.join(root, name)):
+            samples.extend((os.path.join(directory, file), index)
+                           for file in sorted(files) if file.lower().endswith(extensions))
+    return samples, classes
+
+
+def _labelled(decode):
+    def decode_sample(sample):
+        source, target = sample if isinstance(sample, tuple) else (sample, None)
+        return decode(source), target
+    return decode_sample
+
+
+def _layer_shape(layer):
+    from shape_inference import infer_layer_shape
+    _, shape, error = infer_layer_shape(layer, [])
+    if shape is None:
+        raise ValueError(error or f"{type(layer).__name__} has no shape")
+    return shape
+
+
+# ---- images -------------------------------------------------------------------------------
+
+def read_netpbm(path):
+    """Read a binary PGM (P5) or PPM (P6) file as (height, width, channels) plus its maxval"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    tokens, position = [], 0
+    while len(tokens) < 4:
+        while data[position:position + 1].isspace():
+            position += 1
+        if data[position:position + 1] == b'#':
+            position = data.index(b'\n', position) + 1
+            continue
+        start = position
+        while not data[position:position + 1].isspace():
+            position += 1
+        tokens.append(data[start:position])
+    magic, width, height, maxval = tokens[0], int(tokens[1]), int(tokens[2]), int(tokens[3])
+    if magic not in (b'P5', b'P6'):
+        raise ValueError(f"Unsupported netpbm format {magic.decode()} in {path}")
+    channels = 3 if magic == b'P6' else 1
+    dtype = np.dtype('>u2') if maxval > 255 else np.dtype(np.uint8)
+    pixels = np.frombuffer(data, dtype=dtype, count=width * height * channels, offset=position + 1)
+    return pixels.reshape(height, width, channels), maxval
+
+
+def read_image(path):
+    """Read an image as float32 (height, width, channels) in [0, 1]. NPY and binary
+    PGM/PPM are read directly; anything else needs Pillow."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        image = np.load(path)
+        if image.ndim == 2:
+            image = image[..., None]
+        if image.dtype.kind in 'ui':
+            return image.astype(np.float32) / np.iinfo(image.dtype).max
+        return image.astype(np.float32)
+    if extension in ('.pgm', '.ppm', '.pnm'):
+        image, maxval = read_netpbm(path)
+        return image.astype(np.float32) / maxval
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ValueError(f"Reading {extension} images requires Pillow")
+    with Image.open(path) as opened:
+        image = np.asarray(opened)
+    if image.ndim == 2:
+        image = image[..., None]
+    return image.astype(np.float32) / 255.0
+
+
+@loader('ImageInputLayer')
+def _image_loader(layer, samples, options):
+    shape = _layer_shape(layer)
+
+    def decode(path):
+        return resize_bilinear(convert_channels(read_image(path), layer.channels), shape[:2])
+
+    return dict(samples=samples, decode=_labelled(decode), sample_shape=shape, num_workers=4)
+
+
+# ---- text ---------------------------------------------------------------------------------
+
+@loader('TextInputLayer')
+def _text_loader(layer, samples, options):
+    from data.text import encode_documents, get_tokenizer
+    vocabulary = options.get('vocabulary')
+    if vocabulary is None:
+        raise ValueError("TextInputLayer data needs a vocabulary (see data.text.encode_corpus)")
+    tokenize = get_tokenizer(layer.tokenizer)
+
+    def decode(text):
+        return encode_documents([text], vocabulary, tokenize, layer.sequence_length)[0]
+
+    # Tokenizing holds the GIL, so threads would only add overhead
+    return dict(samples=samples, decode=_labelled(decode), sample_shape=(layer.sequence_length,),
+                dtype=np.int32, num_workers=0)
+
+
+# ---- tabular ------------------------------------------------------------------------------
+
+@loader('TabularInputLayer')
+def _tabular_loader(layer, samples, options):
+    """Rows of CSV files (samples), ingested once into a memory-mapped TabularCache under
+    cache_dir (by default a directory in the system temp dir named after the files)"""
+    paths = [samples] if isinstance(samples, (str, os.PathLike)) else list(samples)
+    directory = options.get('cache_dir') or _default_tabular_cache(paths)
+    cache = ingest_csv(layer, paths, directory, options.get('target_column'),
+                       options.get('target_type', 'numeric'))
+
+    def gather(rows, inputs, targets):
+        # Sorted so every column is read front to back; the batch is shuffled as a whole
+        rows = np.sort(np.fromiter(rows, dtype=np.int64, count=len(rows)))
+        cache.features(rows, inputs)
+        if targets is not None:
+            if cache.target is None:
+                raise ValueError("Labelled tabular batches need a target_column")
+            targets[:] = cache.target[rows].reshape(targets.shape)
+
+    return dict(samples=range(len(cache)), decode=None, gather=gather, sample_shape=(layer.num_features,),
+                num_workers=0)
+
+
+def _default_tabular_cache(paths):
+    key = '\0'.join(os.path.abspath(path) for path in paths)
+    return os.path.join(tempfile.gettempdir(), 'tabular-cache', hashlib.sha256(key.encode()).hexdigest()[:16])
+
+
+# ---- audio --------------------------------------------------------------------------------
+
+@loader('AudioInputLayer')
+def _audio_loader(layer, samples, options):
+    """Waveforms shaped like the layer, or with features='mfcc' its MFCC features
+    (cached under cache_dir when given)"""
+    if options.get('features') == 'mfcc':
+        cache = FeatureCache(layer, options.get('cache_dir'))
+        return dict(samples=samples, decode=_labelled(cache.load), sample_shape=feature_shape(layer),
+                    num_workers=4)
+    shape = _layer_shape(layer)
+
+    def decode(path):
+        return load_waveform(path, layer.sampling_rate, shape[0], layer.channels)
+
+    return dict(samples=samples, decode=_labelled(decode), sample_shape=shape, num_workers=4)
+
+
+# ---- video --------------------------------------------------------------------------------
+
+@loader('VideoInputLayer')
+def _video_loader(layer, samples, options):
+    num_workers = options['num_workers'] if options['num_workers'] is not None else 2
+    # Clips can be waiting on the decode window or in the shuffle buffer, plus the one being copied
+    ring_size = max(num_workers, 1) * 2 + options['shuffle_buffer'] + 1
+    decode = VideoDecoder(layer, ring_size, options.get('source_rate'))
+    return dict(samples=samples, decode=_labelled(decode), sample_shape=_layer_shape(layer),
+                num_workers=num_workers)
@@ -0,0 +1,168 @@
+import queue
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class DataLoader:
+    """Streams (inputs, targets) batches decoded from an iterable of samples.
+
+    decode(sample) -> (x, y) runs on a pool of num_workers threads (inline when 0), at
+    most num_workers * 2 samples ahead. Decoded samples pass through a shuffle buffer of
+    shuffle_buffer samples and are copied into preallocated batch arrays. A background
+    thread keeps up to prefetch batches ready, so memory stays bounded however large the
+    dataset is.
+
+    Batch arrays are reused: a yielded batch is only valid until the next one is taken,
+    so copy it to keep it longer, and iterate one loader from one place at a time.
+    targets is None when target_shape is None.
+
+    Sources that can read many samples at once give gather(samples, inputs, targets)
+    instead of decode: samples are then shuffled as they are, and gather fills each
+    batch's arrays (targets being None when unlabelled) from its list of samples.
+    """
+
+    def __init__(self, samples, decode, sample_shape, dtype=np.float32, target_shape=(), target_dtype=np.int64,
+                 batch_size=32, shuffle_buffer=0, num_workers=4, prefetch=2, drop_last=False, seed=0,
+                 gather=None):
+        self.samples = samples
+        self.decode = decode
+        self.gather = gather
+        self.sample_shape = tuple(sample_shape)
+        self.dtype = dtype
+        self.target_shape = tuple(target_shape) if target_shape is not None else None
+        self.target_dtype = target_dtype
+        self.batch_size = batch_size
+        self.shuffle_buffer = shuffle_buffer
+        self.num_workers = num_workers
+        self.prefetch = max(1, prefetch)
+        self.drop_last = drop_last
+        self.seed = seed
+        self._epoch = 0
+        # The producer can be filling one buffer while prefetch wait in the queue and the
+        # consumer holds one more
+        self._buffers = [self._allocate() for _ in range(self.prefetch + 2)]
+
+    def __iter__(self):
+        rng = random.Random(self.seed + self._epoch)
+        self._epoch += 1
+        batches = queue.Queue(self.prefetch)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(batches, stop, rng), daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = batches.get()
+                if item is _END:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            stop.set()
+            # Unblock a producer waiting on a full queue
+            while producer.is_alive():
+                try:
+                    batches.get_nowait()
+                except queue.Empty:
+                    producer.join(0.01)
+
+    def _allocate(self):
+        inputs = np.empty((self.batch_size, *self.sample_shape), dtype=self.dtype)
+        targets = (np.empty((self.batch_size, *self.target_shape), dtype=self.target_dtype)
+                   if self.target_shape is not None else None)
+        return inputs, targets
+
+    def _produce(self, batches, stop, rng):
+        try:
+            slot = 0
+            count = 0
+            picked = []
+            inputs, targets = self._buffers[slot]
+            items = iter(self.samples) if self.gather is not None else self._decoded(stop)
+            for item in self._shuffled(items, rng):
+                if stop.is_set():
+                    return
+                if self.gather is not None:
+                    picked.append(item)
+                else:
+                    inputs[count], y = item
+                    if targets is not None:
+                        targets[count] = y
+                count += 1
+                if count == self.batch_size:
+                    if self.gather is not None:
+                        self.gather(picked, inputs, targets)
+                        picked = []
+                    if not self._put(batches, stop, (inputs, targets)):
+                        return
+                    slot = (slot + 1) % len(self._buffers)
+                    inputs, targets = self._buffers[slot]
+                    count = 0
+            if count and not self.drop_last:
+                inputs, targets = inputs[:count], (targets[:count] if targets is not None else None)
+                if self.gather is not None:
+                    self.gather(picked, inputs, targets)
+                self._put(batches, stop, (inputs, targets))
+            self._put(batches, stop, _END)
+        except Exception as e:
+            self._put(batches, stop, _Failure(e))
+
+    def _put(self, batches, stop, item):
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decoded(self, stop):
+        if not self.num_workers:
+            for sample in self.samples:
+                yield self.decode(sample)
+            return
+        window = self.num_workers * 2
+        with ThreadPoolExecutor(self.num_workers) as pool:
+            pending = deque()
+            try:
+                for sample in self.samples:
+                    if stop.is_set():
+                        return
+                    pending.append(pool.submit(self.decode, sample))
+                    if len(pending) >= window:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _shuffled(self, items, rng):
+        if self.shuffle_buffer <= 1:
+            yield from items
+            return
+        buffer = []
+        for item in items:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(item)
+                continue
+            # Emit a random buffered sample and put the new one in its place
+            index = rng.randrange(len(buffer))
+            buffer[index], item = item, buffer[index]
+            yield item
+        rng.shuffle(buffer)
+        yield from buffer
+
+
+class _Failure:
+    __slots__ = ('error',)
+
+    def __init__(self, error):
+        self.error = error
+
+
+_END = object()
@@ -0,0 +1,218 @@
+import csv
+import json
+import os
+import shutil
+
+import numpy as np
+
+
+# Column kind -> on-disk dtype. Categorical columns hold codes into the column's dictionary.
+COLUMN_DTYPES = {'numeric': np.float32, 'integer': np.int64, 'categorical': np.int32}
+
+CHUNK_ROWS = 65536
+META_FILE = 'meta.json'
+
+
+class TabularCache:
+    """A CSV dataset ingested into one .npy file per column, opened as read-only memory maps.
+
+    Slicing a column reads straight from the page cache, which every process that opens
+    the same directory shares. categories[i] lists the values of categorical column i in
+    code order (None for other columns).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.feature_types = self.meta['feature_types']
+        self.categories = self.meta['categories']
+        self.columns = [np.load(os.path.join(directory, f'column_{index}.npy'), mmap_mode='r')
+                        for index in range(len(self.feature_types))]
+        self.target = (np.load(os.path.join(directory, 'target.npy'), mmap_mode='r')
+                       if self.meta['target_type'] is not None else None)
+        self.target_categories = self.meta['target_categories']
+
+    def __len__(self):
+        return self.meta['rows']
+
+    @property
+    def num_features(self):
+        return len(self.columns)
+
+    def features(self, rows, out=None):
+        """Gather rows (a slice or sorted index array) into a (n, num_features) float32 array"""
+        for index, column in enumerate(self.columns):
+            values = column[rows]
+            if out is None:
+                out = np.empty((len(values), len(self.columns)), dtype=np.float32)
+            out[:, index] = values
+        return out
+
+    def batches(self, batch_size=32, shuffle=False, seed=0, drop_last=False):
+        """Yield (features, targets) batches. Like DataLoader batches, the arrays are
+        reused, so a batch is only valid until the next one is taken."""
+        rows = len(self)
+        order = np.random.default_rng(seed).permutation(rows) if shuffle else None
+        features = np.empty((batch_size, self.num_features), dtype=np.float32)
+        targets = np.empty(batch_size, dtype=self.target.dtype) if self.target is not None else None
+        stop = rows - rows % batch_size if drop_last else rows
+        for start in range(0, stop, batch_size):
+            count = min(batch_size, rows - start)
+            if order is None:
+                picked = slice(start, start + count)
+            else:
+                # Sorted indexes keep the reads moving forward through each column file
+                picked = np.sort(order[start:start + count])
+            self.features(picked, features[:count])
+            if targets is not None:
+                targets[:count] = self.target[picked]
+            yield features[:count], (targets[:count] if targets is not None else None)
+
+
+def ingest_csv(layer, paths, directory, target_column=None, target_type='numeric', chunk_rows=CHUNK_ROWS):
+    """Convert CSV files with a header row into a TabularCache at directory for a
+    TabularInputLayer, and open it.
+
+    The first layer.num_features columns other than target_column become features, typed
+    by layer.feature_types; the files are only parsed again when they, or the column
+    configuration, have changed since the last ingest.
+    """
+    paths = [paths] if isinstance(paths, (str, os.PathLike)) else list(paths)
+    num_features = layer.num_features
+    feature_types = [kind if kind in COLUMN_DTYPES else 'numeric' for kind in layer.feature_types][:num_features]
+    feature_types += ['numeric'] * (num_features - len(feature_types))
+    if target_column is None:
+        target_type = None
+    elif target_type not in COLUMN_DTYPES:
+        raise ValueError(f"Unknown target type {target_type}")
+    source = {
+        "files": [_fingerprint(path) for path in paths],
+        "feature_types": feature_types,
+        "target_column": target_column,
+        "target_type": target_type
+    }
+    try:
+        cache = TabularCache(directory)
+        if cache.meta['source'] == source:
+            return cache
+    except (OSError, ValueError, KeyError):
+        pass
+
+    staging = f"{directory.rstrip(os.sep)}.ingest-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    kinds = feature_types + ([target_type] if target_type is not None else [])
+    writers = [_ColumnWriter(os.path.join(staging, f'column_{index}.npy'), COLUMN_DTYPES[kind])
+               for index, kind in enumerate(feature_types)]
+    if target_type is not None:
+        writers.append(_ColumnWriter(os.path.join(staging, 'target.npy'), COLUMN_DTYPES[target_type]))
+    dictionaries = [{} if kind == 'categorical' else None for kind in kinds]
+    try:
+        rows = 0
+        for chunk in _read_chunks(paths, num_features, target_column, chunk_rows):
+            rows += len(chunk[0])
+            for values, kind, dictionary, writer in zip(chunk, kinds, dictionaries, writers):
+                writer.write(_encode(values, kind, dictionary))
+        for writer in writers:
+            writer.close()
+        categories = [list(dictionary) if dictionary is not None else None for dictionary in dictionaries]
+        meta = {
+            "rows": rows,
+            "source": source,
+            "feature_types": feature_types,
+            "categories": categories[:num_features],
+            "target_type": target_type,
+            "target_categories": categories[num_features] if target_type == 'categorical' else None
+        }
+        with open(os.path.join(staging, META_FILE), 'w') as f:
+            json.dump(meta, f)
+        # Swap the finished cache in whole so readers never see a partial one
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+    except BaseException:
+        for writer in writers:
+            writer.close()
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return TabularCache(directory)
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def _read_chunks(paths, num_features, target_column, chunk_rows):
+    # Yields lists of column value lists: the features, then the target if there is one
+    width = num_features + (target_column is not None)
+    columns = [[] for _ in range(width)]
+    for path in paths:
+        with open(path, newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                continue
+            target = (target_column if target_column is None or isinstance(target_column, int)
+                      else header.index(target_column))
+            features = [index for index in range(len(header)) if index != target][:num_features]
+            if len(features) < num_features:
+                raise ValueError(f"{path} has {len(features)} feature columns, expected {num_features}")
+            picked = features + ([target] if target is not None else [])
+            for row in reader:
+                if not row:
+                    continue
+                for values, index in zip(columns, picked):
+                    values.append(row[index])
+                if len(columns[0]) == chunk_rows:
+                    yield columns
+                    columns = [[] for _ in range(width)]
+    if columns[0]:
+        yield columns
+
+
+def _encode(values, kind, dictionary):
+    if kind == 'categorical':
+        return np.fromiter((dictionary.setdefault(value, len(dictionary)) for value in values),
+                           dtype=np.int32, count=len(values))
+    dtype = COLUMN_DTYPES[kind]
+    try:
+        return np.array(values, dtype=dtype)
+    except ValueError:
+        # Missing numbers become NaN (0 for integer columns)
+        missing = np.nan if kind == 'numeric' else 0
+        return np.array([value if value.strip() else missing for value in values], dtype=dtype)
+
+
+class _ColumnWriter:
+    """Appends chunks to a 1-D .npy file whose length is only known once it is closed"""
+
+    def __init__(self, path, dtype):
+        self.file = open(path, 'wb')
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        # A placeholder header as wide as any real one; rewritten with the row count on close
+        self._write_header(np.iinfo(np.int64).max)
+        self.header_size = self.file.tell()
+
+    def _write_header(self, rows):
+        np.lib.format.write_array_header_1_0(self.file, {
+            'descr': np.lib.format.dtype_to_descr(self.dtype),
+            'fortran_order': False,
+            'shape': (rows,)
+        })
+
+    def write(self, values):
+        self.file.write(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+        self.rows += len(values)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.seek(0)
+        try:
+            self._write_header(self.rows)
+            if self.file.tell() != self.header_size:
+                raise ValueError(f"Header of {self.file.name} no longer fits its placeholder")
+        finally:
+            self.file.close()
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+from itertools import chain
+
+import numpy as np
+
+
+PAD_ID = 0
+UNKNOWN_ID = 1
+SPECIAL_TOKENS = ['<pad>', '<unk>']
+
+# Bumped whenever tokenization or the cache layout changes, so stale caches are not reused
+CACHE_VERSION = 1
+
+CHUNK_DOCUMENTS = 8192
+
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Tokenizer name (TextInputLayer.tokenizer) -> function(text) -> list of tokens
+TOKENIZERS = {}
+
+
+def tokenizer(*names):
+    def register(function):
+        for name in names:
+            TOKENIZERS[name] = function
+        return function
+    return register
+
+
+def get_tokenizer(name):
+    function = TOKENIZERS.get(name)
+    if function is None:
+        raise ValueError(f"Unknown tokenizer {name}")
+    return function
+
+
+@tokenizer('word')
+def _words(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+@tokenizer('whitespace')
+def _whitespace(text):
+    return text.split()
+
+
+@tokenizer('char', 'character')
+def _characters(text):
+    return list(text)
+
+
+class Vocabulary:
+    """Tokens in id order, with a dict from token to id for constant-time lookups.
+    Ids 0 and 1 are padding and unknown tokens."""
+
+    def __init__(self, tokens):
+        self.tokens = list(tokens)
+        self.index = {token: id for id, token in enumerate(self.tokens)}
+
+    def __len__(self):
+        return len(self.tokens)
+
+    @classmethod
+    def build(cls, documents, tokenize, vocab_size, min_count=1):
+        """The vocab_size - 2 most frequent tokens of the documents, ties broken by token"""
+        counts = Counter(chain.from_iterable(map(tokenize, documents)))
+        ranked = sorted((item for item in counts.items() if item[1] >= min_count), key=lambda item: (-item[1], item[0]))
+        return cls(SPECIAL_TOKENS + [token for token, _ in ranked[:max(0, vocab_size - len(SPECIAL_TOKENS))]])
+
+    def lookup(self, tokens):
+        get = self.index.get
+        return [get(token, UNKNOWN_ID) for token in tokens]
+
+    def digest(self):
+        return hashlib.sha256('\n'.join(self.tokens).encode()).hexdigest()
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.tokens, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+
+def encode_documents(documents, vocabulary, tokenize, sequence_length, out=None):
+    """Encode documents as a (len(documents), sequence_length) int32 array, truncating long
+    documents and padding short ones with PAD_ID at the end"""
+    if out is None:
+        out = np.empty((len(documents), sequence_length), dtype=np.int32)
+    lookup = vocabulary.lookup
+    positions = np.arange(sequence_length)
+    for start in range(0, len(documents), CHUNK_DOCUMENTS):
+        rows = [lookup(tokenize(document)[:sequence_length])
+                for document in documents[start:start + CHUNK_DOCUMENTS]]
+        lengths = np.fromiter(map(len, rows), dtype=np.intp, count=len(rows))
+        chunk = out[start:start + len(rows)]
+        chunk.fill(PAD_ID)
+        # One scatter of every id in the chunk instead of a slice assignment per document
+        chunk[positions < lengths[:, None]] = np.fromiter(
+            chain.from_iterable(rows), dtype=np.int32, count=int(lengths.sum()))
+    return out
+
+
+def corpus_digest(documents, config):
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode())
+    for document in documents:
+        data = document.encode('utf-8')
+        # Length prefixes keep ['ab', 'c'] and ['a', 'bc'] apart
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def encode_corpus(documents, vocab_size=10000, sequence_length=100, tokenizer='word', vocabulary=None,
+                  cache_dir=None):
+    """Return (ids, vocabulary) for a sequence of documents, building the vocabulary from
+    them unless one is given.
+
+    With a cache_dir the ids and vocabulary are stored under a hash of the corpus and the
+    tokenizer configuration; a repeat call with the same inputs memory-maps the stored ids
+    instead of tokenizing again.
+    """
+    tokenize = get_tokenizer(tokenizer)
+    if cache_dir is None:
+        if vocabulary is None:
+            vocabulary = Vocabulary.build(documents, tokenize, vocab_size)
+        return encode_documents(documents, vocabulary, tokenize, sequence_length), vocabulary
+
+    config = {
+        "version": CACHE_VERSION,
+        "tokenizer": tokenizer,
+        "vocab_size": vocab_size,
+        "sequence_length": sequence_length,
+        "vocabulary": vocabulary.digest() if vocabulary is not None else None
+    }
+    key = corpus_digest(documents, config)
+    ids_path = os.path.join(cache_dir, f'{key}.npy')
+    vocabulary_path = os.path.join(cache_dir, f'{key}.vocab.json')
+    try:
+        return np.load(ids_path, mmap_mode='r'), Vocabulary.load(vocabulary_path)
+    except (OSError, ValueError):
+        pass
+
+    if vocabulary is None:
+        vocabulary = Vocabulary.build(documents, tokenize, vocab_size)
+    os.makedirs(cache_dir, exist_ok=True)
+    ids = np.lib.format.open_memmap(f'{ids_path}.{os.getpid()}.tmp', mode='w+', dtype=np.int32,
+                                    shape=(len(documents), sequence_length))
+    encode_documents(documents, vocabulary, tokenize, sequence_length, out=ids)
+    ids.flush()
+    del ids
+    # The vocabulary goes first: the ids file is what marks the entry as complete
+    vocabulary.save(f'{vocabulary_path}.{os.getpid()}.tmp')
+    os.replace(f'{vocabulary_path}.{os.getpid()}.tmp', vocabulary_path)
+    os.replace(f'{ids_path}.{os.getpid()}.tmp', ids_path)
+    return np.load(ids_path, mmap_mode='r'), vocabulary
+
+
+def encode_for_layer(layer, documents, vocabulary=None, cache_dir=None):
+    """encode_corpus with a TextInputLayer's vocab_size, sequence_length and tokenizer"""
+    return encode_corpus(documents, vocab_size=layer.vocab_size, sequence_length=layer.sequence_length,
+                         tokenizer=layer.tokenizer, vocabulary=vocabulary, cache_dir=cache_dir)
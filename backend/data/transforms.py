@@ -0,0 +1,60 @@
+import numpy as np
+
+
+LUMINANCE = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def _sample_positions(size_in, size_out):
+    # Pixel centres of the output grid mapped onto the input grid
+    positions = (np.arange(size_out, dtype=np.float32) + 0.5) * (size_in / size_out) - 0.5
+    positions = np.clip(positions, 0, size_in - 1)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, size_in - 1)
+    return lower, upper, (positions - lower).astype(np.float32)
+
+
+def resize_bilinear(images, size, out=None):
+    """Bilinearly resize (..., H, W, C) images to (..., height, width, C) as float32.
+
+    Any leading dimensions (a batch, the frames of a clip) are resized in one pass.
+    """
+    height, width = size
+    if images.shape[-3:-1] == (height, width):
+        if out is None:
+            return images.astype(np.float32)
+        out[...] = images
+        return out
+    y0, y1, wy = _sample_positions(images.shape[-3], height)
+    x0, x1, wx = _sample_positions(images.shape[-2], width)
+
+    top = images[..., y0, :, :].astype(np.float32)
+    rows = top + (images[..., y1, :, :] - top) * wy[:, None, None]
+    left = rows[..., x0, :]
+    result = left + (rows[..., x1, :] - left) * wx[:, None]
+    if out is None:
+        return result
+    out[...] = result
+    return out
+
+
+def convert_channels(image, channels):
+    """Adapt the last axis of an image to the requested number of channels"""
+    have = image.shape[-1]
+    if have == channels:
+        return image
+    if have == 1:
+        return np.repeat(image, channels, axis=-1)
+    if channels == 1 and have in (3, 4):
+        return (image[..., :3] @ LUMINANCE)[..., None]
+    if channels == 3 and have == 4:
+        return image[..., :3]
+    raise ValueError(f"Cannot convert {have} channels to {channels}")
+
+
+def fit_length(samples, length):
+    """Trim or zero-pad the first axis of samples to length"""
+    if len(samples) >= length:
+        return samples[:length]
+    padded = np.zeros((length, *samples.shape[1:]), dtype=samples.dtype)
+    padded[:len(samples)] = samples
+    return padded
@@ -0,0 +1,143 @@
+import os
+import threading
+
+import numpy as np
+
+from data.transforms import convert_channels, resize_bilinear
+
+
+# Y4M chroma layouts -> (horizontal, vertical) subsampling; 'mono' has no chroma planes
+Y4M_CHROMA = {'420': (2, 2), '420jpeg': (2, 2), '420paldv': (2, 2), '420mpeg2': (2, 2),
+              '422': (2, 1), '444': (1, 1), 'mono': None}
+
+# BT.601 YUV -> RGB; chroma rows are for (U - 128, V - 128)
+YUV_TO_RGB = np.array([[0.0, -0.344136, 1.772],
+                       [1.402, -0.714136, 0.0]], dtype=np.float32)
+
+
+class Y4MReader:
+    """Random access to the frames of an uncompressed YUV4MPEG2 file.
+
+    Only the header and the per-frame markers are read up front; frames are read from
+    a memory map when asked for, so sampling a few frames of a long clip stays cheap.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.readline().split()
+            if not header or header[0] != b'YUV4MPEG2':
+                raise ValueError(f"{path} is not a Y4M file")
+            fields = {token[:1]: token[1:].decode() for token in header[1:]}
+            self.width, self.height = int(fields[b'W']), int(fields[b'H'])
+            numerator, denominator = fields.get(b'F', '25:1').split(':')
+            self.frame_rate = int(numerator) / int(denominator)
+            colorspace = fields.get(b'C', '420jpeg')
+            if colorspace not in Y4M_CHROMA:
+                raise ValueError(f"Unsupported Y4M colorspace {colorspace} in {path}")
+            self.chroma = Y4M_CHROMA[colorspace]
+            # Only the JPEG variant uses the full 0-255 range
+            self.full_range = colorspace in ('420jpeg', 'mono')
+            luma = self.width * self.height
+            chroma = 0 if self.chroma is None else 2 * (-(-self.width // self.chroma[0])) * (-(-self.height // self.chroma[1]))
+            self.frame_size = luma + chroma
+
+            self.offsets = []
+            size = os.fstat(f.fileno()).st_size
+            position = f.tell()
+            while position < size:
+                f.seek(position)
+                marker = f.readline()
+                if not marker.startswith(b'FRAME'):
+                    raise ValueError(f"Corrupt Y4M frame at byte {position} of {path}")
+                self.offsets.append(position + len(marker))
+                position += len(marker) + self.frame_size
+        self._data = np.memmap(path, dtype=np.uint8, mode='r') if self.offsets else None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def frames(self, indexes, channels=3):
+        """Decode the given frames as float32 (len(indexes), height, width, channels) in [0, 1]"""
+        out = np.empty((len(indexes), self.height, self.width, 3 if channels != 1 else 1), dtype=np.float32)
+        luma = self.width * self.height
+        for position, index in enumerate(indexes):
+            start = self.offsets[index]
+            y = self._data[start:start + luma].reshape(self.height, self.width).astype(np.float32)
+            if self.full_range:
+                y /= 255.0
+            else:
+                y = (y - 16.0) / 219.0
+            if channels == 1 or self.chroma is None:
+                out[position, ..., :] = y[..., None]
+                continue
+            sx, sy = self.chroma
+            chroma_width, chroma_height = -(-self.width // sx), -(-self.height // sy)
+            planes = self._data[start + luma:start + self.frame_size].reshape(2, chroma_height, chroma_width)
+            # Nearest-neighbour chroma upsampling back to the luma grid
+            uv = planes.repeat(sy, axis=1).repeat(sx, axis=2)[:, :self.height, :self.width].astype(np.float32)
+            uv = (uv - 128.0) / (255.0 if self.full_range else 224.0)
+            out[position] = (y[..., None] + np.moveaxis(uv, 0, -1) @ YUV_TO_RGB).clip(0.0, 1.0)
+        return convert_channels(out, channels)
+
+
+def sample_indexes(available, source_rate, frame_rate, num_frames):
+    """Indexes of num_frames frames taken frame_rate times a second from a clip of
+    available frames recorded at source_rate; short clips repeat their last frame"""
+    times = np.arange(num_frames) / frame_rate
+    return np.minimum(np.round(times * source_rate).astype(np.intp), max(available - 1, 0))
+
+
+class ClipRing:
+    """A fixed number of preallocated clip arrays handed out in turn.
+
+    A clip stays valid until size more have been taken, so size must cover every clip
+    that can be alive at once (being decoded, queued, or waiting in a shuffle buffer).
+    """
+
+    def __init__(self, size, shape):
+        self.clips = np.empty((size, *shape), dtype=np.float32)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            index = self._next
+            self._next = (index + 1) % len(self.clips)
+        return self.clips[index]
+
+
+class VideoDecoder:
+    """Decodes NPY (frames, height, width[, channels]) or Y4M files into clips shaped for a
+    VideoInputLayer: num_frames frames sampled at frame_rate, resized to frame_size.
+
+    NPY files carry no frame rate, so they are taken to be recorded at source_rate
+    (the layer's frame_rate when not given, i.e. consecutive frames are used).
+    """
+
+    def __init__(self, layer, ring_size, source_rate=None):
+        self.num_frames = layer.num_frames
+        self.frame_rate = layer.frame_rate
+        self.frame_size = tuple(layer.frame_size)
+        self.channels = layer.channels
+        self.source_rate = source_rate or layer.frame_rate
+        self.ring = ClipRing(ring_size, (self.num_frames, *self.frame_size, self.channels))
+
+    def __call__(self, path):
+        if os.path.splitext(path)[1].lower() == '.y4m':
+            reader = Y4MReader(path)
+            if not len(reader):
+                raise ValueError(f"{path} has no frames")
+            indexes = sample_indexes(len(reader), reader.frame_rate, self.frame_rate, self.num_frames)
+            frames = reader.frames(indexes, self.channels)
+        else:
+            video = np.load(path, mmap_mode='r')
+            if not len(video):
+                raise ValueError(f"{path} has no frames")
+            if video.ndim == 3:
+                video = video[..., None]
+            frames = video[sample_indexes(len(video), self.source_rate, self.frame_rate, self.num_frames)]
+            if frames.dtype.kind in 'ui':
+                frames = frames.astype(np.float32) / np.iinfo(frames.dtype).max
+            frames = convert_channels(frames, self.channels)
+        return resize_bilinear(frames, self.frame_size, out=self.ring.take())
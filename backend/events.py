@@ -0,0 +1,170 @@
+import itertools
+import json
+import threading
+from collections import OrderedDict, deque, namedtuple
+
+
+Event = namedtuple('Event', ['id', 'kind', 'data'])
+
+
+class EventStream:
+    """A bounded ring buffer of one network's events, numbered from 1.
+
+    Publishing never waits on readers: each reader tracks the id of the last event it
+    saw and reads what came after it. A reader that falls more than ``capacity`` events
+    behind is told it missed events instead of holding old ones in memory.
+    """
+
+    def __init__(self, capacity):
+        self._events = deque(maxlen=capacity)
+        self._last_id = 0
+        self._cond = threading.Condition()
+        self.readers = 0
+        self.dropped = False
+        self.closed = False
+        self._on_idle = None
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, kind, data):
+        with self._cond:
+            self._last_id += 1
+            # Serialized once here rather than once per connected reader
+            self._events.append(Event(self._last_id, kind, json.dumps(data, separators=(',', ':'))))
+            self._cond.notify_all()
+            return self._last_id
+
+    def attach(self):
+        with self._cond:
+            self.readers += 1
+
+    def detach(self):
+        with self._cond:
+            self.readers -= 1
+            on_idle = self._on_idle if not self.readers else None
+        if on_idle is not None:
+            on_idle()
+
+    def close(self, on_idle):
+        """End the stream once readers have the events published so far, and call on_idle()
+        when its last reader detaches. Returns True if it has no readers now."""
+        with self._cond:
+            self.closed = True
+            self._on_idle = on_idle
+            self._cond.notify_all()
+            return not self.readers
+
+    def drop(self):
+        """Mark the stream as no longer published to, waking its readers"""
+        with self._cond:
+            self.dropped = True
+            self._cond.notify_all()
+
+    def read(self, last_id, timeout=None):
+        """Return (events after last_id, missed), waiting up to timeout seconds for one.
+        missed is True when events after last_id have already left the buffer, when
+        last_id is from before a restart of the numbering, or when the stream was dropped."""
+        with self._cond:
+            if last_id == self._last_id and timeout and not (self.dropped or self.closed):
+                self._cond.wait(timeout)
+            if self.dropped:
+                return [], True
+            events = self._events
+            if last_id == self._last_id:
+                return [], False
+            if not events or last_id > self._last_id or last_id < events[0].id - 1:
+                return list(events), True
+            return list(itertools.islice(events, last_id - events[0].id + 1, None)), False
+
+
+class EventBus:
+    """Event streams per network id, kept for at most max_streams networks (least recently
+    used are dropped first). Streams with connected readers are never dropped, so the
+    limit can be exceeded while more networks than that are being watched."""
+
+    def __init__(self, capacity=256, max_streams=1000):
+        self.capacity = capacity
+        self.max_streams = max_streams
+        self._streams = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stream(self, network_id):
+        network_id = str(network_id)
+        with self._lock:
+            stream = self._streams.get(network_id)
+            if stream is None:
+                stream = EventStream(self.capacity)
+                self._streams[network_id] = stream
+                excess = len(self._streams) - self.max_streams
+                if excess > 0:
+                    idle = [key for key, candidate in self._streams.items() if not candidate.readers]
+                    for key in idle[:excess]:
+                        self._streams.pop(key).drop()
+            self._streams.move_to_end(network_id)
+            return stream
+
+    def publish(self, network_id, kind, data):
+        return self.stream(network_id).publish(kind, data)
+
+    def drop(self, network_id):
+        """Remove the stream of a deleted network. Connected readers still get the events
+        already published, then their body ends; the stream goes when the last one detaches."""
+        network_id = str(network_id)
+        with self._lock:
+            stream = self._streams.get(network_id)
+            if stream is not None and stream.close(lambda: self._forget(network_id, stream)):
+                del self._streams[network_id]
+
+    def _forget(self, network_id, stream):
+        with self._lock:
+            if self._streams.get(network_id) is stream:
+                del self._streams[network_id]
+
+    def record_change(self, network, change):
+        """Network listener: publish every graph change record under its op name"""
+        self.publish(network.id, change["op"], change)
+
+    def record_job(self, job):
+        """JobScheduler listener: publish job status and progress to the job's network"""
+        if job.network_id is not None:
+            self.publish(job.network_id, "progress", {
+                "job_id": job.id,
+                "kind": job.kind,
+                "status": job.status,
+                "progress": job.progress
+            })
+
+
+def format_event(event):
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {event.data}\n\n"
+
+
+def event_source(stream, last_id, keepalive=15.0, retry=3000):
+    """Generate a text/event-stream body from last_id on. When the events after last_id
+    are gone, a single ``reset`` event tells the client to reload the whole network. If
+    the bus dropped the stream before this reader attached, the body ends after the reset
+    so the client reconnects to the network's current stream. The body also ends once a
+    closed stream (of a deleted network) has no more events to send."""
+    stream.attach()
+    try:
+        yield f"retry: {retry}\n\n"
+        while True:
+            events, missed = stream.read(last_id, keepalive)
+            if missed:
+                last_id = events[-1].id if events else stream.last_id
+                yield format_event(Event(last_id, "reset", json.dumps({"last_event_id": last_id})))
+                if stream.dropped:
+                    return
+            elif events:
+                for event in events:
+                    yield format_event(event)
+                last_id = events[-1].id
+            elif not stream.closed:
+                # Comment lines keep proxies from closing an idle connection
+                yield ": keepalive\n\n"
+            if stream.closed and last_id == stream.last_id:
+                return
+    finally:
+        stream.detach()
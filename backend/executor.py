@@ -0,0 +1,688 @@
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# Layer class name -> Kernel subclass. Looked up along the layer's MRO like shape rules.
+KERNELS = {}
+
+FUSABLE_ACTIVATIONS = ('ReLUFunction', 'LeakyReLUFunction', 'TanhFunction', 'SoftMaxFunction')
+
+
+class ExecutionError(ValueError):
+    pass
+
+
+def kernel(*layer_types):
+    def register(cls):
+        for layer_type in layer_types:
+            KERNELS[layer_type] = cls
+        return cls
+    return register
+
+
+def find_kernel(layer):
+    for cls in type(layer).__mro__:
+        kernel_class = KERNELS.get(cls.__name__)
+        if kernel_class is not None:
+            return kernel_class
+    return None
+
+
+def _layer_rng(seed, layer_id):
+    return np.random.default_rng([seed, layer_id])
+
+
+class Kernel:
+    """A compiled layer: holds its parameters and computes the forward pass on a batch.
+
+    ``params`` maps names to float32 arrays. ``activation`` is an activation fused into
+    this kernel's output by the compiler, applied in place on the freshly computed array.
+    With training=True a kernel keeps what its backward pass needs; backward(grad) then
+    returns the gradient for its input and fills ``grads`` with one array per param.
+    """
+
+    def __init__(self, layer, rng):
+        self.layer_id = layer.id
+        self.input_shape = layer.input_shape
+        self.output_shape = layer.output_shape
+        self.params = {}
+        self.grads = {}
+        self.activation = None
+
+    def forward(self, x, training):
+        raise NotImplementedError
+
+    def backward(self, grad):
+        raise NotImplementedError
+
+    def run(self, x, training=False):
+        y = self.forward(x, training)
+        if self.activation is not None:
+            y = self.activation.run_fused(y, training)
+        return y
+
+    def gradient(self, grad):
+        if self.activation is not None:
+            grad = self.activation.backward(grad)
+        return self.backward(grad)
+
+
+class Activation(Kernel):
+    """Activations keep their output in training; every derivative here is a function of it"""
+
+    def run(self, x, training=False):
+        return self._keep(self.apply(x, in_place=False), training)
+
+    def run_fused(self, x, training):
+        return self._keep(self.apply(x, in_place=True), training)
+
+    def _keep(self, y, training):
+        self._output = y if training else None
+        return y
+
+    def gradient(self, grad):
+        return self.backward(grad)
+
+    def backward(self, grad):
+        return self.derivative(self._output, grad)
+
+    def apply(self, x, in_place):
+        raise NotImplementedError
+
+    def derivative(self, y, grad):
+        raise NotImplementedError
+
+
+# ---- inputs -------------------------------------------------------------------------------
+
+@kernel('BaseInputLayer', 'InputLayer')
+class InputKernel(Kernel):
+    dtype = np.float32
+
+    def forward(self, x, training):
+        x = np.asarray(x, dtype=self.dtype)
+        if x.shape[1:] != tuple(self.output_shape):
+            raise ExecutionError(
+                f"Input for layer {self.layer_id} has shape {list(x.shape[1:])}, "
+                f"expected {list(self.output_shape)}")
+        return x
+
+    def backward(self, grad):
+        return None
+
+
+@kernel('TextInputLayer')
+class TokenInputKernel(InputKernel):
+    dtype = np.int64
+
+
+# ---- weighted layers ----------------------------------------------------------------------
+
+def _glorot(rng, fan_in, fan_out, shape):
+    limit = math.sqrt(6.0 / (fan_in + fan_out))
+    return rng.uniform(-limit, limit, size=shape).astype(np.float32)
+
+
+def _as_images(x, input_shape):
+    """View (..., length, channels) or (..., height, width, channels) as (N, H, W, C)"""
+    if len(input_shape) == 2:
+        return x.reshape(-1, input_shape[0], 1, input_shape[1])
+    return x.reshape(-1, *input_shape[-3:])
+
+
+def _conv2d(images, weights, stride):
+    """Valid 2D convolution by im2col: images (N, H, W, C), weights (C, kh, kw, F)"""
+    _, kh, kw, _ = weights.shape
+    windows = sliding_window_view(images, (kh, kw), axis=(1, 2))[:, ::stride[0], ::stride[1]]
+    # windows: (N, Ho, Wo, C, kh, kw); tensordot copies them into one (N*Ho*Wo, C*kh*kw) matrix
+    return np.tensordot(windows, weights, axes=([3, 4, 5], [0, 1, 2]))
+
+
+def _conv2d_backward(images, weights, grad, stride):
+    """Gradients of _conv2d for its images and weights given grad (N, Ho, Wo, F)"""
+    _, kh, kw, _ = weights.shape
+    (sh, sw), (_, ho, wo, _) = stride, grad.shape
+    windows = sliding_window_view(images, (kh, kw), axis=(1, 2))[:, ::sh, ::sw]
+    d_weights = np.tensordot(windows, grad, axes=([0, 1, 2], [0, 1, 2]))
+    # col2im: scatter each kernel offset's contribution back onto the strided input grid
+    d_images = np.zeros_like(images)
+    for i in range(kh):
+        for j in range(kw):
+            d_images[:, i:i + sh * (ho - 1) + 1:sh, j:j + sw * (wo - 1) + 1:sw] += grad @ weights[:, i, j, :].T
+    return d_images, d_weights
+
+
+@kernel('ConvolutionalLayer')
+class ConvolutionKernel(Kernel):
+    def __init__(self, layer, rng):
+        super().__init__(layer, rng)
+        one_dimensional = len(layer.input_shape) == 2
+        k = layer.kernel_size
+        self.kernel = (k, 1) if one_dimensional else (k, k)
+        self.stride = (layer.stride, 1) if one_dimensional else (layer.stride, layer.stride)
+        self.transposed = layer.layer_type.name == 'TRANSPOSED'
+        channels = layer.input_shape[-1]
+        fan = channels * self.kernel[0] * self.kernel[1]
+        self.params = {
+            'weights': _glorot(rng, fan, layer.filters * self.kernel[0] * self.kernel[1],
+                               (channels, *self.kernel, layer.filters)),
+            'bias': np.zeros(layer.filters, dtype=np.float32)
+        }
+
+    def forward(self, x, training):
+        images = _as_images(x, self.input_shape)
+        weights = self.params['weights']
+        if self.transposed:
+            images = self._dilate_and_pad(images)
+            y = _conv2d(images, weights[:, ::-1, ::-1, :], (1, 1))
+        else:
+            y = _conv2d(images, weights, self.stride)
+        y += self.params['bias']
+        if training:
+            self._saved = (x.shape, images, y.shape)
+        return y.reshape(x.shape[0], *self.output_shape)
+
+    def backward(self, grad):
+        x_shape, images, image_grad_shape = self._saved
+        grad = grad.reshape(image_grad_shape)
+        self.grads['bias'] = grad.sum(axis=(0, 1, 2))
+        weights = self.params['weights']
+        if self.transposed:
+            d_images, d_weights = _conv2d_backward(images, weights[:, ::-1, ::-1, :], grad, (1, 1))
+            self.grads['weights'] = d_weights[:, ::-1, ::-1, :]
+            (sh, sw), (kh, kw) = self.stride, self.kernel
+            d_images = d_images[:, kh - 1:d_images.shape[1] - kh + 1:sh, kw - 1:d_images.shape[2] - kw + 1:sw]
+        else:
+            d_images, self.grads['weights'] = _conv2d_backward(images, weights, grad, self.stride)
+        return d_images.reshape(x_shape)
+
+    def _dilate_and_pad(self, images):
+        # A transposed convolution is a valid convolution over the stride-dilated input,
+        # zero padded by kernel_size - 1 on every side, with the kernel flipped
+        n, h, w, c = images.shape
+        (sh, sw), (kh, kw) = self.stride, self.kernel
+        padded = np.zeros((n, (h - 1) * sh + 2 * kh - 1, (w - 1) * sw + 2 * kw - 1, c), dtype=images.dtype)
+        padded[:, kh - 1:kh - 1 + (h - 1) * sh + 1:sh, kw - 1:kw - 1 + (w - 1) * sw + 1:sw] = images
+        return padded
+
+
+@kernel('DenseLayer')
+class DenseKernel(Kernel):
+    def __init__(self, layer, rng):
+        super().__init__(layer, rng)
+        features = layer.input_shape[-1]
+        self.params = {
+            'weights': _glorot(rng, features, layer.units, (features, layer.units)),
+            'bias': np.zeros(layer.units, dtype=np.float32)
+        }
+
+    def forward(self, x, training):
+        if training:
+            self._input = x
+        y = np.matmul(x, self.params['weights'])
+        y += self.params['bias']
+        return y
+
+    def backward(self, grad):
+        x = self._input
+        rows = grad.reshape(-1, grad.shape[-1])
+        self.grads['weights'] = x.reshape(-1, x.shape[-1]).T @ rows
+        self.grads['bias'] = rows.sum(axis=0)
+        return grad @ self.params['weights'].T
+
+
+@kernel('EmbeddingLayer')
+class EmbeddingKernel(Kernel):
+    def __init__(self, layer, rng):
+        super().__init__(layer, rng)
+        self.params = {
+            'embeddings': rng.normal(0.0, 0.05, size=(layer.vocab_size, layer.embedding_dim)).astype(np.float32)
+        }
+
+    def forward(self, x, training):
+        ids = np.asarray(x)
+        if ids.dtype.kind == 'f':
+            ids = ids.astype(np.int64)
+        vocab_size = self.params['embeddings'].shape[0]
+        if ids.size and (ids.min() < 0 or ids.max() >= vocab_size):
+            raise ExecutionError(f"Token ids for layer {self.layer_id} must be in [0, {vocab_size})")
+        if training:
+            self._ids = ids
+        return self.params['embeddings'][ids]
+
+    def backward(self, grad):
+        embeddings = self.params['embeddings']
+        d_embeddings = np.zeros_like(embeddings)
+        np.add.at(d_embeddings, self._ids.ravel(), grad.reshape(-1, embeddings.shape[1]))
+        self.grads['embeddings'] = d_embeddings
+        # Token ids are not differentiable
+        return None
+
+
+@kernel('AttentionLayer')
+class AttentionKernel(Kernel):
+    def __init__(self, layer, rng):
+        super().__init__(layer, rng)
+        features = layer.input_shape[-1]
+        self.num_heads = layer.num_heads
+        self.params = {}
+        for name in ('query', 'key', 'value', 'output'):
+            self.params[f'{name}_weights'] = _glorot(rng, features, features, (features, features))
+            self.params[f'{name}_bias'] = np.zeros(features, dtype=np.float32)
+
+    def forward(self, x, training):
+        length, features = self.input_shape[-2], self.input_shape[-1]
+        x = x.reshape(-1, length, features)
+        p = self.params
+
+        query, key, value = (self._split(x @ p[f'{name}_weights'] + p[f'{name}_bias'])
+                             for name in ('query', 'key', 'value'))
+        scale = 1.0 / math.sqrt(features // self.num_heads)
+        scores = query @ key.transpose(0, 1, 3, 2)
+        scores *= scale
+        weights = _softmax(scores, in_place=True)
+        context = self._merge(weights @ value)
+        y = context @ p['output_weights']
+        y += p['output_bias']
+        if training:
+            self._saved = (x, query, key, value, weights, context, scale)
+        return y.reshape(-1, *self.output_shape)
+
+    def backward(self, grad):
+        x, query, key, value, weights, context, scale = self._saved
+        p = self.params
+        grad = grad.reshape(context.shape)
+
+        self._project_backward('output', context, grad)
+        d_context = self._split(grad @ p['output_weights'].T)
+        d_weights = d_context @ value.transpose(0, 1, 3, 2)
+        d_value = weights.transpose(0, 1, 3, 2) @ d_context
+        d_scores = weights * (d_weights - (d_weights * weights).sum(axis=-1, keepdims=True))
+        d_scores *= scale
+        d_query = d_scores @ key
+        d_key = d_scores.transpose(0, 1, 3, 2) @ query
+
+        d_x = sum(self._project_backward(name, x, self._merge(d))
+                  for name, d in (('query', d_query), ('key', d_key), ('value', d_value)))
+        return d_x.reshape(-1, *self.input_shape)
+
+    def _project_backward(self, name, x, grad):
+        features = x.shape[-1]
+        rows = grad.reshape(-1, features)
+        self.grads[f'{name}_weights'] = x.reshape(-1, features).T @ rows
+        self.grads[f'{name}_bias'] = rows.sum(axis=0)
+        return grad @ self.params[f'{name}_weights'].T
+
+    def _split(self, x):
+        # (B, L, features) -> (B, heads, L, head size)
+        batch, length, features = x.shape
+        return x.reshape(batch, length, self.num_heads, features // self.num_heads).transpose(0, 2, 1, 3)
+
+    def _merge(self, x):
+        batch, heads, length, head_size = x.shape
+        return x.transpose(0, 2, 1, 3).reshape(batch, length, heads * head_size)
+
+
+@kernel('NormalizationLayer')
+class NormalizationKernel(Kernel):
+    epsilon = 1e-5
+
+    def __init__(self, layer, rng):
+        super().__init__(layer, rng)
+        features = layer.input_shape[-1]
+        self.params = {
+            'gamma': np.ones(features, dtype=np.float32),
+            'beta': np.zeros(features, dtype=np.float32)
+        }
+
+    def forward(self, x, training):
+        mean = x.mean(axis=-1, keepdims=True)
+        inverse_std = 1.0 / np.sqrt(x.var(axis=-1, keepdims=True) + self.epsilon)
+        normalized = (x - mean) * inverse_std
+        if training:
+            self._saved = (normalized, inverse_std)
+        y = normalized * self.params['gamma']
+        y += self.params['beta']
+        return y
+
+    def backward(self, grad):
+        normalized, inverse_std = self._saved
+        axes = tuple(range(grad.ndim - 1))
+        self.grads['gamma'] = (grad * normalized).sum(axis=axes)
+        self.grads['beta'] = grad.sum(axis=axes)
+        d_normalized = grad * self.params['gamma']
+        return inverse_std * (d_normalized
+                              - d_normalized.mean(axis=-1, keepdims=True)
+                              - normalized * (d_normalized * normalized).mean(axis=-1, keepdims=True))
+
+
+# ---- parameter-free layers ----------------------------------------------------------------
+
+@kernel('PoolingLayer')
+class PoolingKernel(Kernel):
+    def __init__(self, layer, rng):
+        super().__init__(layer, rng)
+        self.pool_size = layer.pool_size
+        self.max = layer.pooling_type.name == 'MAX'
+
+    def forward(self, x, training):
+        images = _as_images(x, self.input_shape)
+        n, h, w, c = images.shape
+        p = self.pool_size
+        ph, pw = (p, 1) if len(self.input_shape) == 2 else (p, p)
+        ho, wo = h // ph, w // pw
+        # Crop to whole windows, then split each spatial axis into (windows, window size)
+        blocks = images[:, :ho * ph, :wo * pw].reshape(n, ho, ph, wo, pw, c)
+        y = blocks.max(axis=(2, 4)) if self.max else blocks.mean(axis=(2, 4))
+        if training:
+            share = None
+            if self.max:
+                # Taken now, since a fused activation may overwrite y in place. Ties share
+                # the gradient of their window.
+                winners = blocks == y[:, :, None, :, None, :]
+                share = winners / winners.sum(axis=(2, 4), keepdims=True, dtype=np.float32)
+            self._saved = (x.shape, images.shape, blocks.shape, share)
+        return y.reshape(x.shape[0], *self.output_shape)
+
+    def backward(self, grad):
+        x_shape, images_shape, blocks_shape, share = self._saved
+        n, ho, ph, wo, pw, c = blocks_shape
+        grad = grad.reshape(n, ho, 1, wo, 1, c)
+        if self.max:
+            d_blocks = share * grad
+        else:
+            d_blocks = np.broadcast_to(grad / (ph * pw), (n, ho, ph, wo, pw, c))
+        d_images = np.zeros(images_shape, dtype=np.float32)
+        d_images[:, :ho * ph, :wo * pw] = d_blocks.reshape(n, ho * ph, wo * pw, c)
+        return d_images.reshape(x_shape)
+
+
+@kernel('FlatteningLayer')
+class FlattenKernel(Kernel):
+    def forward(self, x, training):
+        return x.reshape(x.shape[0], -1)
+
+    def backward(self, grad):
+        return grad.reshape(-1, *self.input_shape)
+
+
+@kernel('DropoutLayer')
+class DropoutKernel(Kernel):
+    def __init__(self, layer, rng):
+        super().__init__(layer, rng)
+        self.rate = layer.rate
+        self.rng = rng
+        # (first row, batch size) when x is a shard of a larger batch
+        self.rows = None
+
+    def forward(self, x, training):
+        if not training or not self.rate:
+            self._mask = None
+            return x
+        if self.rows is None:
+            draws = self.rng.random(x.shape)
+        else:
+            # Draw for the whole batch so a shard gets the rows the whole batch would
+            start, total = self.rows
+            draws = self.rng.random((total, *x.shape[1:]))[start:start + len(x)]
+        # Inverted dropout: scale the kept units so inference needs no rescaling
+        self._mask = (draws >= self.rate) / np.float32(1.0 - self.rate)
+        return x * self._mask
+
+    def backward(self, grad):
+        return grad if self._mask is None else grad * self._mask
+
+
+@kernel('ReLUFunction')
+class ReLUKernel(Activation):
+    def apply(self, x, in_place):
+        return np.maximum(x, 0, out=x if in_place else None)
+
+    def derivative(self, y, grad):
+        return grad * (y > 0)
+
+
+@kernel('LeakyReLUFunction')
+class LeakyReLUKernel(Activation):
+    def __init__(self, layer, rng):
+        super().__init__(layer, rng)
+        self.alpha = layer.alpha
+
+    def apply(self, x, in_place):
+        negative = x * self.alpha
+        return np.maximum(x, negative, out=x if in_place else None)
+
+    def derivative(self, y, grad):
+        return np.where(y > 0, grad, grad * self.alpha)
+
+
+@kernel('TanhFunction')
+class TanhKernel(Activation):
+    def apply(self, x, in_place):
+        return np.tanh(x, out=x if in_place else None)
+
+    def derivative(self, y, grad):
+        return grad * (1.0 - y * y)
+
+
+@kernel('SoftMaxFunction')
+class SoftmaxKernel(Activation):
+    def apply(self, x, in_place):
+        return _softmax(x, in_place)
+
+    def derivative(self, y, grad):
+        return y * (grad - (grad * y).sum(axis=-1, keepdims=True))
+
+
+@kernel('ActivationFunction')
+class IdentityActivationKernel(Activation):
+    def apply(self, x, in_place):
+        return x
+
+    def derivative(self, y, grad):
+        return grad
+
+
+def _softmax(x, in_place):
+    y = x if in_place else x.copy()
+    y -= y.max(axis=-1, keepdims=True)
+    np.exp(y, out=y)
+    y /= y.sum(axis=-1, keepdims=True)
+    return y
+
+
+# ---- compiled plans -----------------------------------------------------------------------
+
+class ExecutionPlan:
+    """A network compiled into kernels in topological order.
+
+    steps holds (layer id, kernel, input layer ids). Layers whose activation was fused
+    into their producer are aliased to the producer's output and have no step of their own.
+    """
+
+    def __init__(self, steps, input_ids, output_ids, aliases):
+        self.steps = steps
+        self.input_ids = input_ids
+        self.output_ids = output_ids
+        self.aliases = aliases
+        self.kernels = {layer_id: step_kernel for layer_id, step_kernel, _ in steps}
+        self._last_use = {}
+        for position, (_, _, sources) in enumerate(steps):
+            for source_id in sources:
+                self._last_use[source_id] = position
+
+    @property
+    def input_shapes(self):
+        return {layer_id: self.kernels[layer_id].output_shape for layer_id in self.input_ids}
+
+    def prepare_inputs(self, inputs):
+        """Convert inputs to one array per input layer, checking their shapes.
+        Returns ({input layer id: array}, batch size)."""
+        if not self.input_ids:
+            raise ExecutionError("Network has no input layers")
+        if not isinstance(inputs, dict):
+            if len(self.input_ids) != 1:
+                raise ExecutionError(f"Network has {len(self.input_ids)} input layers; "
+                                     "inputs must map input layer ids to batches")
+            inputs = {self.input_ids[0]: inputs}
+        else:
+            try:
+                inputs = {int(layer_id): value for layer_id, value in inputs.items()}
+            except ValueError:
+                raise ExecutionError("Input keys must be layer ids")
+
+        arrays = {}
+        sizes = set()
+        for layer_id, shape in self.input_shapes.items():
+            if layer_id not in inputs:
+                raise ExecutionError(f"Missing input for layer {layer_id}")
+            dtype = self.kernels[layer_id].dtype
+            try:
+                array = np.asarray(inputs[layer_id], dtype=dtype)
+            except (TypeError, ValueError):
+                raise ExecutionError(f"Input for layer {layer_id} is not a numeric array")
+            if array.shape[1:] != tuple(shape) or not array.shape[0]:
+                raise ExecutionError(f"Input for layer {layer_id} must have shape [batch, "
+                                     f"{', '.join(str(d) for d in shape)}], got {list(array.shape)}")
+            arrays[layer_id] = array
+            sizes.add(array.shape[0])
+        if len(sizes) > 1:
+            raise ExecutionError("All inputs must have the same batch size")
+        return arrays, sizes.pop()
+
+    def output_kernel(self, layer_id):
+        """Return the kernel that finally produces an output layer's values"""
+        producer = self.kernels[self.aliases.get(layer_id, layer_id)]
+        return producer.activation or producer
+
+    def weights(self):
+        """Return {layer id: {param name: array}} for every kernel with parameters"""
+        return {layer_id: step_kernel.params for layer_id, step_kernel in self.kernels.items()
+                if step_kernel.params}
+
+    def run(self, inputs, training=False):
+        """Run a forward pass. inputs maps input layer ids to batches, or is a single batch
+        when the network has exactly one input layer. Returns {output layer id: batch}.
+
+        With training=True kernels keep what backward() needs for this batch.
+        """
+        if not isinstance(inputs, dict):
+            if len(self.input_ids) != 1:
+                raise ExecutionError(f"Network has {len(self.input_ids)} input layers; "
+                                     "pass a dict of input layer id -> batch")
+            inputs = {self.input_ids[0]: inputs}
+        missing = [layer_id for layer_id in self.input_ids if layer_id not in inputs]
+        if missing:
+            raise ExecutionError(f"Missing inputs for layers: {missing}")
+
+        outputs = set(self.aliases.get(layer_id, layer_id) for layer_id in self.output_ids)
+        values = {}
+        for position, (layer_id, step_kernel, sources) in enumerate(self.steps):
+            if not sources:
+                y = step_kernel.run(inputs[layer_id], training)
+            elif len(sources) == 1:
+                y = step_kernel.run(values[sources[0]], training)
+            else:
+                # Several inputs of the same shape are merged by summing them
+                y = step_kernel.run(sum(values[source_id] for source_id in sources), training)
+            values[layer_id] = y
+            # Drop intermediates as soon as their last consumer has run
+            for source_id in sources:
+                if self._last_use[source_id] == position and source_id not in outputs:
+                    del values[source_id]
+
+        return {layer_id: values[self.aliases.get(layer_id, layer_id)] for layer_id in self.output_ids}
+
+    def backward(self, output_grads):
+        """Backpropagate {output layer id: gradient} through the last training-mode run,
+        leaving each kernel's parameter gradients in its ``grads``"""
+        grads = {}
+        for layer_id, grad in output_grads.items():
+            _accumulate(grads, self.aliases.get(layer_id, layer_id), grad)
+
+        for layer_id, step_kernel, sources in reversed(self.steps):
+            grad = grads.pop(layer_id, None)
+            if grad is None:
+                # Not upstream of any output that has a gradient
+                step_kernel.grads = {name: np.zeros_like(param) for name, param in step_kernel.params.items()}
+                continue
+            d_input = step_kernel.gradient(grad)
+            if d_input is not None:
+                for source_id in sources:
+                    _accumulate(grads, source_id, d_input)
+
+    def reseed(self, seed, rows=None):
+        """Reseed the random state of training-time kernels such as dropout. rows=(start,
+        total) runs the following batches as the shard from start of a batch of total samples,
+        drawing the same random values for them as that whole batch would."""
+        for layer_id, step_kernel in self.kernels.items():
+            if isinstance(step_kernel, DropoutKernel):
+                step_kernel.rng = _layer_rng(seed, layer_id)
+                step_kernel.rows = rows
+
+
+def _accumulate(grads, layer_id, grad):
+    # Never add in place: the same array may have been handed to several sources
+    grads[layer_id] = grads[layer_id] + grad if layer_id in grads else grad
+
+
+def compile_network(network, seed=0, weights=None):
+    """Compile a network into an ExecutionPlan.
+
+    Parameters are initialized deterministically from (seed, layer id), or taken from
+    ``weights`` ({layer id: {name: array}}) wherever the shapes still match.
+    """
+    with network.lock:
+        order = network.topological_order()
+        layers = network.layers
+        invalid = [layer_id for layer_id in order
+                   if layers[layer_id].output_shape is None or layers[layer_id].shape_error]
+        if invalid:
+            raise ExecutionError(f"Layers without a valid shape: {invalid}")
+        successors = {layer_id: sorted(network.successors(layer_id)) for layer_id in order}
+        predecessors = {layer_id: sorted(network.predecessors(layer_id)) for layer_id in order}
+
+        steps = []
+        aliases = {}
+        fused = {}
+        for layer_id in order:
+            layer = layers[layer_id]
+            kernel_class = find_kernel(layer)
+            if kernel_class is None:
+                raise ExecutionError(f"No kernel for {type(layer).__name__} (layer {layer_id})")
+            step_kernel = kernel_class(layer, _layer_rng(seed, layer_id))
+            _load_weights(step_kernel, (weights or {}).get(layer_id))
+
+            sources = [aliases.get(source_id, source_id) for source_id in predecessors[layer_id]]
+            if (isinstance(step_kernel, Activation) and type(layer).__name__ in FUSABLE_ACTIVATIONS
+                    and len(sources) == 1 and sources[0] in fused):
+                producer = fused.pop(sources[0])
+                producer.activation = step_kernel
+                aliases[layer_id] = sources[0]
+                continue
+
+            steps.append((layer_id, step_kernel, sources))
+            # A producer can absorb the activation that is its only consumer
+            if (not isinstance(step_kernel, (Activation, InputKernel, FlattenKernel, DropoutKernel))
+                    and len(successors[layer_id]) == 1):
+                fused[layer_id] = step_kernel
+
+        input_ids = [layer_id for layer_id, step_kernel, _ in steps if isinstance(step_kernel, InputKernel)]
+        output_ids = [layer_id for layer_id in order if not successors[layer_id]]
+        unfed = [layer_id for layer_id, step_kernel, sources in steps
+                 if not sources and not isinstance(step_kernel, InputKernel)]
+        if unfed:
+            raise ExecutionError(f"Layers with no inputs: {unfed}")
+
+    return ExecutionPlan(steps, input_ids, output_ids, aliases)
+
+
+def _load_weights(step_kernel, params):
+    if not params:
+        return
+    for name, value in params.items():
+        current = step_kernel.params.get(name)
+        if current is not None and np.shape(value) == current.shape:
+            step_kernel.params[name] = np.asarray(value, dtype=np.float32)
@@ -0,0 +1,81 @@
+from topological_order import CycleError
+
+
+class BatchError(Exception):
+    """Raised when an operation in a batch cannot be applied"""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+        self.message = message
+
+
+def apply_batch(network, operations, layer_types):
+    """Apply an ordered list of layer and connection operations atomically.
+
+    ``add_layer`` operations carry a client-side ``ref`` that later ``connect``
+    operations can use as ``source``/``target`` in place of a layer id. Refs are
+    resolved before existing layer ids. If any operation fails, every change the
+    batch made is rolled back, without listeners ever seeing it, and the error
+    (a BatchError for invalid operations) is raised.
+
+    Layers are added first, in operation order, and all connections are then added
+    in one call so large batches rebuild the topological order once.
+
+    Returns (ref -> layer id, list of connection ids in operation order).
+    """
+    refs = {}
+    pairs = []
+    pair_operations = []
+
+    with network.atomic():
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict):
+                raise BatchError(index, "Operation must be an object")
+            op = operation.get('op')
+
+            if op == 'add_layer':
+                ref = operation.get('ref')
+                if not _is_id(ref):
+                    raise BatchError(index, "add_layer requires a string or integer ref")
+                if ref in refs:
+                    raise BatchError(index, f"Duplicate ref: {ref}")
+                layer_type = operation.get('type')
+                layer_class = layer_types.get(layer_type)
+                if not layer_class:
+                    raise BatchError(index, f"Unknown layer type: {layer_type}")
+                params = operation.get('params') or {}
+                if not isinstance(params, dict):
+                    raise BatchError(index, f"Invalid params for {layer_type}: params must be an object")
+                try:
+                    layer = layer_class.from_params(params)
+                except (TypeError, ValueError, KeyError, AttributeError) as e:
+                    raise BatchError(index, f"Invalid params for {layer_type}: {e}")
+                refs[ref] = network.add_layer(layer)
+
+            elif op == 'connect':
+                source_id = _resolve(network, refs, operation.get('source'), index, "Source")
+                target_id = _resolve(network, refs, operation.get('target'), index, "Target")
+                pairs.append((source_id, target_id))
+                pair_operations.append(index)
+
+            else:
+                raise BatchError(index, f"Unknown operation: {op}")
+
+        try:
+            connections = network.add_connections(pairs)
+        except CycleError as e:
+            raise BatchError(pair_operations[e.index], str(e))
+
+    return refs, [connection.id for connection in connections]
+
+
+def _resolve(network, refs, key, index, role):
+    layer_id = refs.get(key, key) if _is_id(key) else None
+    if layer_id is None or network.find_layer(layer_id) is None:
+        raise BatchError(index, f"{role} layer not found: {key}")
+    return layer_id
+
+
+def _is_id(value):
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
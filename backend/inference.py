@@ -0,0 +1,217 @@
+import threading
+import time
+import weakref
+
+import numpy as np
+
+from executor import compile_network
+
+
+class MicroBatcher:
+    """Coalesces concurrent submissions into batches of at most max_batch_size samples.
+
+    There is no worker thread: the first waiting caller becomes the leader, collects
+    submissions for up to max_wait seconds (or until the batch is full), releases the
+    leadership so the next batch can start forming, and runs the batch it took with
+    run_batch(key, [inputs, ...]) -> [result, ...]. Only submissions with the same key
+    are batched together.
+    """
+
+    def __init__(self, run_batch, max_batch_size=64, max_wait=0.005, clock=time.monotonic):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._pending = []
+        self._leading = False
+        self.batches = 0
+        self.submissions = 0
+
+    def submit(self, key, inputs, size):
+        item = _Submission(key, inputs, size)
+        with self._cond:
+            self._pending.append(item)
+            self._cond.notify_all()
+            while not item.done:
+                if self._leading:
+                    self._cond.wait()
+                    continue
+                self._leading = True
+                batch = self._collect()
+                self._leading = False
+                self._cond.notify_all()
+                self._cond.release()
+                try:
+                    self._run(batch)
+                finally:
+                    self._cond.acquire()
+                self._cond.notify_all()
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _collect(self):
+        deadline = self._clock() + self.max_wait
+        while True:
+            key = self._pending[0].key
+            size = sum(item.size for item in self._pending if item.key == key)
+            remaining = deadline - self._clock()
+            if size >= self.max_batch_size or remaining <= 0:
+                break
+            self._cond.wait(remaining)
+
+        # The oldest submission always goes in, even if it alone exceeds the batch size
+        batch, rest, size = [], [], 0
+        for item in self._pending:
+            if item.key == key and (not batch or size + item.size <= self.max_batch_size):
+                batch.append(item)
+                size += item.size
+            else:
+                rest.append(item)
+        self._pending = rest
+        return batch
+
+    def _run(self, batch):
+        try:
+            results = self.run_batch(batch[0].key, [item.inputs for item in batch])
+        except Exception as e:
+            results, error = [None] * len(batch), e
+        else:
+            error = None
+        with self._cond:
+            self.batches += 1
+            self.submissions += len(batch)
+            for item, result in zip(batch, results):
+                item.result, item.error, item.done = result, error, True
+
+
+class _Submission:
+    __slots__ = ('key', 'inputs', 'size', 'result', 'error', 'done')
+
+    def __init__(self, key, inputs, size):
+        self.key = key
+        self.inputs = inputs
+        self.size = size
+        self.result = None
+        self.error = None
+        self.done = False
+
+
+class PredictionService:
+    """Runs forward passes for networks, coalescing concurrent requests per network.
+
+    Compiled plans are cached per network and dropped whenever the network changes;
+    a recompiled plan keeps the parameters of layers whose shapes did not change.
+    Trained weights are written to weight_store, when given, and picked up again when a
+    network is evicted from memory and reloaded.
+    """
+
+    def __init__(self, max_batch_size=64, max_wait=0.005, weight_store=None):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.weight_store = weight_store
+        self._predictors = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def predict(self, network, inputs):
+        """Run inputs ({input layer id: batch}, or one batch for a single input network)
+        and return {output layer id: batch}. Raises ExecutionError for invalid inputs."""
+        predictor = self._predictor(network)
+        plan = predictor.plan()
+        inputs, size = plan.prepare_inputs(inputs)
+        return predictor.batcher.submit(plan, inputs, size)
+
+    def weights(self, network):
+        """Return the parameters predictions for a network currently use, if any"""
+        return self._predictor(network).weights()
+
+    def load_weights(self, network, weights):
+        """Use trained parameters ({layer id: {name: array}}) for a network's predictions"""
+        self._predictor(network).load_weights(weights)
+        if self.weight_store is not None:
+            self.weight_store.save(network.id, weights)
+
+    def forget(self, network_id):
+        """Drop the stored weights of a deleted network"""
+        if self.weight_store is not None:
+            self.weight_store.delete(network_id)
+
+    def stats(self):
+        with self._lock:
+            predictors = list(self._predictors.values())
+        batches = sum(predictor.batcher.batches for predictor in predictors)
+        submissions = sum(predictor.batcher.submissions for predictor in predictors)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait": self.max_wait,
+            "batches": batches,
+            "requests": submissions,
+            "requests_per_batch": submissions / batches if batches else None
+        }
+
+    def _predictor(self, network):
+        with self._lock:
+            predictor = self._predictors.get(network)
+            if predictor is None:
+                predictor = _NetworkPredictor(network, self.max_batch_size, self.max_wait)
+                weights = self.weight_store.load(network.id) if self.weight_store is not None else None
+                if weights is not None:
+                    predictor.load_weights(weights)
+                self._predictors[network] = predictor
+            return predictor
+
+
+class _NetworkPredictor:
+    def __init__(self, network, max_batch_size, max_wait):
+        self._network = weakref.ref(network)
+        self._plan = None
+        self._weights = None
+        self._changes = 0
+        self._lock = threading.Lock()
+        self.batcher = MicroBatcher(_run_plan, max_batch_size, max_wait)
+        network.subscribe(self._invalidate)
+
+    def plan(self):
+        with self._lock:
+            plan = self._plan
+            if plan is None:
+                changes = self._changes
+                plan = compile_network(self._network(), weights=self._weights)
+                self._weights = plan.weights()
+                # Only cache the plan if the network did not change while it compiled
+                if changes == self._changes:
+                    self._plan = plan
+            return plan
+
+    def weights(self):
+        with self._lock:
+            return self._weights
+
+    def load_weights(self, weights):
+        with self._lock:
+            self._weights = weights
+            self._changes += 1
+            self._plan = None
+
+    def _invalidate(self, network, change):
+        self._changes += 1
+        self._plan = None
+
+
+def _run_plan(plan, requests):
+    sizes = [next(iter(inputs.values())).shape[0] for inputs in requests]
+    if len(requests) == 1:
+        batch = requests[0]
+    else:
+        batch = {layer_id: np.concatenate([inputs[layer_id] for inputs in requests])
+                 for layer_id in plan.input_ids}
+    outputs = plan.run(batch)
+
+    offsets = np.cumsum(sizes)[:-1]
+    results = [{} for _ in requests]
+    for layer_id, values in outputs.items():
+        for result, part in zip(results, np.split(values, offsets)):
+            result[layer_id] = part
+    return results
+
@@ -0,0 +1,298 @@
+import heapq
+import itertools
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from executor import compile_network, ExecutionError
+from neural_network import from_snapshot
+from shape_inference import shape_record
+from cost_model import cost_report
+from training import train
+
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    __slots__ = ('id', 'kind', 'network_id', 'priority', 'status', 'progress', 'result', 'error',
+                 'created', 'started', 'finished', 'cancel_requested', 'on_done')
+
+    def __init__(self, kind, network_id, priority, on_done):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.network_id = network_id
+        self.priority = priority
+        self.status = QUEUED
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = False
+        self.on_done = on_done
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "network_id": self.network_id,
+            "priority": self.priority,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "cancel_requested": self.cancel_requested,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished
+        }
+
+
+class JobScheduler:
+    """Runs heavy work in a bounded process pool so request threads never block on it.
+
+    At most max_workers jobs run at once; the rest wait in a priority queue (higher
+    priority first, then oldest first) of at most max_queued jobs. Jobs run
+    fn(context, *args) in a worker process, where context.report(record) publishes
+    progress and context.cancelled() tells a cooperative job to stop early.
+
+    listener(job) is called for every status or progress change.
+
+    Workers and the manager are started with the 'spawn' method: forking this process,
+    with request threads and the store's flusher mid-flight, would copy their locks and
+    open database connections into the children. Jobs get their network as a snapshot.
+    """
+
+    def __init__(self, max_workers=2, max_queued=100, max_finished=1000, progress_interval=0.2):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.progress_interval = progress_interval
+        self._jobs = OrderedDict()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._running = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+        # The pool and the manager process that carries progress and cancel flags start lazily
+        self._executor = None
+        self._manager = None
+        self._updates = None
+        self._cancelled = None
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def submit(self, kind, fn, args=(), network_id=None, priority=0, on_done=None):
+        """Queue fn(context, *args) and return its Job. on_done(job, result), called in the
+        parent when the job succeeds, returns the result to publish (e.g. without bulky parts).
+        Raises JobQueueFull when max_queued jobs are already waiting."""
+        with self._lock:
+            if len(self._queue) >= self.max_queued:
+                raise JobQueueFull(f"Job queue is full ({self.max_queued} jobs waiting)")
+            self._start()
+            job = Job(kind, network_id, priority, on_done)
+            self._jobs[job.id] = job
+            heapq.heappush(self._queue, (-priority, next(self._sequence), job, fn, args))
+            self._trim()
+            started = self._dispatch()
+        self._watch(started)
+        self._changed([job] + [started_job for started_job, _ in started if started_job is not job])
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self, network_id=None):
+        with self._lock:
+            return [job for job in self._jobs.values()
+                    if network_id is None or job.network_id == network_id]
+
+    def cancel(self, job_id):
+        """Cancel a queued job at once, or ask a running one to stop. Returns the job or None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return job
+            job.cancel_requested = True
+            if job.status == QUEUED:
+                self._queue = [entry for entry in self._queue if entry[2] is not job]
+                heapq.heapify(self._queue)
+                self._finish(job, CANCELLED)
+            else:
+                self._cancelled[job.id] = True
+        self._changed([job])
+        return job
+
+    def stats(self):
+        with self._lock:
+            statuses = {}
+            for job in self._jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+            return {
+                "max_workers": self.max_workers,
+                "max_queued": self.max_queued,
+                "queued": len(self._queue),
+                "running": self._running,
+                "jobs": statuses
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, manager, updates = self._executor, self._manager, self._updates
+            self._executor = self._manager = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+            updates.put(None)
+            manager.shutdown()
+
+    def _start(self):
+        if self._executor is not None:
+            return
+        context = multiprocessing.get_context('spawn')
+        self._manager = context.Manager()
+        self._updates = self._manager.Queue()
+        self._cancelled = self._manager.dict()
+        self._executor = ProcessPoolExecutor(self.max_workers, mp_context=context)
+        threading.Thread(target=self._receive_progress, args=(self._updates,), daemon=True).start()
+
+    def _dispatch(self):
+        started = []
+        while self._queue and self._running < self.max_workers:
+            _, _, job, fn, args = heapq.heappop(self._queue)
+            context = JobContext(job.id, self._updates, self._cancelled, self.progress_interval)
+            job.status = RUNNING
+            job.started = time.time()
+            self._running += 1
+            started.append((job, self._executor.submit(fn, context, *args)))
+        return started
+
+    def _watch(self, started):
+        # Outside the lock: a callback on an already finished future runs immediately
+        for job, future in started:
+            future.add_done_callback(lambda future, job=job: self._completed(job, future))
+
+    def _completed(self, job, future):
+        try:
+            result = future.result()
+        except ExecutionError as e:
+            status, result, error = FAILED, None, str(e)
+        except Exception as e:
+            status, result, error = FAILED, None, f"{type(e).__name__}: {e}"
+        else:
+            status, error = (CANCELLED if job.cancel_requested else DONE), None
+            if status == CANCELLED:
+                result = None
+            elif job.on_done is not None:
+                try:
+                    result = job.on_done(job, result)
+                except Exception as e:
+                    status, result, error = FAILED, None, f"{type(e).__name__}: {e}"
+
+        with self._lock:
+            self._running -= 1
+            job.result, job.error = result, error
+            self._finish(job, status)
+            started = []
+            if self._executor is not None:
+                self._cancelled.pop(job.id, None)
+                started = self._dispatch()
+        self._watch(started)
+        self._changed([job] + [started_job for started_job, _ in started])
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished = time.time()
+        job.on_done = None
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def _receive_progress(self, updates):
+        while True:
+            update = updates.get()
+            if update is None:
+                return
+            job_id, record = update
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == RUNNING:
+                job.progress = record
+                self._changed([job])
+
+    def _changed(self, jobs):
+        for job in jobs:
+            for listener in self._listeners:
+                listener(job)
+
+
+class JobContext:
+    """Handed to jobs in the worker process. Progress is sent at most every interval
+    seconds, and the shared cancel flags are read no more often than that."""
+
+    def __init__(self, job_id, updates, cancelled, interval):
+        self.job_id = job_id
+        self._updates = updates
+        self._cancelled = cancelled
+        self.interval = interval
+        self._last_report = 0.0
+        self._last_check = 0.0
+        self._cancel = False
+
+    def report(self, record, force=False):
+        now = time.monotonic()
+        if force or now - self._last_report >= self.interval:
+            self._last_report = now
+            self._updates.put((self.job_id, record))
+
+    def cancelled(self):
+        now = time.monotonic()
+        if not self._cancel and now - self._last_check >= self.interval:
+            self._last_check = now
+            self._cancel = self._cancelled.get(self.job_id, False)
+        return self._cancel
+
+
+# ---- jobs ---------------------------------------------------------------------------------
+# These run in worker processes on a snapshot of the network taken when the job was queued.
+
+def validate_network(context, network_id, snapshot):
+    network = from_snapshot(network_id, snapshot)
+    shapes = {layer_id: shape_record(layer) for layer_id, layer in network.layers.items()}
+    return {
+        "shapes": shapes,
+        "errors": {layer_id: record["shape_error"] for layer_id, record in shapes.items()
+                   if record["shape_error"]},
+        "cost": cost_report(network)["total"]
+    }
+
+
+def run_network(context, network_id, snapshot, weights, inputs):
+    plan = compile_network(from_snapshot(network_id, snapshot), weights=weights)
+    outputs = plan.run(plan.prepare_inputs(inputs)[0])
+    return {"outputs": {layer_id: values.tolist() for layer_id, values in outputs.items()}}
+
+
+def train_network(context, network_id, snapshot, weights, inputs, targets, options):
+    network = from_snapshot(network_id, snapshot)
+    result = train(network, inputs, targets, weights=weights, progress=context.report,
+                   should_stop=context.cancelled, **options)
+    context.report({"epoch": len(result.history), "loss": result.history[-1] if result.history else None},
+                   force=True)
+    return {"history": result.history, "stopped": result.stopped, "weights": result.weights}
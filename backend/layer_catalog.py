@@ -0,0 +1,33 @@
+import gzip
+import hashlib
+import json
+import threading
+
+
+class LayerCatalog:
+    """Pre-serialized /api/layer-types payload, built once and shared by every request"""
+
+    def __init__(self, build):
+        self._build = build
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def snapshot(self):
+        """Return (body, gzip_body, etag), building the catalog on first use"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._serialize(self._build())
+                snapshot = self._snapshot
+        return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    @staticmethod
+    def _serialize(layer_types):
+        body = json.dumps({"layer_types": layer_types}, separators=(',', ':')).encode('utf-8')
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        return body, gzip.compress(body, compresslevel=9), etag
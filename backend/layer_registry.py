@@ -0,0 +1,175 @@
+import ast
+import functools
+import importlib
+import inspect
+import os
+import pkgutil
+import threading
+from collections.abc import Mapping
+from enum import Enum
+
+
+# Packages (relative to backend/) whose modules define layer classes
+LAYER_PACKAGES = ('layers', 'activation_functions')
+
+# Order of the /api/layer-types catalog. Registered classes missing here come after these,
+# in the order they are found: by package, module, then definition order.
+CATALOG_ORDER = (
+    'ConvolutionalLayer', 'PoolingLayer',
+    'ReLUFunction', 'LeakyReLUFunction', 'TanhFunction', 'SoftMaxFunction',
+    'BaseInputLayer', 'ImageInputLayer', 'TextInputLayer', 'TabularInputLayer', 'AudioInputLayer',
+    'VideoInputLayer',
+    'DenseLayer', 'FlatteningLayer', 'EmbeddingLayer', 'AttentionLayer', 'NormalizationLayer',
+    'DropoutLayer',
+)
+
+
+def _registered_classes(path):
+    """Names of the top-level classes decorated with @register_layer in a module's source"""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            for decorator in node.decorator_list:
+                if isinstance(decorator, ast.Call):
+                    decorator = decorator.func
+                if isinstance(decorator, ast.Name) and decorator.id == 'register_layer':
+                    yield node.name
+                    break
+
+
+class LayerRegistry(Mapping):
+    """Layer classes by name, importing the module that defines a class on first use.
+
+    Modules under LAYER_PACKAGES are found by parsing their source for @register_layer
+    rather than importing them, so startup does not pay for layers nobody uses. Importing
+    a module runs its decorators, which fill in the classes.
+    """
+
+    def __init__(self, root=os.path.dirname(os.path.abspath(__file__)), packages=LAYER_PACKAGES):
+        self._root = root
+        self._packages = packages
+        self._classes = {}
+        self._modules = None
+        self._lock = threading.RLock()
+
+    def register(self, cls):
+        self._classes[cls.__name__] = cls
+        return cls
+
+    def _index(self):
+        # name -> module name of every registered class, in discovery order
+        if self._modules is None:
+            modules = {}
+            for package in self._packages:
+                self._scan(os.path.join(self._root, package), package, modules)
+            self._modules = modules
+        return self._modules
+
+    def _scan(self, directory, prefix, modules):
+        # The packages have no __init__.py, so iter_modules does not descend into them
+        for info in pkgutil.iter_modules([directory]):
+            if not info.ispkg:
+                for name in _registered_classes(os.path.join(directory, f"{info.name}.py")):
+                    modules[name] = f"{prefix}.{info.name}"
+        for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+            if entry.is_dir() and entry.name.isidentifier() and entry.name != '__pycache__':
+                self._scan(entry.path, f"{prefix}.{entry.name}", modules)
+
+    def __getitem__(self, name):
+        cls = self._classes.get(name)
+        if cls is None:
+            with self._lock:
+                module = self._index().get(name)
+                if module is None:
+                    raise KeyError(name)
+                importlib.import_module(module)
+                cls = self._classes.get(name)
+                if cls is None:
+                    raise KeyError(name)
+        return cls
+
+    def __iter__(self):
+        return iter(self._index())
+
+    def __len__(self):
+        return len(self._index())
+
+    def __contains__(self, name):
+        return name in self._classes or name in self._index()
+
+    def classes(self):
+        """Every registered class in catalog order (see CATALOG_ORDER), importing all their modules"""
+        position = {name: index for index, name in enumerate(CATALOG_ORDER)}
+        names = sorted(self._index(), key=lambda name: position.get(name, len(CATALOG_ORDER)))
+        return [self[name] for name in names]
+
+    def catalog(self):
+        return [describe_layer(cls) for cls in self.classes()]
+
+
+layer_types = LayerRegistry()
+
+
+def register_layer(cls):
+    """Class decorator adding a layer class to layer_types. Its place in the
+    /api/layer-types catalog comes from CATALOG_ORDER."""
+    return layer_types.register(cls)
+
+
+def _schema_default(value):
+    return value.name if isinstance(value, Enum) else value
+
+
+def _schema_type(annotation):
+    if annotation is inspect.Parameter.empty:
+        return {"type": "string"}
+    if inspect.isclass(annotation) and issubclass(annotation, Enum):
+        return {"type": "enum", "enum_type": annotation.__name__, "enum_values": [e.name for e in annotation]}
+    if annotation in (int, float):
+        return {"type": "number"}
+    if annotation == bool:
+        return {"type": "boolean"}
+    if annotation == list or str(annotation).startswith("typing.List"):
+        return {"type": "array"}
+    if annotation == dict or str(annotation).startswith("typing.Dict"):
+        return {"type": "object"}
+    return {"type": "string"}
+
+
+@functools.lru_cache(maxsize=None)
+def parameter_schema(cls):
+    """Constructor parameters of a layer class and its bases, with defaults taken from
+    DEFAULT_<NAME> class attributes or the signature. Computed once per class."""
+    params = []
+    seen = set()
+    for c in cls.__mro__:
+        if c is object:
+            break
+        for name, param in inspect.signature(c.__init__).parameters.items():
+            if name in ('self', 'args', 'kwargs') or name in seen:
+                continue
+            seen.add(name)
+            info = {"name": name, "type": "string"}
+            default_attribute = f"DEFAULT_{name.upper()}"
+            if hasattr(c, default_attribute):
+                info["default"] = _schema_default(getattr(c, default_attribute))
+            elif param.default is not inspect.Parameter.empty:
+                info["default"] = _schema_default(param.default)
+            schema_type = _schema_type(param.annotation)
+            info["type"] = schema_type.pop("type")
+            info.update(schema_type)
+            params.append(info)
+    return tuple(params)
+
+
+@functools.lru_cache(maxsize=None)
+def describe_layer(cls):
+    """The /api/layer-types entry for a layer class"""
+    get_svg = getattr(cls, 'get_svg_representation', None)
+    return {
+        "type": "layer",
+        "name": cls.__name__,
+        "params": [dict(param) for param in parameter_schema(cls)],
+        "svg_representation": get_svg() if callable(get_svg) else None
+    }
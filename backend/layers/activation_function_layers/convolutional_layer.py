@@ -1,5 +1,7 @@
 from enum import Enum
 from layers.layer import Layer
+from layer_registry import register_layer
+from asset_store import asset_store
 import os
 
 class ConvolutionType(Enum):
@@ -7,7 +9,9 @@ class ConvolutionType(Enum):
     TRANSPOSED = "Transposed"
 
 
+@register_layer
 class ConvolutionalLayer(Layer):
+    __slots__ = ('layer_type', 'filters', 'stride', 'kernel_size')
     path = os.path.join('.', 'assets', 'drawing.svg')
     
     DEFAULT_LAYER_TYPE = ConvolutionType.STANDARD
@@ -40,16 +44,23 @@ class ConvolutionalLayer(Layer):
         kernel_size = params.get('kernel_size', cls.DEFAULT_KERNEL_SIZE)
         
         return cls(conv_type, filters, stride, kernel_size)
+
+    def get_config(self):
+        return {
+            'conv_type': self.layer_type.name,
+            'filters': self.filters,
+            'stride': self.stride,
+            'kernel_size': self.kernel_size
+        }
     
     @staticmethod
     def load_svg():
-        with open(ConvolutionalLayer.path, 'r') as svg_file:
-            return svg_file.read()
+        return asset_store.get(ConvolutionalLayer.path).content
     
     @staticmethod
     def get_svg_representation():
         return {
-            "svg_content": ConvolutionalLayer.load_svg()
+            "svg_url": asset_store.get(ConvolutionalLayer.path).url
         }
         
     def set_filters(size):
@@ -1,15 +1,23 @@
 from enum import Enum
 from layers.layer import Layer
+from layer_registry import register_layer
+from asset_store import asset_store
 import os
 class PoolingType(Enum):
     MAX = "Max"
     AVG = "Avg"
 
+@register_layer
 class PoolingLayer(Layer):
+    __slots__ = ('pooling_type', 'pool_size')
     path = os.path.join('.', 'assets', 'pooling.svg')
-    def __init__(self, pooling_type: PoolingType):
+
+    DEFAULT_POOL_SIZE = 2
+
+    def __init__(self, pooling_type: PoolingType, pool_size: int = DEFAULT_POOL_SIZE):
         super().__init__()
         self.pooling_type = pooling_type
+        self.pool_size = pool_size
         
     
     @classmethod
@@ -19,16 +27,18 @@ class PoolingLayer(Layer):
             pooling_type = PoolingType[pooling_type_str]
         except KeyError:
             pooling_type = PoolingType.MAX            
-        return cls(pooling_type)
+        return cls(pooling_type, params.get('pool_size', cls.DEFAULT_POOL_SIZE))
+
+    def get_config(self):
+        return {'pooling_type': self.pooling_type.name, 'pool_size': self.pool_size}
     
    
     @staticmethod
     def load_svg():
-        with open(PoolingLayer.path, 'r') as svg_file:
-            return svg_file.read()
+        return asset_store.get(PoolingLayer.path).content
     
     @staticmethod
     def get_svg_representation():
         return {
-            "svg_content": PoolingLayer.load_svg()
+            "svg_url": asset_store.get(PoolingLayer.path).url
             }
\ No newline at end of file
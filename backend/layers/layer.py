@@ -1,13 +1,19 @@
 class Layer:
+    __slots__ = ('id', 'input_shape', 'output_shape', 'shape_error')
+
     def __init__(self):
-        self.connections = []
         self.id = None
-
-    def connect_to(self, layer):
-        self.connections.append(layer)
+        # Filled in by shape inference once the layer is part of a network
+        self.input_shape = None
+        self.output_shape = None
+        self.shape_error = None
         
     @classmethod
     def from_params(cls, params):
         """Create a layer instance from parameters. Must be implemented by subclasses."""
         raise NotImplementedError("Subclasses must implement from_params")
 
+    def get_config(self):
+        """Return the parameters needed to recreate this layer with from_params"""
+        return {}
+
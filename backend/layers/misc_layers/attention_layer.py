@@ -1,29 +1,41 @@
 from layers.layer import Layer
+from layer_registry import register_layer
+from asset_store import asset_store
 import os
 
 
+@register_layer
 class AttentionLayer(Layer):
+    __slots__ = ('target_shape', 'num_heads')
     path = os.path.join('.', 'assets', 'attention_layer.svg')
+
+    DEFAULT_NUM_HEADS = 8
     
-    def __init__(self, target_shape=None):
+    def __init__(self, target_shape=None,
+                 num_heads: int = DEFAULT_NUM_HEADS):
         super().__init__()
         self.target_shape = target_shape
-        self.input_shape = None
-        self.output_shape = None
+        self.num_heads = num_heads
     
     @classmethod
     def from_params(cls, params):
-        return cls()
+        return cls(params.get('target_shape'),
+                   params.get('num_heads', cls.DEFAULT_NUM_HEADS))
+
+    def get_config(self):
+        return {
+            'target_shape': self.target_shape,
+            'num_heads': self.num_heads
+        }
     
     @staticmethod
     def load_svg():
-        with open(AttentionLayer.path, 'r') as svg_file:
-            return svg_file.read()
+        return asset_store.get(AttentionLayer.path).content
     
     @staticmethod
     def get_svg_representation():
         return {
-            "svg_content": AttentionLayer.load_svg()
+            "svg_url": asset_store.get(AttentionLayer.path).url
         }
     
     
\ No newline at end of file
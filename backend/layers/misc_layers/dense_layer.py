@@ -1,29 +1,41 @@
 from layers.layer import Layer
+from layer_registry import register_layer
+from asset_store import asset_store
 import os
 
 
+@register_layer
 class DenseLayer(Layer):
+    __slots__ = ('target_shape', 'units')
     path = os.path.join('.', 'assets', 'dense_layer.svg')
+
+    DEFAULT_UNITS = 128
     
-    def __init__(self, target_shape=None):
+    def __init__(self, target_shape=None,
+                 units: int = DEFAULT_UNITS):
         super().__init__()
         self.target_shape = target_shape
-        self.input_shape = None
-        self.output_shape = None
+        self.units = units
     
     @classmethod
     def from_params(cls, params):
-        return cls()
+        return cls(params.get('target_shape'),
+                   params.get('units', cls.DEFAULT_UNITS))
+
+    def get_config(self):
+        return {
+            'target_shape': self.target_shape,
+            'units': self.units
+        }
     
     @staticmethod
     def load_svg():
-        with open(DenseLayer.path, 'r') as svg_file:
-            return svg_file.read()
+        return asset_store.get(DenseLayer.path).content
     
     @staticmethod
     def get_svg_representation():
         return {
-            "svg_content": DenseLayer.load_svg()
+            "svg_url": asset_store.get(DenseLayer.path).url
         }
     
     
\ No newline at end of file
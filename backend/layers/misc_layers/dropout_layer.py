@@ -1,29 +1,41 @@
 from layers.layer import Layer
+from layer_registry import register_layer
+from asset_store import asset_store
 import os
 
 
+@register_layer
 class DropoutLayer(Layer):
+    __slots__ = ('target_shape', 'rate')
     path = os.path.join('.', 'assets', 'dropout_layer.svg')
+
+    DEFAULT_RATE = 0.5
     
-    def __init__(self, target_shape=None):
+    def __init__(self, target_shape=None,
+                 rate: float = DEFAULT_RATE):
         super().__init__()
         self.target_shape = target_shape
-        self.input_shape = None
-        self.output_shape = None
+        self.rate = rate
     
     @classmethod
     def from_params(cls, params):
-        return cls()
+        return cls(params.get('target_shape'),
+                   params.get('rate', cls.DEFAULT_RATE))
+
+    def get_config(self):
+        return {
+            'target_shape': self.target_shape,
+            'rate': self.rate
+        }
     
     @staticmethod
     def load_svg():
-        with open(DropoutLayer.path, 'r') as svg_file:
-            return svg_file.read()
+        return asset_store.get(DropoutLayer.path).content
     
     @staticmethod
     def get_svg_representation():
         return {
-            "svg_content": DropoutLayer.load_svg()
+            "svg_url": asset_store.get(DropoutLayer.path).url
         }
     
     
\ No newline at end of file
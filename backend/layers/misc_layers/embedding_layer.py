@@ -1,29 +1,46 @@
 from layers.layer import Layer
+from layer_registry import register_layer
+from asset_store import asset_store
 import os
 
 
+@register_layer
 class EmbeddingLayer(Layer):
+    __slots__ = ('target_shape', 'vocab_size', 'embedding_dim')
     path = os.path.join('.', 'assets', 'embedding_layer.svg')
+
+    DEFAULT_VOCAB_SIZE = 10000
+    DEFAULT_EMBEDDING_DIM = 128
     
-    def __init__(self, target_shape=None):
+    def __init__(self, target_shape=None,
+                 vocab_size: int = DEFAULT_VOCAB_SIZE,
+                 embedding_dim: int = DEFAULT_EMBEDDING_DIM):
         super().__init__()
         self.target_shape = target_shape
-        self.input_shape = None
-        self.output_shape = None
+        self.vocab_size = vocab_size
+        self.embedding_dim = embedding_dim
     
     @classmethod
     def from_params(cls, params):
-        return cls()
+        return cls(params.get('target_shape'),
+                   params.get('vocab_size', cls.DEFAULT_VOCAB_SIZE),
+                   params.get('embedding_dim', cls.DEFAULT_EMBEDDING_DIM))
+
+    def get_config(self):
+        return {
+            'target_shape': self.target_shape,
+            'vocab_size': self.vocab_size,
+            'embedding_dim': self.embedding_dim
+        }
     
     @staticmethod
     def load_svg():
-        with open(EmbeddingLayer.path, 'r') as svg_file:
-            return svg_file.read()
+        return asset_store.get(EmbeddingLayer.path).content
     
     @staticmethod
     def get_svg_representation():
         return {
-            "svg_content": EmbeddingLayer.load_svg()
+            "svg_url": asset_store.get(EmbeddingLayer.path).url
         }
     
     
\ No newline at end of file
@@ -1,29 +1,33 @@
 from layers.layer import Layer
+from layer_registry import register_layer
+from asset_store import asset_store
 import os
 
 
+@register_layer
 class FlatteningLayer(Layer):
+    __slots__ = ('target_shape',)
     path = os.path.join('.', 'assets', 'flattening_layer.svg')
     
     def __init__(self, target_shape=None):
         super().__init__()
         self.target_shape = target_shape
-        self.input_shape = None
-        self.output_shape = None
     
     @classmethod
     def from_params(cls, params):
-        return cls()
+        return cls(params.get('target_shape'))
+
+    def get_config(self):
+        return {'target_shape': self.target_shape}
     
     @staticmethod
     def load_svg():
-        with open(FlatteningLayer.path, 'r') as svg_file:
-            return svg_file.read()
+        return asset_store.get(FlatteningLayer.path).content
     
     @staticmethod
     def get_svg_representation():
         return {
-            "svg_content": FlatteningLayer.load_svg()
+            "svg_url": asset_store.get(FlatteningLayer.path).url
         }
     
     
\ No newline at end of file
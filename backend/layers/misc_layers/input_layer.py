@@ -1,4 +1,6 @@
 from layers.layer import Layer
+from layer_registry import register_layer
+from asset_store import asset_store
 import os
 from enum import Enum
 from typing import List, Tuple, Optional, Union, Dict, Any
@@ -12,8 +14,10 @@ class InputType(Enum):
     VIDEO = "Video"
 
 
+@register_layer
 class BaseInputLayer(Layer):
     """Base class for all input layers"""
+    __slots__ = ('input_type',)
     base_path = os.path.join('.', 'assets', 'input')
     
     def __init__(self, input_type: InputType):
@@ -72,32 +76,29 @@ class BaseInputLayer(Layer):
         return os.path.join(cls.base_path, f"{type_str}.svg")
     
     @classmethod
-    def load_svg(cls, input_type_name="IMAGE"):
-        svg_path = cls.get_svg_path(input_type_name)
+    def get_svg_asset(cls, input_type_name="IMAGE"):
         try:
-            with open(svg_path, 'r') as svg_file:
-                return svg_file.read()
+            return asset_store.get(cls.get_svg_path(input_type_name))
         except FileNotFoundError:
-            default_path = cls.get_svg_path("IMAGE")
-            with open(default_path, 'r') as svg_file:
-                return svg_file.read()
+            return asset_store.get(cls.get_svg_path("IMAGE"))
+
+    @classmethod
+    def load_svg(cls, input_type_name="IMAGE"):
+        return cls.get_svg_asset(input_type_name).content
     
     @staticmethod
     def get_svg_representation():
-        svg_representations = {}
+        svg_urls = {}
         
         for input_type in InputType:
             try:
-                svg_content = BaseInputLayer.load_svg(input_type.name)
-                svg_representations[input_type.name] = svg_content
+                svg_urls[input_type.name] = BaseInputLayer.get_svg_asset(input_type.name).url
             except Exception as e:
                 print(f"Failed to load SVG for {input_type.name}: {e}")
-                if input_type.name != "IMAGE":
-                    svg_representations[input_type.name] = BaseInputLayer.load_svg("IMAGE")
         
         return {
-            "svg_content": BaseInputLayer.load_svg("IMAGE"),  # default representation
-            "all_representations": svg_representations
+            "svg_url": BaseInputLayer.get_svg_asset("IMAGE").url,  # default representation
+            "all_svg_urls": svg_urls
         }
     
     def get_config(self):
@@ -106,8 +107,10 @@ class BaseInputLayer(Layer):
         return config
 
 
+@register_layer
 class ImageInputLayer(BaseInputLayer):
     """Input layer for image data"""
+    __slots__ = ('shape', 'channels', 'color_mode')
     
     def __init__(self, 
                  shape: Optional[List[int]] = None,
@@ -128,8 +131,10 @@ class ImageInputLayer(BaseInputLayer):
         return config
 
 
+@register_layer
 class TextInputLayer(BaseInputLayer):
     """Input layer for text data"""
+    __slots__ = ('vocab_size', 'sequence_length', 'embedding_dim', 'tokenizer')
     
     def __init__(self, 
                  vocab_size: int = 10000,
@@ -153,8 +158,10 @@ class TextInputLayer(BaseInputLayer):
         return config
 
 
+@register_layer
 class TabularInputLayer(BaseInputLayer):
     """Input layer for tabular data"""
+    __slots__ = ('num_features', 'feature_types')
     
     def __init__(self, 
                  num_features: int,
@@ -172,8 +179,10 @@ class TabularInputLayer(BaseInputLayer):
         return config
 
 
+@register_layer
 class AudioInputLayer(BaseInputLayer):
     """Input layer for audio data"""
+    __slots__ = ('sampling_rate', 'duration', 'num_mfcc', 'channels')
     
     def __init__(self, 
                  sampling_rate: int = 16000,
@@ -183,6 +192,7 @@ class AudioInputLayer(BaseInputLayer):
         super().__init__(InputType.AUDIO)
         self.sampling_rate = sampling_rate
         self.duration = duration
+        self.num_mfcc = num_mfcc
         self.channels = channels
     
     def get_config(self):
@@ -190,13 +200,16 @@ class AudioInputLayer(BaseInputLayer):
         config.update({
             'sampling_rate': self.sampling_rate,
             'duration': self.duration,
+            'num_mfcc': self.num_mfcc,
             'channels': self.channels
         })
         return config
 
 
+@register_layer
 class VideoInputLayer(BaseInputLayer):
     """Input layer for video data"""
+    __slots__ = ('frame_size', 'num_frames', 'frame_rate', 'channels')
     
     def __init__(self, 
                  frame_size: List[int],
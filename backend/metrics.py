@@ -0,0 +1,182 @@
+import bisect
+import math
+import threading
+import time
+
+from flask import Response, g, request
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+FOLD_THRESHOLD = 64
+
+
+class _Shard:
+    """One thread's request statistics. Only its own thread writes to it, so recording
+    takes no lock; a scrape reads every shard and sums them."""
+
+    def __init__(self):
+        self.requests = {}    # (route, method, status) -> count
+        self.errors = {}      # (route, method) -> count
+        self.latency = {}     # (route, method) -> [count per bucket and +Inf..., sum, count]
+        self.size = {}        # (route, method) -> [count per bucket and +Inf..., sum, count]
+
+    def merge_into(self, total):
+        for name in ('requests', 'errors'):
+            target = getattr(total, name)
+            for key, value in list(getattr(self, name).items()):
+                target[key] = target.get(key, 0) + value
+        for name in ('latency', 'size'):
+            target = getattr(total, name)
+            for key, values in list(getattr(self, name).items()):
+                merged = target.setdefault(key, [0] * len(values))
+                for index, value in enumerate(values):
+                    merged[index] += value
+
+
+def _observe(histograms, key, buckets, value):
+    values = histograms.get(key)
+    if values is None:
+        values = histograms[key] = [0] * (len(buckets) + 3)
+    values[bisect.bisect_left(buckets, value)] += 1
+    values[-2] += value
+    values[-1] += 1
+
+
+class Metrics:
+    """Per-route request counters and histograms, plus gauges read at scrape time,
+    rendered in the Prometheus text exposition format"""
+
+    def __init__(self, latency_buckets=LATENCY_BUCKETS, size_buckets=SIZE_BUCKETS):
+        self.latency_buckets = tuple(latency_buckets)
+        self.size_buckets = tuple(size_buckets)
+        self._local = threading.local()
+        self._shards = []        # (thread, shard) for every thread that has recorded
+        self._retired = _Shard()  # totals of threads that have exited
+        self._fold_at = FOLD_THRESHOLD
+        self._lock = threading.Lock()
+        self._gauges = []
+
+    def gauge(self, name, help, read):
+        """Report read() as a gauge on every scrape"""
+        self._gauges.append((name, help, read))
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+                if len(self._shards) >= self._fold_at:
+                    self._fold_exited()
+                    self._fold_at = max(FOLD_THRESHOLD, 2 * len(self._shards))
+        return shard
+
+    def _fold_exited(self):
+        # Merge the shards of exited threads into one, so a server that starts a thread
+        # per request does not accumulate shards
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                shard.merge_into(self._retired)
+        self._shards = live
+
+    def record(self, route, method, status, duration, size=None):
+        shard = self._shard()
+        key = (route, method)
+        requests_key = (route, method, status)
+        shard.requests[requests_key] = shard.requests.get(requests_key, 0) + 1
+        if status >= 400:
+            shard.errors[key] = shard.errors.get(key, 0) + 1
+        _observe(shard.latency, key, self.latency_buckets, duration)
+        if size is not None:
+            _observe(shard.size, key, self.size_buckets, size)
+
+    def _collect(self):
+        with self._lock:
+            self._fold_exited()
+            live = self._shards
+            total = _Shard()
+            self._retired.merge_into(total)
+        for _, shard in live:
+            shard.merge_into(total)
+        return total
+
+    def render(self):
+        total = self._collect()
+        lines = []
+
+        lines.append('# HELP http_requests_total Requests handled, by route, method and status.')
+        lines.append('# TYPE http_requests_total counter')
+        for (route, method, status), count in sorted(total.requests.items()):
+            lines.append(f'http_requests_total{_labels(route=route, method=method, status=status)} {count}')
+
+        lines.append('# HELP http_request_errors_total Requests answered with a 4xx or 5xx status.')
+        lines.append('# TYPE http_request_errors_total counter')
+        for (route, method), count in sorted(total.errors.items()):
+            lines.append(f'http_request_errors_total{_labels(route=route, method=method)} {count}')
+
+        _histogram(lines, 'http_request_duration_seconds', 'Request latency in seconds.',
+                   self.latency_buckets, total.latency)
+        _histogram(lines, 'http_response_size_bytes', 'Response body size in bytes.',
+                   self.size_buckets, total.size)
+
+        for name, help, read in self._gauges:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {_number(read())}')
+        return '\n'.join(lines) + '\n'
+
+    def instrument(self, app, path='/metrics'):
+        """Time every request of a Flask app and serve the metrics at path"""
+
+        @app.before_request
+        def start_timer():
+            g.metrics_started = time.perf_counter()
+
+        @app.after_request
+        def record_request(response):
+            started = g.pop('metrics_started', None)
+            if started is not None:
+                rule = request.url_rule
+                # Label by route pattern rather than by URL to keep the number of series bounded
+                route = rule.rule if rule is not None else '<unmatched>'
+                size = None if response.is_streamed else response.calculate_content_length()
+                self.record(route, request.method, response.status_code, time.perf_counter() - started, size)
+            return response
+
+        @app.route(path, methods=['GET'])
+        def metrics():
+            return Response(self.render(), content_type=CONTENT_TYPE)
+
+        return app
+
+
+def _histogram(lines, name, help, buckets, histograms):
+    lines.append(f'# HELP {name} {help}')
+    lines.append(f'# TYPE {name} histogram')
+    for (route, method), values in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(buckets + (math.inf,), values):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(route=route, method=method, le=_number(bound))} {cumulative}')
+        lines.append(f'{name}_sum{_labels(route=route, method=method)} {_number(values[-2])}')
+        lines.append(f'{name}_count{_labels(route=route, method=method)} {values[-1]}')
+
+
+def _labels(**labels):
+    escaped = (f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return '{' + ','.join(escaped) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# Rough per-object memory costs, used only to keep the cache within its byte budget
+NETWORK_BYTES = 2048
+LAYER_BYTES = 600
+CONNECTION_BYTES = 400
+
+
+def estimate_network_bytes(network):
+    return NETWORK_BYTES + len(network.layers) * LAYER_BYTES + len(network.connections) * CONNECTION_BYTES
+
+
+class NetworkCache:
+    """In-memory networks with LRU eviction by entry count and approximate size,
+    and eviction of networks left idle for longer than idle_ttl seconds.
+
+    on_evict(network) is called, outside the cache lock, for every evicted network.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, idle_ttl=None, on_evict=None,
+                 clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.on_evict = on_evict
+        self._clock = clock
+        self._entries = OrderedDict()   # id -> [network, size, last access], least recent first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, network_id):
+        with self._lock:
+            entry = self._entries.get(network_id)
+            if entry is None:
+                self.misses += 1
+                evicted = self._expire()
+            else:
+                self.hits += 1
+                self._touch(network_id, entry)
+                evicted = self._expire() + self._shrink(keep=network_id)
+        self._evicted(evicted)
+        return entry[0] if entry is not None else None
+
+    def peek(self, network_id):
+        """Return a cached network without counting the lookup or refreshing its recency"""
+        entry = self._entries.get(network_id)
+        return entry[0] if entry is not None else None
+
+    def put(self, network):
+        with self._lock:
+            entry = self._entries.pop(network.id, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+            size = estimate_network_bytes(network)
+            self._entries[network.id] = [network, size, self._clock()]
+            self._bytes += size
+            evicted = self._expire() + self._shrink(keep=network.id)
+        self._evicted(evicted)
+
+    def pop(self, network_id):
+        with self._lock:
+            entry = self._entries.pop(network_id, None)
+            if entry is None:
+                return None
+            self._bytes -= entry[1]
+            return entry[0]
+
+    def values(self):
+        with self._lock:
+            return [entry[0] for entry in self._entries.values()]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "approximate_bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "idle_ttl": self.idle_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, network_id):
+        return network_id in self._entries
+
+    def _touch(self, network_id, entry):
+        # Networks grow between accesses, so the size estimate is refreshed on every hit
+        size = estimate_network_bytes(entry[0])
+        self._bytes += size - entry[1]
+        entry[1] = size
+        entry[2] = self._clock()
+        self._entries.move_to_end(network_id)
+
+    def _expire(self):
+        if self.idle_ttl is None:
+            return []
+        deadline = self._clock() - self.idle_ttl
+        evicted = []
+        # Entries are in access order, so the idle ones are all at the front
+        while self._entries:
+            if next(iter(self._entries.values()))[2] > deadline:
+                break
+            evicted.append(self._evict_first())
+        return evicted
+
+    def _shrink(self, keep=None):
+        evicted = []
+        while self._entries and self._over_budget():
+            if len(self._entries) == 1 and keep in self._entries:
+                break
+            evicted.append(self._evict_first())
+        return evicted
+
+    def _over_budget(self):
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self._bytes > self.max_bytes
+
+    def _evict_first(self):
+        _, (network, size, _) = self._entries.popitem(last=False)
+        self._bytes -= size
+        self.evictions += 1
+        return network
+
+    def _evicted(self, evicted):
+        if self.on_evict is not None:
+            for network in evicted:
+                self.on_evict(network)
@@ -0,0 +1,140 @@
+import contextlib
+import functools
+import itertools
+import logging
+import threading
+
+from neural_network import NeuralNetwork
+from network_cache import NetworkCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class NetworkRegistry:
+    """Live networks indexed by id, with thread-safe id allocation.
+
+    When a store is given, ids are allocated by the store, every mutation is queued on
+    it, and networks missing from memory are loaded from it on first access. A cached
+    network the store reports stale, because another process changed it, is reloaded when
+    it is next looked up. Live networks are held in a NetworkCache; without a store,
+    evicted networks are gone, and every such eviction is logged.
+    """
+
+    def __init__(self, store=None, cache=None):
+        self._store = store
+        self._networks = cache if cache is not None else NetworkCache()
+        if store is not None:
+            # Changes are queued on the store as they happen; make sure they are on disk
+            self._networks.on_evict = lambda network: store.flush()
+        else:
+            self._networks.on_evict = self._lost
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """Subscribe listener(network, change) to every network created or loaded from now on"""
+        self._listeners.append(listener)
+
+    def create(self) -> NeuralNetwork:
+        if self._store is not None:
+            network = NeuralNetwork(self._store.create_network())
+            with self._lock:
+                self._track(network)
+            return network
+
+        with self._lock:
+            network = NeuralNetwork(str(next(self._ids)))
+            self._track(network)
+        return network
+
+    def clone(self, source) -> NeuralNetwork:
+        """Register a copy-on-write clone of source (a NeuralNetwork) under a new id"""
+        if self._store is not None:
+            network = source.clone(self._store.create_network())
+            self._store.save_network(network)
+        else:
+            with self._lock:
+                network = source.clone(str(next(self._ids)))
+        with self._lock:
+            self._track(network)
+        return network
+
+    def get(self, network_id) -> NeuralNetwork:
+        network_id = str(network_id)
+        network = self._networks.get(network_id)
+        if network is not None and self._store is not None and self._store.stale(network):
+            if not self._store.refresh(network):
+                # Deleted by another process
+                self._networks.pop(network_id)
+                return None
+        if network is None and self._store is not None:
+            with self._lock:
+                network = self._networks.peek(network_id)
+                if network is None:
+                    network = self._store.load_network(network_id)
+                    if network is not None:
+                        self._track(network)
+        return network
+
+    @contextlib.contextmanager
+    def writing(self, network_id):
+        """Yield a network with its lock held for changing it, or None if there is no such
+        network. The changes are queued on the store as they are made; nothing waits for
+        the database while the block runs."""
+        network = self.get(network_id)
+        if network is None:
+            yield None
+            return
+        with network.lock:
+            yield network
+
+    def delete(self, network_id) -> bool:
+        network_id = str(network_id)
+        with self._lock:
+            deleted = self._networks.pop(network_id) is not None
+            if self._store is not None:
+                deleted = self._store.delete_network(network_id) or deleted
+        return deleted
+
+    def list(self):
+        return self._networks.values()
+
+    def cache_stats(self):
+        stats = self._networks.stats()
+        if self._store is not None:
+            stats["store"] = self._store.stats()
+        return stats
+
+    def summaries(self):
+        """Return [(id, layer count, connection count)] for every network, stored or live"""
+        if self._store is not None:
+            return self._store.summaries()
+        return [(n.id, len(n.layers), len(n.connections)) for n in self.list()]
+
+    def totals(self):
+        """Return (live networks, layers, connections) over the networks held in memory"""
+        live = self._networks.values()
+        return len(live), sum(len(n.layers) for n in live), sum(len(n.connections) for n in live)
+
+    def _track(self, network):
+        if self._store is not None:
+            network.reserve_ids = functools.partial(self._store.reserve_ids, network.id)
+            network.subscribe(self._store.record_change)
+        for listener in self._listeners:
+            network.subscribe(listener)
+        self._networks.put(network)
+
+    @staticmethod
+    def _lost(network):
+        logger.warning("Evicted network %s (%d layers) with no store to write it back to; it is gone",
+                       network.id, len(network.layers))
+
+    def __len__(self):
+        if self._store is not None:
+            return self._store.count()
+        return len(self._networks)
+
+    def __contains__(self, network_id):
+        return self.get(network_id) is not None
@@ -1,19 +1,400 @@
+import contextlib
+import copy
+import itertools
+import threading
+from collections import deque
+
 from layers.layer import Layer
+from connection import Connection
+from shape_inference import propagate_shapes, shape_record
+from topological_order import CycleError, TopologicalOrder
+
+
+# Changes kept per network for clients catching up with changes_since
+CHANGE_LOG_SIZE = 1000
 
 
 class NeuralNetwork:
+    """Acyclic layer graph indexed by id, with forward and reverse adjacency sets and an
+    incrementally maintained topological order"""
+
     def __init__(self, id):
         self.id = id
-        self.layers = []
-        self.connections = []        
-    
-    def add_layer(self, layer):
-        self.layers.append(layer)
-
-    def add_connection(self, connection):
-        self.connections.append(connection)
-        
+        self.layers = {}            # layer id -> Layer
+        self.connections = {}       # connection id -> Connection
+        self._edges = {}            # (source id, target id) -> Connection
+        self._successors = {}       # layer id -> set of target layer ids
+        self._predecessors = {}     # layer id -> set of source layer ids
+        self._order = TopologicalOrder()
+        self._next_layer_id = 0
+        self._next_connection_id = 0
+        # Set by stores shared between processes: reserve_ids(kind, next id) returns the
+        # (first id, end) of a block of 'layer' or 'connection' ids no other process hands out
+        self.reserve_ids = None
+        self._layer_id_limit = 0
+        self._connection_id_limit = 0
+        # Held by every mutation; reentrant so a batch can hold it across several
+        self.lock = threading.RLock()
+        self._listeners = []
+        self._shape_listeners = []
+        self._shape_changes = set()
+        # Bumped by every mutation; the log holds the most recent change records in order
+        self.revision = 0
+        self._change_log = deque(maxlen=CHANGE_LOG_SIZE)
+        # Changes held back by atomic() until its block completes
+        self._pending_changes = None
+        # Layer ids whose Layer and adjacency sets may also be held by a clone; copied before writing
+        self._shared = set()
+
+    def subscribe(self, listener):
+        """Register listener(network, change), called with a JSON-serializable record of every mutation"""
+        self._listeners.append(listener)
+
+    def subscribe_shapes(self, listener):
+        """Register listener(layer ids), called with the layers whose shapes were recomputed,
+        including every layer when the graph is restored"""
+        self._shape_listeners.append(listener)
+
+    def _shapes_changed(self, layer_ids):
+        self._shape_changes |= layer_ids
+        for listener in self._shape_listeners:
+            listener(layer_ids)
+
+    def _notify(self, change):
+        if self._pending_changes is not None:
+            self._pending_changes.append(change)
+            return
+        self.revision += 1
+        change["revision"] = self.revision
+        self._change_log.append(change)
+        for listener in self._listeners:
+            listener(self, change)
+
+    @contextlib.contextmanager
+    def atomic(self):
+        """Hold the lock and group the changes made in the block, so listeners, the change log
+        and the revision see all of them or none. If the block raises, the layers and
+        connections it added are removed again; removals made in the block are not undone."""
+        with self.lock:
+            if self._pending_changes is not None:
+                yield
+                return
+            pending = self._pending_changes = []
+            counters = (self._next_layer_id, self._next_connection_id,
+                        self._layer_id_limit, self._connection_id_limit)
+            try:
+                yield
+            except BaseException:
+                try:
+                    for change in reversed(list(pending)):
+                        if change["op"] == "add_connection":
+                            self.remove_connection(change["connection"]["id"])
+                        elif change["op"] == "add_layer":
+                            self.remove_layer(change["layer"]["id"])
+                finally:
+                    self._pending_changes = None
+                    (self._next_layer_id, self._next_connection_id,
+                     self._layer_id_limit, self._connection_id_limit) = counters
+                raise
+            self._pending_changes = None
+            for change in pending:
+                self._notify(change)
+
+    def changes_since(self, revision):
+        """Return the change records after revision, oldest first, or None when they are
+        no longer all in the log (or revision is from the future)"""
+        with self.lock:
+            if revision == self.revision:
+                return []
+            log = self._change_log
+            if revision > self.revision or not log or revision < log[0]["revision"] - 1:
+                return None
+            return list(itertools.islice(log, revision - log[0]["revision"] + 1, None))
+
+    def records(self):
+        """Return (revision, layer records, connection records) for the whole graph"""
+        with self.lock:
+            return (self.revision, [layer_record(layer) for layer in self.layers.values()],
+                    [connection_record(connection) for connection in self.connections.values()])
+
+    def clone(self, id):
+        """Return a copy of the graph under a new id, sharing its layers, connections and
+        adjacency sets with this network. Either network copies a layer (and its adjacency)
+        the first time it modifies it, so cloning costs a few dict copies whatever the size
+        of the layers."""
+        with self.lock:
+            network = NeuralNetwork(id)
+            network.layers = dict(self.layers)
+            network.connections = dict(self.connections)
+            network._edges = dict(self._edges)
+            network._successors = dict(self._successors)
+            network._predecessors = dict(self._predecessors)
+            network._order = self._order.copy()
+            network._next_layer_id = self._next_layer_id
+            network._next_connection_id = self._next_connection_id
+            network._shared = set(self.layers)
+            self._shared.update(self.layers)
+            return network
+
+    def writable_layer(self, id) -> Layer:
+        """Return the layer with id for modifying in place, first giving this network its
+        own copy if it may be shared with a clone"""
+        if id in self._shared:
+            self._shared.discard(id)
+            self.layers[id] = copy.copy(self.layers[id])
+            self._successors[id] = set(self._successors[id])
+            self._predecessors[id] = set(self._predecessors[id])
+        return self.layers[id]
+
+    def add_layer(self, layer) -> int:
+        with self.lock:
+            layer.id = self._take_layer_id()
+            self.layers[layer.id] = layer
+            self._successors[layer.id] = set()
+            self._predecessors[layer.id] = set()
+            self._order.add_node(layer.id)
+            self._shapes_changed(propagate_shapes(self, [layer.id]))
+            self._notify({"op": "add_layer", "layer": layer_record(layer)})
+            return layer.id
+
+    def remove_layer(self, id) -> bool:
+        with self.lock:
+            if id not in self.layers:
+                return False
+            for target_id in list(self._successors[id]):
+                self._remove_edge(id, target_id)
+            for source_id in list(self._predecessors[id]):
+                self._remove_edge(source_id, id)
+            del self._successors[id]
+            del self._predecessors[id]
+            self._order.remove_node(id)
+            del self.layers[id]
+            self._shared.discard(id)
+            self._notify({"op": "remove_layer", "id": id})
+            return True
+
+    def add_connection(self, source_id, target_id) -> Connection:
+        """Connect two layers, returning the existing connection if the edge is already present.
+
+        Raises CycleError if the edge would create a cycle.
+        """
+        with self.lock:
+            if source_id not in self.layers:
+                raise KeyError(f"Source layer not found: {source_id}")
+            if target_id not in self.layers:
+                raise KeyError(f"Target layer not found: {target_id}")
+
+            connection = self._edges.get((source_id, target_id))
+            if connection is not None:
+                return connection
+
+            self._order.add_edge(source_id, target_id, self._successors, self._predecessors)
+            connection = self._insert_edge(source_id, target_id)
+            try:
+                self._shapes_changed(propagate_shapes(self, [target_id]))
+            except Exception:
+                # Don't keep an edge that listeners were never told about
+                self._discard_edge(connection)
+                self._shapes_changed(propagate_shapes(self, [target_id]))
+                raise
+            self._notify({"op": "add_connection", "connection": connection_record(connection)})
+            return connection
+
+    def add_connections(self, pairs):
+        """Connect many (source id, target id) pairs, returning their connections in order.
+
+        A batch that is large relative to the graph is inserted in one pass and the
+        topological order rebuilt once, instead of being reordered edge by edge. Raises
+        CycleError, with ``index`` set to the offending pair, if an edge would create a
+        cycle; the pairs before it stay connected.
+        """
+        with self.lock:
+            for source_id, target_id in pairs:
+                if source_id not in self.layers:
+                    raise KeyError(f"Source layer not found: {source_id}")
+                if target_id not in self.layers:
+                    raise KeyError(f"Target layer not found: {target_id}")
+
+            new_pairs = list(dict.fromkeys(pair for pair in pairs if pair not in self._edges))
+            if len(new_pairs) * 4 < len(self.layers):
+                return self._add_connections_in_order(pairs)
+
+            for source_id, target_id in new_pairs:
+                self.writable_layer(source_id)
+                self.writable_layer(target_id)
+                self._successors[source_id].add(target_id)
+                self._predecessors[target_id].add(source_id)
+            order = TopologicalOrder.from_graph(list(self.layers), self._successors, self._predecessors)
+            for source_id, target_id in new_pairs:
+                self._successors[source_id].discard(target_id)
+                self._predecessors[target_id].discard(source_id)
+            if not order.acyclic:
+                # Replay edge by edge to find out which one closes the cycle
+                return self._add_connections_in_order(pairs)
+
+            self._order = order
+            inserted = [self._insert_edge(source_id, target_id) for source_id, target_id in new_pairs]
+            targets = [target_id for _, target_id in new_pairs]
+            try:
+                self._shapes_changed(propagate_shapes(self, targets))
+            except Exception:
+                for connection in reversed(inserted):
+                    self._discard_edge(connection)
+                self._shapes_changed(propagate_shapes(self, targets))
+                raise
+            for source_id, target_id in new_pairs:
+                self._notify({"op": "add_connection",
+                              "connection": connection_record(self._edges[(source_id, target_id)])})
+            return [self._edges[pair] for pair in pairs]
+
+    def _add_connections_in_order(self, pairs):
+        connections = []
+        for index, (source_id, target_id) in enumerate(pairs):
+            try:
+                connections.append(self.add_connection(source_id, target_id))
+            except CycleError as e:
+                e.index = index
+                raise
+        return connections
+
+    def remove_connection(self, id) -> bool:
+        with self.lock:
+            connection = self.connections.get(id)
+            if connection is None:
+                return False
+            self._remove_edge(connection.source_id, connection.target_id)
+            return True
+
+    def _insert_edge(self, source_id, target_id):
+        self.writable_layer(source_id)
+        self.writable_layer(target_id)
+        connection = Connection(self._take_connection_id(), source_id, target_id)
+        self.connections[connection.id] = connection
+        self._edges[(source_id, target_id)] = connection
+        self._successors[source_id].add(target_id)
+        self._predecessors[target_id].add(source_id)
+        return connection
+
+    def _take_layer_id(self):
+        if self.reserve_ids is not None and self._next_layer_id >= self._layer_id_limit:
+            self._next_layer_id, self._layer_id_limit = self.reserve_ids('layer', self._next_layer_id)
+        self._next_layer_id += 1
+        return self._next_layer_id - 1
+
+    def _take_connection_id(self):
+        if self.reserve_ids is not None and self._next_connection_id >= self._connection_id_limit:
+            self._next_connection_id, self._connection_id_limit = \
+                self.reserve_ids('connection', self._next_connection_id)
+        self._next_connection_id += 1
+        return self._next_connection_id - 1
+
+    def _discard_edge(self, connection):
+        # Undo _insert_edge for the most recently inserted connection
+        del self._edges[(connection.source_id, connection.target_id)]
+        del self.connections[connection.id]
+        self._successors[connection.source_id].discard(connection.target_id)
+        self._predecessors[connection.target_id].discard(connection.source_id)
+        self._next_connection_id = connection.id
+
+    def _remove_edge(self, source_id, target_id):
+        self.writable_layer(source_id)
+        self.writable_layer(target_id)
+        connection = self._edges.pop((source_id, target_id))
+        del self.connections[connection.id]
+        self._successors[source_id].discard(target_id)
+        self._predecessors[target_id].discard(source_id)
+        self._shapes_changed(propagate_shapes(self, [target_id]))
+        self._notify({"op": "remove_connection", "id": connection.id})
+
+    def restore(self, layers, connections, next_layer_id, next_connection_id, revision=0):
+        """Replace the graph with stored layers (with ids set) and (id, source id, target id)
+        rows, without notifying listeners. The change log is cleared, as it no longer leads
+        up to the restored revision."""
+        with self.lock:
+            self.revision = revision
+            self.layers = {}
+            self.connections = {}
+            self._edges = {}
+            self._successors = {}
+            self._predecessors = {}
+            self._shared = set()
+            self._shape_changes = set()
+            self._change_log.clear()
+            for layer in layers:
+                self.layers[layer.id] = layer
+                self._successors[layer.id] = set()
+                self._predecessors[layer.id] = set()
+            for connection_id, source_id, target_id in connections:
+                connection = Connection(connection_id, source_id, target_id)
+                self.connections[connection_id] = connection
+                self._edges[(source_id, target_id)] = connection
+                self._successors[source_id].add(target_id)
+                self._predecessors[target_id].add(source_id)
+            # Ids past the stored counters may be taken by other processes; reserve afresh
+            self._next_layer_id = self._layer_id_limit = next_layer_id
+            self._next_connection_id = self._connection_id_limit = next_connection_id
+            self._order = TopologicalOrder.from_graph(list(self.layers), self._successors, self._predecessors)
+            propagate_shapes(self, list(self.layers))
+            for listener in self._shape_listeners:
+                listener(set(self.layers))
+
+    def snapshot(self):
+        """Return a picklable copy of the graph for rebuilding it elsewhere with from_snapshot"""
+        with self.lock:
+            layers = [(layer.id, type(layer), layer.get_config()) for layer in self.layers.values()]
+            connections = [(c.id, c.source_id, c.target_id) for c in self.connections.values()]
+            return layers, connections, self._next_layer_id, self._next_connection_id
+
+    def take_shape_changes(self):
+        """Return shape records for layers whose shapes changed since the last call"""
+        with self.lock:
+            changes = {layer_id: shape_record(self.layers[layer_id])
+                       for layer_id in self._shape_changes if layer_id in self.layers}
+            self._shape_changes = set()
+            return changes
+
+    def has_connection(self, source_id, target_id) -> bool:
+        return (source_id, target_id) in self._edges
+
+    def find_edge(self, source_id, target_id) -> Connection:
+        return self._edges.get((source_id, target_id))
+
+    def topological_order(self):
+        """Layer ids ordered so that every connection points forward"""
+        with self.lock:
+            return list(self._order.order())
+
+    def order_position(self, id):
+        return self._order.position(id)
+
     def find_layer(self, id) -> Layer:
-        for l in self.layers:
-            if l.id == id:
-                return l
\ No newline at end of file
+        return self.layers.get(id)
+
+    def find_connection(self, id) -> Connection:
+        return self.connections.get(id)
+
+    def successors(self, id):
+        return self._successors.get(id, ())
+
+    def predecessors(self, id):
+        return self._predecessors.get(id, ())
+
+
+def from_snapshot(network_id, snapshot):
+    layer_specs, connections, next_layer_id, next_connection_id = snapshot
+    layers = []
+    for layer_id, layer_class, config in layer_specs:
+        layer = layer_class.from_params(config)
+        layer.id = layer_id
+        layers.append(layer)
+    network = NeuralNetwork(network_id)
+    network.restore(layers, connections, next_layer_id, next_connection_id)
+    return network
+
+
+def layer_record(layer):
+    return {"id": layer.id, "type": type(layer).__name__, "params": layer.get_config()}
+
+
+def connection_record(connection):
+    return {"id": connection.id, "source": connection.source_id, "target": connection.target_id}
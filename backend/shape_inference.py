@@ -0,0 +1,212 @@
+import heapq
+from functools import reduce
+import operator
+
+
+# Layer class name -> rule(layer, input_shape) -> output shape. Rules are looked up along
+# the layer's MRO, so subclasses inherit their parent's rule unless they register their own.
+SHAPE_RULES = {}
+
+
+class ShapeError(ValueError):
+    pass
+
+
+def shape_rule(*layer_types):
+    def register(rule):
+        for layer_type in layer_types:
+            SHAPE_RULES[layer_type] = rule
+        return rule
+    return register
+
+
+def find_rule(layer):
+    for cls in type(layer).__mro__:
+        rule = SHAPE_RULES.get(cls.__name__)
+        if rule is not None:
+            return rule
+    return None
+
+
+def shape_record(layer):
+    return {
+        "input_shape": list(layer.input_shape) if layer.input_shape is not None else None,
+        "output_shape": list(layer.output_shape) if layer.output_shape is not None else None,
+        "shape_error": layer.shape_error
+    }
+
+
+def infer_layer_shape(layer, input_shapes):
+    """Return (input shape, output shape, error) for a layer fed by the given output shapes"""
+    rule = find_rule(layer)
+    if rule is None:
+        return None, None, None
+    if getattr(rule, 'is_source', False):
+        input_shape = None
+    elif not input_shapes or any(shape is None for shape in input_shapes):
+        # Unconnected, or fed by a layer whose shape is not known yet
+        return None, None, None
+    elif any(shape != input_shapes[0] for shape in input_shapes[1:]):
+        return None, None, "Incompatible input shapes: " + ", ".join(str(list(s)) for s in input_shapes)
+    else:
+        input_shape = input_shapes[0]
+
+    try:
+        return input_shape, tuple(rule(layer, input_shape)), None
+    except ShapeError as e:
+        return input_shape, None, str(e)
+    except (TypeError, ValueError, ArithmeticError) as e:
+        return input_shape, None, f"Invalid parameters for {type(layer).__name__}: {e}"
+
+
+def propagate_shapes(network, layer_ids):
+    """Recompute shapes starting at layer_ids and continuing downstream only while outputs change.
+
+    Layers are visited in the network's topological order, so each is recomputed at most once.
+    Returns the set of layer ids whose shapes changed.
+    """
+    changed = set()
+    queued = set(layer_id for layer_id in layer_ids if layer_id in network.layers)
+    heap = [(network.order_position(layer_id), layer_id) for layer_id in queued]
+    heapq.heapify(heap)
+
+    while heap:
+        _, layer_id = heapq.heappop(heap)
+        layer = network.layers[layer_id]
+        input_shapes = [network.layers[source_id].output_shape
+                        for source_id in sorted(network.predecessors(layer_id))]
+        result = infer_layer_shape(layer, input_shapes)
+
+        if result == (layer.input_shape, layer.output_shape, layer.shape_error):
+            continue
+        output_changed = result[1] != layer.output_shape
+        layer = network.writable_layer(layer_id)
+        layer.input_shape, layer.output_shape, layer.shape_error = result
+        changed.add(layer_id)
+        if output_changed:
+            for target_id in network.successors(layer_id):
+                if target_id not in queued:
+                    queued.add(target_id)
+                    heapq.heappush(heap, (network.order_position(target_id), target_id))
+
+    return changed
+
+
+def _spatial_axes(layer, input_shape):
+    # (length, channels) is treated as 1D, anything longer as (..., height, width, channels)
+    if len(input_shape) == 2:
+        return (0,)
+    if len(input_shape) >= 3:
+        return (len(input_shape) - 3, len(input_shape) - 2)
+    raise ShapeError(f"{type(layer).__name__} needs an input with spatial dimensions, got {list(input_shape)}")
+
+
+def _positive(layer, *names):
+    for name in names:
+        value = getattr(layer, name)
+        if value <= 0:
+            raise ShapeError(f"{name} must be positive, got {value}")
+
+
+def _source(rule):
+    rule.is_source = True
+    return rule
+
+
+@shape_rule('ImageInputLayer')
+@_source
+def _image_input(layer, _):
+    return (*layer.shape, layer.channels)
+
+
+@shape_rule('TextInputLayer')
+@_source
+def _text_input(layer, _):
+    return (layer.sequence_length,)
+
+
+@shape_rule('TabularInputLayer')
+@_source
+def _tabular_input(layer, _):
+    if not layer.num_features:
+        raise ShapeError("num_features is not set")
+    return (layer.num_features,)
+
+
+@shape_rule('AudioInputLayer')
+@_source
+def _audio_input(layer, _):
+    return (int(layer.sampling_rate * layer.duration), layer.channels)
+
+
+@shape_rule('VideoInputLayer')
+@_source
+def _video_input(layer, _):
+    return (layer.num_frames, *layer.frame_size, layer.channels)
+
+
+@shape_rule('InputLayer')
+@_source
+def _legacy_input(layer, _):
+    if not layer.shape:
+        raise ShapeError("shape is not set")
+    return tuple(layer.shape)
+
+
+@shape_rule('ConvolutionalLayer')
+def _convolution(layer, input_shape):
+    _positive(layer, 'stride', 'kernel_size')
+    output_shape = list(input_shape)
+    for axis in _spatial_axes(layer, input_shape):
+        size = input_shape[axis]
+        if layer.layer_type.name == 'TRANSPOSED':
+            output_shape[axis] = (size - 1) * layer.stride + layer.kernel_size
+        elif size < layer.kernel_size:
+            raise ShapeError(f"Kernel size {layer.kernel_size} is larger than input size {size}")
+        else:
+            output_shape[axis] = (size - layer.kernel_size) // layer.stride + 1
+    output_shape[-1] = layer.filters
+    return output_shape
+
+
+@shape_rule('PoolingLayer')
+def _pooling(layer, input_shape):
+    _positive(layer, 'pool_size')
+    output_shape = list(input_shape)
+    for axis in _spatial_axes(layer, input_shape):
+        if input_shape[axis] < layer.pool_size:
+            raise ShapeError(f"Pool size {layer.pool_size} is larger than input size {input_shape[axis]}")
+        output_shape[axis] = input_shape[axis] // layer.pool_size
+    return output_shape
+
+
+@shape_rule('FlatteningLayer')
+def _flatten(layer, input_shape):
+    return (reduce(operator.mul, input_shape, 1),)
+
+
+@shape_rule('DenseLayer')
+def _dense(layer, input_shape):
+    if not input_shape:
+        raise ShapeError("DenseLayer needs at least one input dimension")
+    return (*input_shape[:-1], layer.units)
+
+
+@shape_rule('EmbeddingLayer')
+def _embedding(layer, input_shape):
+    return (*input_shape, layer.embedding_dim)
+
+
+@shape_rule('AttentionLayer')
+def _attention(layer, input_shape):
+    if len(input_shape) < 2:
+        raise ShapeError(f"AttentionLayer needs a (sequence, features) input, got {list(input_shape)}")
+    _positive(layer, 'num_heads')
+    if input_shape[-1] % layer.num_heads:
+        raise ShapeError(f"{input_shape[-1]} features cannot be split across {layer.num_heads} heads")
+    return input_shape
+
+
+@shape_rule('ActivationFunction', 'NormalizationLayer', 'DropoutLayer')
+def _same_shape(layer, input_shape):
+    return input_shape
@@ -0,0 +1,362 @@
+import itertools
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+
+from neural_network import NeuralNetwork
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS networks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    next_layer_id INTEGER NOT NULL DEFAULT 0,
+    next_connection_id INTEGER NOT NULL DEFAULT 0,
+    revision INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS layers (
+    network_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    params TEXT NOT NULL,
+    PRIMARY KEY (network_id, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS connections (
+    network_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    source_id INTEGER NOT NULL,
+    target_id INTEGER NOT NULL,
+    PRIMARY KEY (network_id, id)
+) WITHOUT ROWID;
+"""
+
+INSERT_LAYER = "INSERT OR REPLACE INTO layers (network_id, id, type, params) VALUES (?, ?, ?, ?)"
+DELETE_LAYER = "DELETE FROM layers WHERE network_id = ? AND id = ?"
+INSERT_CONNECTION = ("INSERT OR REPLACE INTO connections (network_id, id, source_id, target_id) "
+                     "VALUES (?, ?, ?, ?)")
+DELETE_CONNECTION = "DELETE FROM connections WHERE network_id = ? AND id = ?"
+UPDATE_REVISION = "UPDATE networks SET revision = MAX(revision, ?), version = version + 1 WHERE id = ?"
+UPDATE_COUNTERS = ("UPDATE networks SET next_layer_id = MAX(next_layer_id, ?), "
+                   "next_connection_id = MAX(next_connection_id, ?), revision = MAX(revision, ?), "
+                   "version = version + 1 WHERE id = ?")
+ID_COLUMNS = {'layer': 'next_layer_id', 'connection': 'next_connection_id'}
+
+# Layer or connection ids reserved for a network at a time by reserve_ids
+ID_BLOCK = 64
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteNetworkStore:
+    """Networks persisted in SQLite (WAL mode), with mutations buffered and written in batches.
+
+    Mutations are queued by record_change, which networks call through their listener
+    hook, and written by a background thread every flush_interval seconds, or sooner once
+    max_pending statements are waiting. Changing a network never waits for the database,
+    except to reserve a block of ids in a short transaction once every ID_BLOCK ids.
+
+    Several processes can share one database: reserved id blocks keep them from handing
+    out the same ids, and every write bumps the stored version of the networks it touches.
+    A network whose version was moved on by another process is stale, and is reloaded by
+    the registry. Flushes notice this as they write; otherwise the stored version is read
+    at most once every check_interval seconds, so reads may lag other processes by that much.
+    """
+
+    def __init__(self, path, layer_types, flush_interval=0.2, max_pending=1000, check_interval=1.0):
+        self.path = path
+        self.layer_types = layer_types
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.check_interval = check_interval
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('PRAGMA busy_timeout=5000')
+        self._db.executescript(SCHEMA)
+        columns = {row[1] for row in self._db.execute('PRAGMA table_info(networks)')}
+        for column in ('revision', 'version'):
+            if column not in columns:
+                # Databases created before networks had revisions and versions
+                self._db.execute(f'ALTER TABLE networks ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+        # Lock order: _db_lock before _pending_lock, so batches are written in queue order
+        self._db_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = []
+        self._revisions = {}
+        # network id -> stored version as last loaded or written here, and when it was last read
+        self._versions = {}
+        self._checked = {}
+        self._stale = set()
+        # Failed flushes; their changes stay queued and are retried
+        self.flush_failures = 0
+        self.last_flush_error = None
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._run, name='network-store-flush', daemon=True)
+        self._flusher.start()
+
+    def create_network(self) -> str:
+        """Allocate a network id; AUTOINCREMENT keeps ids unique across worker processes"""
+        with self._db_lock:
+            cursor = self._db.execute('INSERT INTO networks DEFAULT VALUES')
+            self._synced(cursor.lastrowid, 0)
+        return str(cursor.lastrowid)
+
+    def reserve_ids(self, network_id, kind, next_id):
+        """Reserve a block of layer or connection ids (kind) of a network for this process,
+        returning (first id, end of the block). A network that is no longer stored keeps
+        counting from next_id, and is marked stale."""
+        network_id = int(network_id)
+        column = ID_COLUMNS[kind]
+        with self._db_lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute(f'SELECT {column} FROM networks WHERE id = ?', (network_id,)).fetchone()
+                if row is not None:
+                    start = max(row[0], next_id)
+                    self._db.execute(f'UPDATE networks SET {column} = ? WHERE id = ?',
+                                     (start + ID_BLOCK, network_id))
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+        if row is None:
+            with self._pending_lock:
+                self._stale.add(network_id)
+            return next_id, next_id + ID_BLOCK
+        return start, start + ID_BLOCK
+
+    def record_change(self, network, change):
+        network_id = int(network.id)
+        op = change["op"]
+        if op == "add_layer":
+            layer = change["layer"]
+            statement = (INSERT_LAYER, (network_id, layer["id"], layer["type"], json.dumps(layer["params"])))
+        elif op == "remove_layer":
+            statement = (DELETE_LAYER, (network_id, change["id"]))
+        elif op == "add_connection":
+            connection = change["connection"]
+            statement = (INSERT_CONNECTION,
+                         (network_id, connection["id"], connection["source"], connection["target"]))
+        elif op == "remove_connection":
+            statement = (DELETE_CONNECTION, (network_id, change["id"]))
+        else:
+            return
+
+        with self._pending_lock:
+            self._pending.append(statement)
+            self._revisions[network_id] = max(self._revisions.get(network_id, 0), change.get("revision", 0))
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._db_lock:
+            pending, revisions = self._take_pending()
+            if not pending and not revisions:
+                return
+            try:
+                self._db.execute('BEGIN IMMEDIATE')
+                versions = self._stored_versions(revisions)
+                # Changes to networks deleted meanwhile have nowhere to go
+                self._execute([statement for statement in pending if versions[statement[1][0]] is not None],
+                              {network_id: revision for network_id, revision in revisions.items()
+                               if versions[network_id] is not None})
+                self._db.execute('COMMIT')
+            except Exception as e:
+                if self._db.in_transaction:
+                    self._db.execute('ROLLBACK')
+                self._requeue(pending, revisions)
+                self.flush_failures += 1
+                self.last_flush_error = f"{type(e).__name__}: {e}"
+                raise
+            for network_id, version in versions.items():
+                self._written(network_id, version)
+
+    def stale(self, network):
+        """Return True if another process has changed or deleted network since it was last
+        loaded or written here, reading its stored version at most once per check_interval"""
+        network_id = int(network.id)
+        with self._pending_lock:
+            if network_id in self._stale:
+                return True
+        now = time.monotonic()
+        if now - self._checked.get(network_id, -math.inf) < self.check_interval:
+            return False
+        with self._db_lock:
+            self._checked[network_id] = now
+            row = self._db.execute('SELECT version FROM networks WHERE id = ?', (network_id,)).fetchone()
+            return (row[0] if row is not None else None) != self._versions.get(network_id)
+
+    def refresh(self, network):
+        """Reload network from the database, returning False if it is no longer stored"""
+        with network.lock:
+            self.flush()
+            with self._db_lock:
+                return self._restore(network)
+
+    def stats(self):
+        with self._pending_lock:
+            return {
+                "pending": len(self._pending),
+                "flush_failures": self.flush_failures,
+                "last_flush_error": self.last_flush_error
+            }
+
+    def _take_pending(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+            revisions, self._revisions = self._revisions, {}
+        return pending, revisions
+
+    def _stored_versions(self, network_ids):
+        # Call inside a write transaction, so the versions cannot move before it commits
+        versions = {}
+        for network_id in network_ids:
+            row = self._db.execute('SELECT version FROM networks WHERE id = ?', (network_id,)).fetchone()
+            versions[network_id] = row[0] if row is not None else None
+        return versions
+
+    def _execute(self, pending, revisions):
+        for sql, group in itertools.groupby(pending, key=lambda statement: statement[0]):
+            self._db.executemany(sql, [args for _, args in group])
+        self._db.executemany(UPDATE_REVISION, [
+            (revision, network_id) for network_id, revision in revisions.items()
+        ])
+
+    def _requeue(self, pending, revisions):
+        # Put a failed batch back in front of anything queued meanwhile so nothing is lost
+        with self._pending_lock:
+            self._pending = pending + self._pending
+            for network_id, revision in revisions.items():
+                self._revisions[network_id] = max(self._revisions.get(network_id, 0), revision)
+
+    def _written(self, network_id, version):
+        # After a write that found version stored for network_id; call with _db_lock held
+        if version != self._versions.get(network_id):
+            # Deleted, or written by another process since this one last synced
+            with self._pending_lock:
+                self._stale.add(network_id)
+        if version is not None:
+            self._versions[network_id] = version + 1
+
+    def _synced(self, network_id, version):
+        # The network held here now matches the stored version; call with _db_lock held
+        self._versions[network_id] = version
+        self._checked[network_id] = time.monotonic()
+        with self._pending_lock:
+            self._stale.discard(network_id)
+
+    def save_network(self, network):
+        """Write the whole graph of a network built without record_change, such as a clone"""
+        network_id = int(network.id)
+        with network.lock:
+            layers, connections, next_layer_id, next_connection_id = network.snapshot()
+            revision = network.revision
+        with self._db_lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                versions = self._stored_versions([network_id])
+                self._db.executemany(INSERT_LAYER, [
+                    (network_id, layer_id, layer_class.__name__, json.dumps(config))
+                    for layer_id, layer_class, config in layers
+                ])
+                self._db.executemany(INSERT_CONNECTION, [
+                    (network_id, connection_id, source_id, target_id)
+                    for connection_id, source_id, target_id in connections
+                ])
+                self._db.execute(UPDATE_COUNTERS, (next_layer_id, next_connection_id, revision, network_id))
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+            self._written(network_id, versions[network_id])
+
+    def load_network(self, network_id) -> NeuralNetwork:
+        """Load a network and its graph, or return None if it is not stored"""
+        if not str(network_id).isdigit():
+            return None
+        self.flush()
+        network = NeuralNetwork(str(network_id))
+        with self._db_lock:
+            if not self._restore(network):
+                return None
+        return network
+
+    def _restore(self, network):
+        # Replace network's graph with the stored one; call with _db_lock held
+        network_id = int(network.id)
+        row = self._db.execute(
+            'SELECT next_layer_id, next_connection_id, revision, version FROM networks WHERE id = ?',
+            (network_id,)).fetchone()
+        if row is None:
+            return False
+        layer_rows = self._db.execute(
+            'SELECT id, type, params FROM layers WHERE network_id = ? ORDER BY id', (network_id,)).fetchall()
+        connection_rows = self._db.execute(
+            'SELECT id, source_id, target_id FROM connections WHERE network_id = ? ORDER BY id',
+            (network_id,)).fetchall()
+
+        layers = []
+        for layer_id, layer_type, params in layer_rows:
+            layer = self.layer_types[layer_type].from_params(json.loads(params))
+            layer.id = layer_id
+            layers.append(layer)
+        network.restore(layers, connection_rows, row[0], row[1], row[2])
+        self._synced(network_id, row[3])
+        return True
+
+    def delete_network(self, network_id) -> bool:
+        if not str(network_id).isdigit():
+            return False
+        self.flush()
+        with self._db_lock:
+            self._db.execute('BEGIN')
+            try:
+                self._db.execute('DELETE FROM layers WHERE network_id = ?', (int(network_id),))
+                self._db.execute('DELETE FROM connections WHERE network_id = ?', (int(network_id),))
+                cursor = self._db.execute('DELETE FROM networks WHERE id = ?', (int(network_id),))
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+            self._versions.pop(int(network_id), None)
+            self._checked.pop(int(network_id), None)
+        return cursor.rowcount > 0
+
+    def summaries(self):
+        """Return [(id, layer count, connection count)] for every stored network"""
+        self.flush()
+        with self._db_lock:
+            rows = self._db.execute(
+                'SELECT n.id, '
+                '(SELECT COUNT(*) FROM layers l WHERE l.network_id = n.id), '
+                '(SELECT COUNT(*) FROM connections c WHERE c.network_id = n.id) '
+                'FROM networks n ORDER BY n.id').fetchall()
+        return [(str(network_id), layers, connections) for network_id, layers, connections in rows]
+
+    def count(self) -> int:
+        with self._db_lock:
+            return self._db.execute('SELECT COUNT(*) FROM networks').fetchone()[0]
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._flusher.join()
+        self.flush()
+        self._db.close()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                logger.exception("Failed to flush network store; %d changes stay queued", len(self._pending))
@@ -0,0 +1,38 @@
+import threading
+
+
+class TemplateStore:
+    """Named network designs to start new networks from.
+
+    A template is a clone of the network it was saved from, and networks made from it are
+    clones of the template, so they all share layers until one of them modifies its copy.
+    Templates are held in memory only.
+    """
+
+    def __init__(self):
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def save(self, name, network):
+        """Save a snapshot of network as name, replacing any template already called that"""
+        template = network.clone(f"template:{name}")
+        with self._lock:
+            self._templates[name] = template
+        return template
+
+    def get(self, name):
+        with self._lock:
+            return self._templates.get(name)
+
+    def delete(self, name) -> bool:
+        with self._lock:
+            return self._templates.pop(name, None) is not None
+
+    def summaries(self):
+        """Return [(name, layer count, connection count)] for every template, by name"""
+        with self._lock:
+            templates = sorted(self._templates.items())
+        return [(name, len(t.layers), len(t.connections)) for name, t in templates]
+
+    def __len__(self):
+        return len(self._templates)
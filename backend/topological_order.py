@@ -0,0 +1,132 @@
+class CycleError(ValueError):
+    """Raised when adding an edge would create a cycle"""
+
+    def __init__(self, source_id, target_id, path):
+        self.source_id = source_id
+        self.target_id = target_id
+        self.path = path
+        cycle = " -> ".join(str(node) for node in path + [target_id])
+        super().__init__(f"Connecting {source_id} to {target_id} would create a cycle: {cycle}")
+
+
+class TopologicalOrder:
+    """Topological order of a DAG, maintained incrementally as nodes and edges are added.
+
+    Uses the Pearce-Kelly algorithm: adding an edge that already agrees with the order is
+    O(1); otherwise only the nodes between the edge's endpoints in the current order are
+    searched and reordered among the positions they already occupy.
+    """
+
+    def __init__(self):
+        self.acyclic = True
+        self._position = {}
+        self._next_position = 0
+        self._sorted = None
+
+    def add_node(self, node):
+        self._position[node] = self._next_position
+        self._next_position += 1
+        if self._sorted is not None:
+            self._sorted.append(node)
+
+    def remove_node(self, node):
+        # Removing a node never invalidates the relative order of the rest
+        del self._position[node]
+        self._sorted = None
+
+    def add_edge(self, source, target, successors, predecessors):
+        """Reorder for the edge source -> target, which must not be in the adjacency maps yet.
+
+        Raises CycleError, leaving the order untouched, if target already reaches source.
+        """
+        lower = self._position[target]
+        upper = self._position[source]
+        if source == target:
+            raise CycleError(source, target, [source])
+        if upper < lower:
+            return
+
+        # Nodes reachable from target that sit at or before source in the order
+        forward, parents = self._search_forward(target, source, upper, successors)
+        if source in forward:
+            path = [source]
+            while path[-1] != target:
+                path.append(parents[path[-1]])
+            raise CycleError(source, target, path[::-1])
+        # Nodes that reach source and sit at or after target in the order
+        backward = self._search_backward(source, lower, predecessors)
+
+        # Everything reaching source must now come before everything target reaches
+        position = self._position
+        nodes = sorted(backward, key=position.__getitem__) + sorted(forward, key=position.__getitem__)
+        positions = sorted(position[node] for node in nodes)
+        for node, new_position in zip(nodes, positions):
+            position[node] = new_position
+        self._sorted = None
+
+    def _search_forward(self, start, goal, upper, successors):
+        position = self._position
+        seen = {start}
+        parents = {}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for neighbour in successors[node]:
+                if neighbour not in seen and position[neighbour] <= upper:
+                    seen.add(neighbour)
+                    parents[neighbour] = node
+                    if neighbour == goal:
+                        return seen, parents
+                    stack.append(neighbour)
+        return seen, parents
+
+    def _search_backward(self, start, lower, predecessors):
+        position = self._position
+        seen = {start}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for neighbour in predecessors[node]:
+                if neighbour not in seen and position[neighbour] >= lower:
+                    seen.add(neighbour)
+                    stack.append(neighbour)
+        return seen
+
+    def copy(self):
+        order = TopologicalOrder()
+        order.acyclic = self.acyclic
+        order._position = dict(self._position)
+        order._next_position = self._next_position
+        order._sorted = list(self._sorted) if self._sorted is not None else None
+        return order
+
+    def position(self, node):
+        return self._position[node]
+
+    def order(self):
+        if self._sorted is None:
+            self._sorted = sorted(self._position, key=self._position.__getitem__)
+        return self._sorted
+
+    def __len__(self):
+        return len(self._position)
+
+    @classmethod
+    def from_graph(cls, nodes, successors, predecessors):
+        """Build an order for an existing graph with Kahn's algorithm in O(V + E).
+
+        Nodes left on a cycle are placed last and ``acyclic`` is set to False on the result.
+        """
+        topological_order = cls()
+        in_degree = {node: len(predecessors.get(node, ())) for node in nodes}
+        ready = sorted(node for node, degree in in_degree.items() if degree == 0)
+        for node in ready:
+            topological_order.add_node(node)
+            for target in successors.get(node, ()):
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    ready.append(target)
+        topological_order.acyclic = len(topological_order) == len(in_degree)
+        for node in sorted(node for node in nodes if node not in topological_order._position):
+            topological_order.add_node(node)
+        return topological_order
@@ -0,0 +1,329 @@
+import multiprocessing
+from collections import namedtuple
+from functools import reduce
+import operator
+
+import numpy as np
+
+from executor import compile_network, ExecutionError, SoftmaxKernel
+
+
+TrainingResult = namedtuple('TrainingResult', ['weights', 'history', 'stopped'])
+
+PROBABILITY_EPSILON = 1e-7
+
+
+# ---- losses -------------------------------------------------------------------------------
+# loss(outputs, targets, total) -> (loss, gradient). Both are for the mean over `total`
+# samples, so gradients of shards of one batch add up to the gradient of the whole batch.
+
+def mean_squared_error(outputs, targets, total):
+    if targets.shape != outputs.shape:
+        raise ExecutionError(f"Targets must have shape {list(outputs.shape)}, got {list(targets.shape)}")
+    difference = outputs - targets
+    scale = 1.0 / (total * reduce(operator.mul, outputs.shape[1:], 1))
+    return float((difference * difference).sum() * scale), difference * (2.0 * scale)
+
+
+def cross_entropy(outputs, targets, total):
+    """Cross-entropy of softmax outputs against class ids or one-hot/probability targets"""
+    scale = 1.0 / (total * reduce(operator.mul, outputs.shape[1:-1], 1))
+    if targets.shape == outputs.shape[:-1] and targets.dtype.kind in 'iu':
+        if targets.size and (targets.min() < 0 or targets.max() >= outputs.shape[-1]):
+            raise ExecutionError(f"Class ids must be in [0, {outputs.shape[-1]})")
+        labels = targets[..., None]
+        picked = np.clip(np.take_along_axis(outputs, labels, axis=-1), PROBABILITY_EPSILON, 1.0)
+        grad = np.zeros_like(outputs)
+        np.put_along_axis(grad, labels, -scale / picked, axis=-1)
+        return float(-np.log(picked).sum() * scale), grad
+    if targets.shape != outputs.shape:
+        raise ExecutionError(f"Targets must be class ids of shape {list(outputs.shape[:-1])} "
+                             f"or distributions of shape {list(outputs.shape)}")
+    clipped = np.clip(outputs, PROBABILITY_EPSILON, 1.0)
+    return float(-(targets * np.log(clipped)).sum() * scale), targets * (-scale / clipped)
+
+
+LOSSES = {
+    'mse': mean_squared_error,
+    'cross_entropy': cross_entropy
+}
+
+
+# ---- optimizers ---------------------------------------------------------------------------
+# Optimizers update one flat parameter vector in place from one flat gradient vector.
+
+class SGD:
+    def __init__(self, learning_rate=0.01, momentum=0.0):
+        self.learning_rate = learning_rate
+        self.momentum = momentum
+        self._velocity = None
+
+    def step(self, params, grads):
+        if not self.momentum:
+            params -= self.learning_rate * grads
+            return
+        if self._velocity is None:
+            self._velocity = np.zeros_like(params)
+        self._velocity *= self.momentum
+        self._velocity -= self.learning_rate * grads
+        params += self._velocity
+
+
+class Adam:
+    def __init__(self, learning_rate=0.001, beta1=0.9, beta2=0.999, epsilon=1e-8):
+        self.learning_rate = learning_rate
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.epsilon = epsilon
+        self._steps = 0
+        self._m = None
+        self._v = None
+
+    def step(self, params, grads):
+        if self._m is None:
+            self._m = np.zeros_like(params)
+            self._v = np.zeros_like(params)
+        self._steps += 1
+        self._m *= self.beta1
+        self._m += (1.0 - self.beta1) * grads
+        self._v *= self.beta2
+        self._v += (1.0 - self.beta2) * grads * grads
+        # Bias corrections folded into the step size
+        step_size = (self.learning_rate * np.sqrt(1.0 - self.beta2 ** self._steps)
+                     / (1.0 - self.beta1 ** self._steps))
+        params -= step_size * self._m / (np.sqrt(self._v) + self.epsilon)
+
+
+OPTIMIZERS = {
+    'sgd': SGD,
+    'adam': Adam
+}
+
+
+# ---- flat parameters ----------------------------------------------------------------------
+
+class FlatParameters:
+    """A plan's parameters packed into one contiguous float32 vector.
+
+    Every kernel param is rebound to a view into ``values``, so an optimizer step on the
+    vector updates the plan, and the vector can live in shared memory.
+    """
+
+    def __init__(self, plan, values=None):
+        self.layout = []
+        offset = 0
+        for step_kernel in plan.kernels.values():
+            for name, param in step_kernel.params.items():
+                self.layout.append((step_kernel, name, offset, param.shape))
+                offset += param.size
+        self.size = offset
+        if values is None:
+            values = np.empty(self.size, dtype=np.float32)
+            for step_kernel, name, start, shape in self.layout:
+                values[start:start + step_kernel.params[name].size] = step_kernel.params[name].ravel()
+        self.values = values
+        for step_kernel, name, start, shape in self.layout:
+            size = reduce(operator.mul, shape, 1)
+            step_kernel.params[name] = values[start:start + size].reshape(shape)
+
+    def gather_grads(self, out):
+        for step_kernel, name, start, shape in self.layout:
+            grad = step_kernel.grads[name]
+            out[start:start + grad.size] = grad.ravel()
+        return out
+
+
+# ---- training -----------------------------------------------------------------------------
+
+def train(network, inputs, targets, epochs=1, batch_size=32, optimizer='adam', learning_rate=None,
+          loss=None, workers=1, seed=0, weights=None, progress=None, should_stop=None):
+    """Train a network on in-memory data and return a TrainingResult.
+
+    inputs are as for ExecutionPlan.run, targets hold one row per sample for the network's
+    single output layer. loss defaults to cross_entropy for softmax outputs and mse otherwise.
+    With workers > 1 every batch is split across a process pool; the workers share the
+    parameters, the batch and one gradient row each through shared memory. Random state
+    such as dropout masks is drawn per step for the whole batch, so for one seed the
+    result is the same, up to float rounding, whatever the number of workers.
+
+    progress(record) is called after every step; training stops early, with stopped=True,
+    as soon as should_stop() returns true.
+    """
+    plan = compile_network(network, seed=seed, weights=weights)
+    if len(plan.output_ids) != 1:
+        raise ExecutionError(f"Training needs exactly one output layer, found {len(plan.output_ids)}")
+    output_id = plan.output_ids[0]
+    arrays, samples = plan.prepare_inputs(inputs)
+    targets = np.asarray(targets)
+    if targets.dtype.kind == 'f':
+        targets = targets.astype(np.float32)
+    if len(targets) != samples:
+        raise ExecutionError(f"Got {len(targets)} targets for {samples} samples")
+
+    softmax_output = isinstance(plan.output_kernel(output_id), SoftmaxKernel)
+    loss = loss or ('cross_entropy' if softmax_output else 'mse')
+    if loss not in LOSSES:
+        raise ExecutionError(f"Unknown loss: {loss}")
+    if loss == 'cross_entropy' and not softmax_output:
+        raise ExecutionError("cross_entropy needs a network ending in a SoftMaxFunction")
+    if optimizer not in OPTIMIZERS:
+        raise ExecutionError(f"Unknown optimizer: {optimizer}")
+    optimizer = OPTIMIZERS[optimizer](**({'learning_rate': learning_rate} if learning_rate is not None else {}))
+
+    batch_size = max(1, min(batch_size, samples))
+    workers = max(1, min(workers, batch_size))
+    runner = (_ParallelRunner if workers > 1 else _LocalRunner)(plan, output_id, loss, arrays, targets,
+                                                                batch_size, workers, seed)
+    rng = np.random.default_rng(seed)
+    steps = -(-samples // batch_size)
+    history = []
+    stopped = False
+    try:
+        for epoch in range(epochs):
+            order = rng.permutation(samples)
+            total = 0.0
+            for step in range(steps):
+                if should_stop is not None and should_stop():
+                    stopped = True
+                    break
+                indices = order[step * batch_size:(step + 1) * batch_size]
+                batch_loss, grads = runner.step(epoch * steps + step, indices)
+                optimizer.step(runner.params.values, grads)
+                total += batch_loss * len(indices)
+                if progress is not None:
+                    progress({"epoch": epoch, "step": step, "steps": steps, "loss": batch_loss})
+            if stopped:
+                break
+            history.append(total / samples)
+    finally:
+        runner.close()
+
+    weights = {layer_id: {name: np.array(param) for name, param in params.items()}
+               for layer_id, params in plan.weights().items()}
+    return TrainingResult(weights, history, stopped)
+
+
+def _step_seed(seed, step):
+    # Seed of the random state of one training step, whichever process runs it
+    return int(np.random.SeedSequence([seed, step]).generate_state(1)[0])
+
+
+class _LocalRunner:
+    def __init__(self, plan, output_id, loss, arrays, targets, batch_size, workers, seed):
+        self.plan = plan
+        self.output_id = output_id
+        self.loss = LOSSES[loss]
+        self.arrays = arrays
+        self.targets = targets
+        self.seed = seed
+        self.params = FlatParameters(plan)
+        self._grads = np.empty(self.params.size, dtype=np.float32)
+
+    def step(self, step, indices):
+        self.plan.reseed(_step_seed(self.seed, step))
+        batch = {layer_id: array[indices] for layer_id, array in self.arrays.items()}
+        outputs = self.plan.run(batch, training=True)[self.output_id]
+        value, grad = self.loss(outputs, self.targets[indices], len(indices))
+        self.plan.backward({self.output_id: grad})
+        return value, self.params.gather_grads(self._grads)
+
+    def close(self):
+        pass
+
+
+class _ParallelRunner:
+    """Data-parallel steps: the parent gathers each batch into shared memory, every worker
+    runs forward and backward on its shard and writes its gradient into its own row of a
+    shared (workers, params) matrix, and the parent sums the rows."""
+
+    def __init__(self, plan, output_id, loss, arrays, targets, batch_size, workers, seed):
+        from multiprocessing import shared_memory
+
+        self.plan = plan
+        self.arrays = arrays
+        self.targets = targets
+        self.workers = workers
+        self.params = FlatParameters(plan)
+        self._segments = []
+        specs = {}
+
+        def share(key, shape, dtype):
+            size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            segment = shared_memory.SharedMemory(create=True, size=size)
+            self._segments.append(segment)
+            specs[key] = (segment.name, shape, np.dtype(dtype).str)
+            return np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+
+        try:
+            params = share('params', (self.params.size,), np.float32)
+            params[:] = self.params.values
+            self.params = FlatParameters(plan, params)
+            self._grads = share('grads', (workers, self.params.size), np.float32)
+            self._batch = {layer_id: share(('input', layer_id), (batch_size, *array.shape[1:]), array.dtype)
+                           for layer_id, array in arrays.items()}
+            self._batch_targets = share('targets', (batch_size, *targets.shape[1:]), targets.dtype)
+            self._reduced = np.empty(self.params.size, dtype=np.float32)
+            self._pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                              initargs=(plan, output_id, loss, specs, seed))
+        except BaseException:
+            self._release()
+            raise
+
+    def step(self, step, indices):
+        count = len(indices)
+        for layer_id, array in self.arrays.items():
+            np.take(array, indices, axis=0, out=self._batch[layer_id][:count])
+        np.take(self.targets, indices, axis=0, out=self._batch_targets[:count])
+
+        bounds = np.linspace(0, count, min(self.workers, count) + 1).astype(int)
+        shards = [(step, rank, int(start), int(stop), count)
+                  for rank, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:]))]
+        losses = self._pool.map(_worker_step, shards)
+        np.sum(self._grads[:len(shards)], axis=0, out=self._reduced)
+        return sum(losses), self._reduced
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+        self._release()
+
+    def _release(self):
+        # Copy the parameters out of shared memory, then drop every view into it so the
+        # segments can be closed
+        self.params = FlatParameters(self.plan)
+        self._grads = self._batch = self._batch_targets = None
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
+
+
+# Per-process state of data-parallel workers, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(plan, output_id, loss, specs, seed):
+    from multiprocessing import shared_memory
+
+    arrays = {}
+    for key, (name, shape, dtype) in specs.items():
+        segment = shared_memory.SharedMemory(name=name)
+        _worker.setdefault('segments', []).append(segment)
+        arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+    # Parameters become views into the shared vector the parent's optimizer updates
+    _worker.update(plan=plan, output_id=output_id, loss=LOSSES[loss], arrays=arrays,
+                   flat=FlatParameters(plan, arrays['params']), seed=seed)
+
+
+def _worker_step(shard):
+    step, rank, start, stop, total = shard
+    plan, arrays, output_id = _worker['plan'], _worker['arrays'], _worker['output_id']
+    # Any process may run any shard, so random state such as dropout masks comes from the
+    # step, drawn for the whole batch, rather than from the process
+    plan.reseed(_step_seed(_worker['seed'], step), rows=(start, total))
+    batch = {layer_id: arrays[('input', layer_id)][start:stop] for layer_id in plan.input_ids}
+    outputs = plan.run(batch, training=True)[output_id]
+    value, grad = _worker['loss'](outputs, arrays['targets'][start:stop], total)
+    plan.backward({output_id: grad})
+    _worker['flat'].gather_grads(arrays['grads'][rank])
+    return value
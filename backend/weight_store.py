@@ -0,0 +1,58 @@
+import logging
+import os
+import threading
+import zipfile
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+class WeightStore:
+    """Trained parameters ({layer id: {name: array}}) of networks, one .npz file per network
+    in directory, so they outlive the in-memory network and are shared by worker processes"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, network_id):
+        return os.path.join(self.directory, f"{network_id}.npz")
+
+    def save(self, network_id, weights):
+        arrays = {f"{layer_id}/{name}": np.asarray(value)
+                  for layer_id, params in weights.items() for name, value in params.items()}
+        path = self._path(network_id)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, path)
+
+    def load(self, network_id):
+        """Return the stored weights of a network, or None if it has none"""
+        try:
+            with np.load(self._path(network_id), allow_pickle=False) as arrays:
+                weights = {}
+                for key in arrays.files:
+                    layer_id, name = key.split('/', 1)
+                    weights.setdefault(int(layer_id), {})[name] = arrays[key]
+                return weights
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            # Moved aside, so the network starts untrained and the file is kept for inspection
+            path = self._path(network_id)
+            try:
+                os.replace(path, f"{path}.corrupt")
+            except OSError:
+                pass
+            logger.warning("Unreadable weights for network %s moved to %s.corrupt: %s", network_id, path, e)
+            return None
+
+    def delete(self, network_id):
+        try:
+            os.remove(self._path(network_id))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,277 @@
+"""Latency and throughput benchmarks for the network editing API.
+
+Drives backend/app.py through Flask's test client, so no server is needed:
+
+    python benchmarks/bench_api.py --output results.json
+    python benchmarks/bench_api.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_api.py --baseline benchmarks/baseline.json
+
+Graph-dependent endpoints (add_layer, connect_layers) are measured on networks of each
+--sizes layer count, built up front with the batch endpoint; create_network and
+get_layer_types do not depend on graph size and are measured once per concurrency level.
+With --baseline, results are compared to a stored run and the exit status is 1 when any
+of them regressed by more than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app import app  # noqa: E402
+
+
+BUILD_CHUNK = 5000
+LAYER = {"type": "DenseLayer", "params": {"units": 8}}
+SCENARIOS = ('create_network', 'get_layer_types', 'add_layer', 'connect_layers')
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def check(response, expected=200):
+    if response.status_code != expected:
+        raise RuntimeError(f"{response.request.method} {response.request.path} returned "
+                           f"{response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response.get_json()
+
+
+def build_network(client, size, rng):
+    """Create a network of size layers: a tabular input and dense layers each fed by a
+    random earlier layer. Returns (network id, layer ids)."""
+    network_id = check(client.post('/api/networks', json={}))["id"]
+    ids = [check(client.post(f'/api/networks/{network_id}/layers', json={
+        "type": "TabularInputLayer", "params": {"input_type": "TABULAR", "num_features": 16}
+    }))["id"]]
+    while len(ids) < size:
+        start = len(ids)
+        count = min(BUILD_CHUNK, size - start)
+        operations = []
+        for index in range(start, start + count):
+            source = rng.randrange(index)
+            operations.append({"op": "add_layer", "ref": f"n{index}", **LAYER})
+            operations.append({"op": "connect", "source": ids[source] if source < start else f"n{source}",
+                               "target": f"n{index}"})
+        layers = check(client.post(f'/api/networks/{network_id}/batch', json={"operations": operations}))["layers"]
+        ids.extend(layers[f"n{index}"] for index in range(start, start + count))
+    return network_id, ids
+
+
+def run_concurrent(concurrency, requests, make_call):
+    """Issue requests calls split over concurrency threads, each with its own client.
+    make_call(client, thread index) returns a function sending request number i."""
+    per_thread = [requests // concurrency + (index < requests % concurrency) for index in range(concurrency)]
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(index):
+        call = make_call(app.test_client(), index)
+        barrier.wait()
+        for number in range(per_thread[index]):
+            started = time.perf_counter()
+            status = call(number)
+            latencies[index].append(time.perf_counter() - started)
+            if status >= 400:
+                errors[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    values = sorted(value for thread_values in latencies for value in thread_values)
+    return {
+        "requests": len(values),
+        "errors": sum(errors),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3),
+        "rps": round(len(values) / elapsed, 1)
+    }
+
+
+def bench_create_network(concurrency, requests):
+    def make_call(client, _):
+        return lambda _: client.post('/api/networks', json={}).status_code
+    return run_concurrent(concurrency, requests, make_call)
+
+
+def bench_get_layer_types(concurrency, requests):
+    def make_call(client, _):
+        return lambda _: client.get('/api/layer-types').status_code
+    return run_concurrent(concurrency, requests, make_call)
+
+
+def bench_add_layer(network_id, ids, concurrency, requests, rng):
+    def make_call(client, _):
+        return lambda _: client.post(f'/api/networks/{network_id}/layers', json=LAYER).status_code
+    return run_concurrent(concurrency, requests, make_call)
+
+
+def bench_connect_layers(network_id, ids, concurrency, requests, rng):
+    # Each request feeds a fresh, unconnected layer from a random layer of the graph, so
+    # every connection is valid and none can close a cycle
+    client = app.test_client()
+    targets = check(client.post(f'/api/networks/{network_id}/batch', json={"operations": [
+        {"op": "add_layer", "ref": f"t{index}", **LAYER} for index in range(requests)
+    ]}))["layers"]
+    pairs = [(rng.choice(ids), targets[f"t{index}"]) for index in range(requests)]
+
+    def make_call(client, thread):
+        mine = pairs[thread::concurrency]
+        return lambda number: client.post(f'/api/networks/{network_id}/connections', json={
+            "source": mine[number][0], "target": mine[number][1]
+        }).status_code
+    return run_concurrent(concurrency, requests, make_call)
+
+
+GRAPH_BENCHMARKS = {'add_layer': bench_add_layer, 'connect_layers': bench_connect_layers}
+FLAT_BENCHMARKS = {'create_network': bench_create_network, 'get_layer_types': bench_get_layer_types}
+
+
+def run(sizes, concurrencies, requests, scenarios, seed=0, log=sys.stderr):
+    rng = random.Random(seed)
+    client = app.test_client()
+    results = []
+    # The first catalog request builds and compresses it; later ones are what is measured
+    check(client.get('/api/layer-types'))
+
+    def record(scenario, size, concurrency, measured):
+        result = {"scenario": scenario, "size": size, "concurrency": concurrency, **measured,
+                  "peak_rss_mb": peak_rss_mb()}
+        results.append(result)
+        print(f"{scenario:>16} size={size!s:>7} c={concurrency:<3} p50={result['p50_ms']:.3f}ms "
+              f"p99={result['p99_ms']:.3f}ms rps={result['rps']:.1f}", file=log)
+
+    for scenario in scenarios:
+        if scenario in FLAT_BENCHMARKS:
+            for concurrency in concurrencies:
+                record(scenario, None, concurrency, FLAT_BENCHMARKS[scenario](concurrency, requests))
+
+    graph_scenarios = [scenario for scenario in scenarios if scenario in GRAPH_BENCHMARKS]
+    for size in sizes if graph_scenarios else ():
+        started = time.perf_counter()
+        network_id, ids = build_network(client, size, rng)
+        print(f"built {size} layers in {time.perf_counter() - started:.2f}s", file=log)
+        for scenario in graph_scenarios:
+            for concurrency in concurrencies:
+                record(scenario, size, concurrency,
+                       GRAPH_BENCHMARKS[scenario](network_id, ids, concurrency, requests, rng))
+        client.delete(f'/api/networks/{network_id}')
+    return results
+
+
+def result_key(result):
+    return result["scenario"], result["size"], result["concurrency"]
+
+
+def compare(results, baseline, threshold):
+    """Ratios of each result to the matching baseline result; a result regressed when its
+    p50 or p99 latency grew, or its throughput fell, by more than threshold"""
+    previous = {result_key(result): result for result in baseline["results"]}
+    comparison = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        ratios = {
+            "p50": result["p50_ms"] / old["p50_ms"] if old["p50_ms"] else None,
+            "p99": result["p99_ms"] / old["p99_ms"] if old["p99_ms"] else None,
+            "rps": result["rps"] / old["rps"] if old["rps"] else None
+        }
+        regressed = ((ratios["p50"] or 0) > 1 + threshold or (ratios["p99"] or 0) > 1 + threshold
+                     or (ratios["rps"] is not None and ratios["rps"] < 1 / (1 + threshold)))
+        comparison.append({
+            "scenario": result["scenario"], "size": result["size"], "concurrency": result["concurrency"],
+            **{name: round(ratio, 3) if ratio is not None else None for name, ratio in ratios.items()},
+            "regressed": regressed
+        })
+    return comparison
+
+
+def parse_list(text):
+    return [int(value) for value in text.split(',') if value]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=parse_list, default=[10, 100, 1000, 10000, 100000],
+                        help="comma-separated graph sizes in layers")
+    parser.add_argument('--concurrency', type=parse_list, default=[1, 4, 16],
+                        help="comma-separated numbers of concurrent clients")
+    parser.add_argument('--requests', type=int, default=200, help="requests per measurement")
+    parser.add_argument('--scenarios', type=lambda text: text.split(','), default=list(SCENARIOS),
+                        help="comma-separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--baseline', help="compare against a report saved with --save-baseline")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="allowed relative slowdown before a result counts as a regression")
+    parser.add_argument('--save-baseline', help="also write the report here for later comparisons")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "requests": args.requests,
+            "seed": args.seed
+        },
+        "results": run(args.sizes, args.concurrency, args.requests, args.scenarios, args.seed)
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(report["results"], json.load(f), args.threshold)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(text + '\n')
+
+    regressions = [entry for entry in report.get("comparison", []) if entry["regressed"]]
+    for entry in regressions:
+        print(f"regression: {entry['scenario']} size={entry['size']} c={entry['concurrency']} "
+              f"p50 x{entry['p50']} p99 x{entry['p99']} rps x{entry['rps']}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,8 +12,9 @@ function getAuthHeader() {
   return authToken ? { Authorization: `Bearer ${authToken}` } : {};
 }
 class ApiClient {
-
-
+  constructor() {
+    this.assetCache = new Map();
+  }
   
   async fetchApi(endpoint, options = {}) {
     try {      
@@ -39,13 +40,30 @@ class ApiClient {
     }
   }
   
-  async createNetwork() {
+  async createNetwork(template = null) {
     const result = await this.fetchApi('networks', {
       method: 'POST',
-      body: JSON.stringify({})
+      body: JSON.stringify(template ? { template } : {})
     });
     return result.id;
   }
+
+  async cloneNetwork(networkId) {
+    const result = await this.fetchApi(`networks/${networkId}/clone`, { method: 'POST' });
+    return result.id;
+  }
+
+  async saveTemplate(name, networkId) {
+    return this.fetchApi('templates', {
+      method: 'POST',
+      body: JSON.stringify({ name, network_id: networkId })
+    });
+  }
+
+  async listTemplates() {
+    const result = await this.fetchApi('templates');
+    return result.templates;
+  }
   
   async login(username, password) {
     const response = await this.fetchApi('login', {
@@ -66,12 +84,46 @@ class ApiClient {
       if (!data.layer_types) {
         console.warn('ApiClient: No layer_types property in response');
       }
-      return data.layer_types || [];
+      const layerTypes = data.layer_types || [];
+      await this.resolveSvgAssets(layerTypes);
+      return layerTypes;
     } catch (error) {
       console.error('ApiClient: Error getting layer types:', error);
       throw error;
     }
   }
+
+  async fetchAsset(url) {
+    // Asset URLs are content-hashed, so each one only needs to be fetched once
+    if (!this.assetCache.has(url)) {
+      const request = fetch(new URL(url, API_URL).href, { mode: 'cors' }).then(response => {
+        if (!response.ok) {
+          throw new Error(`Asset error: ${response.status}`);
+        }
+        return response.text();
+      });
+      this.assetCache.set(url, request);
+    }
+    return this.assetCache.get(url);
+  }
+
+  async resolveSvgAssets(layerTypes) {
+    await Promise.all(layerTypes.map(async layerType => {
+      const svg = layerType.svg_representation;
+      if (!svg) {
+        return;
+      }
+      if (svg.svg_url) {
+        svg.svg_content = await this.fetchAsset(svg.svg_url);
+      }
+      if (svg.all_svg_urls) {
+        const entries = await Promise.all(Object.entries(svg.all_svg_urls).map(
+          async ([inputType, url]) => [inputType, await this.fetchAsset(url)]
+        ));
+        svg.all_representations = Object.fromEntries(entries);
+      }
+    }));
+  }
   
   async addLayer(networkId, type, params) {
     const result = await this.fetchApi(`networks/${networkId}/layers`, {
@@ -97,6 +149,58 @@ class ApiClient {
     return result.id;
   }
   
+  async applyBatch(networkId, operations) {
+    // operations: [{ op: 'add_layer', ref, type, params } | { op: 'connect', source, target }]
+    const result = await this.fetchApi(`networks/${networkId}/batch`, {
+      method: 'POST',
+      body: JSON.stringify({ operations })
+    });
+    
+    return result;
+  }
+
+  async predict(networkId, inputs) {
+    // inputs: a batch for a single-input network, or { [inputLayerId]: batch }
+    const result = await this.fetchApi(`networks/${networkId}/predict`, {
+      method: 'POST',
+      body: JSON.stringify({ inputs })
+    });
+
+    return result.outputs;
+  }
+
+  async submitJob(networkId, kind, body = {}) {
+    // kind: 'validate' | 'run' | 'train'; resolves to { job_id, status }
+    return this.fetchApi(`networks/${networkId}/${kind}`, {
+      method: 'POST',
+      body: JSON.stringify(body)
+    });
+  }
+
+  async getJob(jobId) {
+    return this.fetchApi(`jobs/${jobId}`);
+  }
+
+  async cancelJob(jobId) {
+    return this.fetchApi(`jobs/${jobId}`, { method: 'DELETE' });
+  }
+
+  async getChanges(networkId, since) {
+    // { revision, changes } with the changes after `since`, or { revision, reset, layers, connections }
+    // when the server no longer has them all
+    return this.fetchApi(`networks/${networkId}/changes?since=${since}`);
+  }
+
+  subscribeToNetwork(networkId, handlers) {
+    // handlers: { add_layer, remove_layer, add_connection, remove_connection, progress, reset, ... }
+    // EventSource reconnects by itself and resumes from the last event id it saw
+    const source = new EventSource(`${API_URL}/networks/${networkId}/events`);
+    Object.entries(handlers).forEach(([kind, handler]) => {
+      source.addEventListener(kind, event => handler(JSON.parse(event.data)));
+    });
+    return () => source.close();
+  }
+
   async testConnection() {
     try {
       const response = await fetch(`${API_URL}/layer-types`, {
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The backend modules import each other by their top-level names
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND)
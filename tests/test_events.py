@@ -0,0 +1,41 @@
+import threading
+
+from events import EventBus, event_source
+
+
+def test_drop_without_readers_removes_the_stream():
+    bus = EventBus()
+    stream = bus.stream('a')
+    bus.publish('a', 'delete_network', {"id": "a"})
+    bus.drop('a')
+    assert bus.stream('a') is not stream
+    bus.drop('missing')
+
+
+def test_readers_get_the_last_events_before_the_stream_is_removed():
+    bus = EventBus()
+    stream = bus.stream('a')
+    body = event_source(stream, 0, keepalive=30)
+    assert next(body).startswith('retry:')
+    bus.publish('a', 'add_layer', {"id": 1})
+    assert 'event: add_layer' in next(body)
+
+    received = []
+    reader = threading.Thread(target=lambda: received.extend(body))
+    reader.start()
+    bus.publish('a', 'delete_network', {"id": "a"})
+    bus.drop('a')
+    reader.join(5)
+
+    assert not reader.is_alive()
+    assert ['event: delete_network' in chunk for chunk in received] == [True]
+    assert stream.readers == 0 and bus.stream('a') is not stream
+
+
+def test_reader_attaching_to_a_dropped_stream_ends():
+    bus = EventBus()
+    stream = bus.stream('a')
+    bus.publish('a', 'delete_network', {"id": "a"})
+    bus.drop('a')
+    chunks = list(event_source(stream, 0, keepalive=30))
+    assert len(chunks) == 2 and 'event: delete_network' in chunks[1]
@@ -0,0 +1,41 @@
+import textwrap
+
+from layer_registry import CATALOG_ORDER, LayerRegistry, layer_types
+
+
+def test_catalog_lists_every_layer_in_order():
+    names = [cls.__name__ for cls in layer_types.classes()]
+    assert names == list(CATALOG_ORDER)
+    assert [entry["name"] for entry in layer_types.catalog()] == names
+
+
+def test_modules_are_found_by_parsing_their_source(tmp_path):
+    nested = tmp_path / 'extra' / 'nested'
+    nested.mkdir(parents=True)
+    (tmp_path / 'extra' / 'b.py').write_text(textwrap.dedent('''
+        from layer_registry import register_layer
+
+        @register_layer
+        class Second:
+            pass
+
+        @functools.total_ordering
+        @register_layer
+        class Third:
+            pass
+
+        class Helper:
+            """Not registered, although its docstring says
+            @register_layer
+            class Fake: ...
+            """
+    '''))
+    (tmp_path / 'extra' / 'a.py').write_text('@register_layer\nclass First:\n    pass\n')
+    (nested / 'c.py').write_text('# @register_layer\nclass Commented:\n    pass\n\n'
+                                 '@register_layer\nclass Fourth:\n    pass\n')
+    (tmp_path / 'extra' / 'notes.txt').write_text('@register_layer\nclass NotPython:\n')
+
+    registry = LayerRegistry(root=str(tmp_path), packages=('extra',))
+    assert list(registry) == ['First', 'Second', 'Third', 'Fourth']
+    assert 'Third' in registry and 'Fake' not in registry and 'Commented' not in registry
+    assert registry._index()['Fourth'] == 'extra.nested.c'
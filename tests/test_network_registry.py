@@ -0,0 +1,26 @@
+import logging
+
+from network_cache import NetworkCache
+from network_registry import NetworkRegistry
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_eviction_without_a_store_is_logged(caplog):
+    clock = Clock()
+    networks = NetworkRegistry(cache=NetworkCache(idle_ttl=60, clock=clock))
+    idle = networks.create()
+    clock.now = 61
+
+    with caplog.at_level(logging.WARNING, logger='network_registry'):
+        kept = networks.create()
+    assert networks.get(idle.id) is None and networks.get(kept.id) is kept
+    assert [record.getMessage() for record in caplog.records] == [
+        f"Evicted network {idle.id} (0 layers) with no store to write it back to; it is gone"]
+
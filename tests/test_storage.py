@@ -0,0 +1,233 @@
+import sqlite3
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+from conftest import BACKEND
+from layer_registry import layer_types
+from network_registry import NetworkRegistry
+from storage import ID_BLOCK, SQLiteNetworkStore
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / 'networks.db')
+
+
+@pytest.fixture
+def open_store(db):
+    stores = []
+
+    def open_store(**options):
+        # Flushed by hand unless a test asks for the background flusher
+        options.setdefault('flush_interval', 60)
+        options.setdefault('check_interval', 0)
+        store = SQLiteNetworkStore(db, layer_types, **options)
+        stores.append(store)
+        return store
+
+    yield open_store
+    for store in stores:
+        store.close()
+
+
+def dense(units=8):
+    return layer_types['DenseLayer'].from_params({'units': units})
+
+
+def build(networks):
+    network = networks.create()
+    with networks.writing(network.id) as writable:
+        first = writable.add_layer(layer_types['TabularInputLayer'].from_params(
+            {'input_type': 'TABULAR', 'num_features': 4}))
+        second = writable.add_layer(dense(16))
+        third = writable.add_layer(dense(3))
+        writable.add_connection(first, second)
+        writable.add_connection(second, third)
+    return network
+
+
+def run_other_process(db, code):
+    """Run code in a fresh interpreter with its own store and registry (networks) on db"""
+    script = textwrap.dedent(f"""
+        from layer_registry import layer_types
+        from network_registry import NetworkRegistry
+        from storage import SQLiteNetworkStore
+        store = SQLiteNetworkStore({db!r}, layer_types)
+        networks = NetworkRegistry(store)
+    """) + textwrap.dedent(code) + "\nstore.close()\n"
+    subprocess.run([sys.executable, '-c', script], cwd=BACKEND, check=True)
+
+
+def test_round_trip(open_store):
+    store = open_store()
+    network = build(NetworkRegistry(store))
+    store.close()
+
+    loaded = open_store().load_network(network.id)
+    assert loaded.records() == network.records()
+    assert loaded.topological_order() == network.topological_order()
+    assert loaded.layers[1].get_config()['units'] == 16
+
+
+def test_round_trip_of_removals_and_clones(open_store):
+    store = open_store()
+    networks = NetworkRegistry(store)
+    network = build(networks)
+    with networks.writing(network.id) as writable:
+        writable.remove_connection(1)
+        writable.remove_layer(2)
+    clone = networks.clone(network)
+    store.close()
+
+    reopened = NetworkRegistry(open_store())
+    assert reopened.get(network.id).records() == network.records()
+    assert reopened.get(clone.id).records()[1:] == network.records()[1:]
+    assert sorted(reopened.get(network.id).layers) == [0, 1]
+
+
+def test_writes_wait_for_the_flusher(open_store):
+    store = open_store()
+    networks = NetworkRegistry(store)
+    network = build(networks)
+    assert store.stats()["pending"] == 5
+    assert open_store().load_network(network.id).layers == {}
+
+    store.flush()
+    assert store.stats()["pending"] == 0
+    assert len(open_store().load_network(network.id).layers) == 3
+
+
+def test_reload_after_another_process_writes(db, open_store):
+    store = open_store()
+    networks = NetworkRegistry(store)
+    network = build(networks)
+    store.flush()
+
+    run_other_process(db, f"""
+        with networks.writing({network.id!r}) as network:
+            network.add_connection(0, network.add_layer(layer_types['DenseLayer'].from_params({{}})))
+    """)
+
+    reloaded = networks.get(network.id)
+    assert reloaded is network
+    assert len(reloaded.layers) == 4 and len(reloaded.connections) == 3
+    assert reloaded.revision > 5
+    # Ids reserved by the other process are never handed out again here
+    with networks.writing(network.id) as writable:
+        new_id = writable.add_layer(dense())
+    assert new_id not in (0, 1, 2, 3) and new_id == 2 * ID_BLOCK
+
+
+def test_cached_network_is_checked_once_per_interval(db, open_store):
+    store = open_store(check_interval=3600)
+    networks = NetworkRegistry(store)
+    network = build(networks)
+    store.flush()
+    networks.get(network.id)
+
+    run_other_process(db, f"""
+        with networks.writing({network.id!r}) as network:
+            network.add_layer(layer_types['DenseLayer'].from_params({{}}))
+    """)
+    assert len(networks.get(network.id).layers) == 3
+
+    # A write finds out when it flushes
+    with networks.writing(network.id) as writable:
+        writable.add_layer(dense())
+    store.flush()
+    assert len(networks.get(network.id).layers) == 5
+
+
+def test_concurrent_processes_never_share_ids(db, open_store):
+    store = open_store()
+    networks = NetworkRegistry(store)
+    network = build(networks)
+    store.flush()
+
+    run_other_process(db, f"""
+        for _ in range(100):
+            with networks.writing({network.id!r}) as network:
+                network.add_layer(layer_types['DenseLayer'].from_params({{}}))
+    """)
+    with networks.writing(network.id) as writable:
+        for _ in range(100):
+            writable.add_layer(dense())
+    store.flush()
+
+    assert len(open_store().load_network(network.id).layers) == 203
+
+
+def test_delete_from_another_process(db, open_store):
+    store = open_store()
+    networks = NetworkRegistry(store)
+    network = build(networks)
+    store.flush()
+    with networks.writing(network.id) as writable:
+        writable.add_layer(dense())
+
+    run_other_process(db, f"assert networks.delete({network.id!r})")
+
+    assert networks.get(network.id) is None
+    assert network.id not in networks
+    store.flush()
+    with sqlite3.connect(db) as connection:
+        assert connection.execute('SELECT COUNT(*) FROM layers').fetchone()[0] == 0
+
+
+def test_failed_flush_rolls_back_and_requeues(db, open_store):
+    store = open_store()
+    networks = NetworkRegistry(store)
+    with sqlite3.connect(db) as connection:
+        connection.execute("CREATE TRIGGER fail BEFORE INSERT ON connections BEGIN SELECT RAISE(ABORT, 'full'); END")
+    network = build(networks)
+
+    with pytest.raises(sqlite3.IntegrityError):
+        store.flush()
+    # The layers written before the failing statement were rolled back with it
+    with sqlite3.connect(db) as connection:
+        assert connection.execute('SELECT COUNT(*) FROM layers').fetchone()[0] == 0
+        connection.execute('DROP TRIGGER fail')
+    assert store.stats() == {"pending": 5, "flush_failures": 1, "last_flush_error": "IntegrityError: full"}
+
+    with networks.writing(network.id) as writable:
+        writable.add_layer(dense())
+    store.flush()
+    assert store.stats()["pending"] == 0
+    assert len(open_store().load_network(network.id).layers) == 4
+
+
+def test_background_flusher_retries_after_failure(db, open_store):
+    store = open_store(flush_interval=0.01)
+    networks = NetworkRegistry(store)
+    with sqlite3.connect(db) as connection:
+        connection.execute("CREATE TRIGGER fail BEFORE INSERT ON layers BEGIN SELECT RAISE(ABORT, 'full'); END")
+    network = build(networks)
+    _wait_for(lambda: store.flush_failures > 0)
+
+    with sqlite3.connect(db) as connection:
+        connection.execute('DROP TRIGGER fail')
+    _wait_for(lambda: store.stats()["pending"] == 0)
+    assert len(open_store().load_network(network.id).layers) == 3
+
+
+def test_rolled_back_batch_leaves_nothing_queued(open_store):
+    store = open_store()
+    networks = NetworkRegistry(store)
+    network = build(networks)
+    store.flush()
+    with pytest.raises(KeyError):
+        with networks.writing(network.id) as writable, writable.atomic():
+            writable.add_layer(dense())
+            writable.add_connection(0, 99)
+    assert store.stats()["pending"] == 0
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
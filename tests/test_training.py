@@ -0,0 +1,138 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from executor import ExecutionError, compile_network
+from layer_registry import layer_types
+from neural_network import NeuralNetwork
+from training import train
+
+
+def chain(*layers):
+    network = NeuralNetwork('test')
+    ids = [network.add_layer(layer_types[kind].from_params(params)) for kind, params in layers]
+    for source_id, target_id in zip(ids, ids[1:]):
+        network.add_connection(source_id, target_id)
+    return network
+
+
+def classifier(dropout=0.5):
+    return chain(('TabularInputLayer', {'input_type': 'TABULAR', 'num_features': 6}),
+                 ('DenseLayer', {'units': 16}),
+                 ('ReLUFunction', {}),
+                 ('DropoutLayer', {'rate': dropout}),
+                 ('DenseLayer', {'units': 3}),
+                 ('SoftMaxFunction', {}))
+
+
+def max_pooling():
+    # The ReLU is fused into the pooling kernel and rewrites its output in place
+    return chain(('ImageInputLayer', {'shape': [6, 6], 'channels': 1}),
+                 ('ConvolutionalLayer', {'filters': 2, 'kernel_size': 3}),
+                 ('PoolingLayer', {'pool_size': 2}),
+                 ('ReLUFunction', {}),
+                 ('FlatteningLayer', {}),
+                 ('DenseLayer', {'units': 3}),
+                 ('SoftMaxFunction', {}))
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(44, 6)).astype(np.float32), rng.integers(0, 3, 44)
+
+
+@pytest.mark.parametrize('optimizer', ['sgd', 'adam'])
+@pytest.mark.parametrize('dropout', [0.0, 0.5])
+def test_parallel_training_matches_local(data, optimizer, dropout):
+    inputs, targets = data
+    options = dict(epochs=3, batch_size=16, optimizer=optimizer, learning_rate=0.05, seed=3)
+    local = train(classifier(dropout), inputs, targets, **options)
+    parallel = train(classifier(dropout), inputs, targets, workers=3, **options)
+
+    np.testing.assert_allclose(parallel.history, local.history, rtol=1e-5)
+    assert parallel.weights.keys() == local.weights.keys()
+    for layer_id, params in local.weights.items():
+        for name, value in params.items():
+            np.testing.assert_allclose(parallel.weights[layer_id][name], value, rtol=1e-4, atol=1e-5)
+
+
+def test_parallel_training_is_reproducible(data):
+    inputs, targets = data
+    first = train(classifier(), inputs, targets, epochs=2, batch_size=16, workers=2, seed=7)
+    second = train(classifier(), inputs, targets, epochs=2, batch_size=16, workers=2, seed=7)
+    assert first.history == second.history
+
+
+def test_shared_memory_is_unlinked_when_a_worker_raises(data, monkeypatch):
+    created = []
+
+    class RecordedSharedMemory(shared_memory.SharedMemory):
+        def __init__(self, name=None, create=False, size=0):
+            super().__init__(name=name, create=create, size=size)
+            if create:
+                created.append(self.name)
+
+    monkeypatch.setattr(shared_memory, 'SharedMemory', RecordedSharedMemory)
+    inputs, _ = data
+    # Checked by the loss, which runs in the workers
+    wrong_targets = np.zeros((len(inputs), 5), dtype=np.float32)
+    with pytest.raises(ExecutionError, match="Targets must"):
+        train(classifier(), inputs, wrong_targets, batch_size=16, workers=2)
+
+    assert created
+    for name in created:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+@pytest.mark.parametrize('optimizer', ['sgd', 'adam'])
+def test_zero_learning_rate_keeps_weights(data, optimizer):
+    inputs, targets = data
+    trained = train(classifier(), inputs, targets, epochs=2, batch_size=16, optimizer=optimizer,
+                    learning_rate=0, seed=1)
+    initial = train(classifier(), inputs, targets, epochs=0, seed=1)
+    for layer_id, params in initial.weights.items():
+        for name, value in params.items():
+            np.testing.assert_array_equal(trained.weights[layer_id][name], value)
+
+
+def test_max_pooling_gradient_with_fused_activation():
+    rng = np.random.default_rng(1)
+    images = rng.normal(size=(4, 6, 6, 1)).astype(np.float32)
+    plan = compile_network(max_pooling(), seed=2)
+    output_id = plan.output_ids[0]
+    # Loss: a fixed weighting of the outputs, whose gradient is that weighting
+    weighting = rng.normal(size=(4, 3)).astype(np.float32)
+
+    def loss():
+        return float((plan.run({0: images}, training=True)[output_id].astype(np.float64) * weighting).sum())
+
+    loss()
+    plan.backward({output_id: weighting})
+    conv = plan.kernels[1]
+    analytic = conv.grads['weights'].copy()
+    assert np.isfinite(analytic).all() and np.abs(analytic).sum() > 0
+
+    weights = conv.params['weights']
+    # Small enough not to move any pooling winner or ReLU across its kink
+    epsilon = 1e-3
+    for index in np.ndindex(weights.shape):
+        original = weights[index]
+        weights[index] = original + epsilon
+        above = loss()
+        weights[index] = original - epsilon
+        below = loss()
+        weights[index] = original
+        assert (above - below) / (2 * epsilon) == pytest.approx(float(analytic[index]), rel=2e-2, abs=1e-3)
+
+
+def test_max_pooling_trains_with_fused_activation():
+    rng = np.random.default_rng(0)
+    images = rng.normal(size=(32, 6, 6, 1)).astype(np.float32)
+    labels = rng.integers(0, 3, 32)
+    with np.errstate(invalid='raise', divide='raise'):
+        result = train(max_pooling(), images, labels, epochs=3, batch_size=8, learning_rate=0.01)
+    assert np.isfinite(result.history).all()
+    assert all(np.isfinite(value).all() for params in result.weights.values() for value in params.values())
@@ -0,0 +1,30 @@
+import logging
+import os
+
+import numpy as np
+
+from weight_store import WeightStore
+
+
+def test_round_trip(tmp_path):
+    store = WeightStore(str(tmp_path))
+    store.save('a', {1: {'weights': np.ones((2, 3)), 'bias': np.zeros(3)}})
+    weights = store.load('a')
+    assert list(weights) == [1]
+    np.testing.assert_array_equal(weights[1]['weights'], np.ones((2, 3)))
+    assert store.load('b') is None
+
+
+def test_corrupt_file_is_moved_aside(tmp_path, caplog):
+    store = WeightStore(str(tmp_path))
+    store.save('a', {1: {'weights': np.ones(100)}})
+    path = tmp_path / 'a.npz'
+    path.write_bytes(path.read_bytes()[:100])
+
+    with caplog.at_level(logging.WARNING, logger='weight_store'):
+        assert store.load('a') is None
+    assert 'network a' in caplog.text
+    assert not path.exists() and os.path.exists(f"{path}.corrupt")
+    # Later loads see a network without weights instead of failing again
+    assert store.load('a') is None
+    assert not caplog.records[1:]